@@ -18,6 +18,7 @@ from readthedocs.builds.constants import LATEST
 from readthedocs.builds.models import Build, Version
 from readthedocs.core.utils import trigger_build
 from readthedocs.projects.models import Project, ImportedFile
+from readthedocs.projects.signals import versions_synced
 from readthedocs.restapi.views.footer_views import get_version_compare_data
 
 from .utils import SearchMixin, PostAuthentication
@@ -99,6 +100,8 @@ class ProjectResource(ModelResource, SearchMixin):
                 {'exception': e.message},
                 response_class=HttpApplicationError,
             )
+        finally:
+            versions_synced.send(sender=Project, project=project)
         return self.create_response(request, deleted_versions)
 
     def override_urls(self):
@@ -3,12 +3,19 @@
 """
 
 from django.contrib import admin
-from readthedocs.builds.models import Build, VersionAlias, Version
+from readthedocs.builds.models import Build, BuildPhase, VersionAlias, Version
 from guardian.admin import GuardedModelAdmin
 
 
+class BuildPhaseInline(admin.TabularInline):
+    model = BuildPhase
+    readonly_fields = ('name', 'elapsed', 'cpu_time', 'max_rss', 'output_size')
+    extra = 0
+
+
 class BuildAdmin(admin.ModelAdmin):
     list_display = ('project', 'date', 'success', 'type', 'state')
+    inlines = [BuildPhaseInline]
 
 
 class VersionAdmin(GuardedModelAdmin):
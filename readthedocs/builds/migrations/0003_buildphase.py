@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('builds', '0002_build_command_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BuildPhase',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('name', models.CharField(max_length=55, verbose_name='Name')),
+                ('elapsed', models.FloatField(verbose_name='Elapsed seconds')),
+                ('build', models.ForeignKey(related_name='phases', verbose_name='Build', to='builds.Build')),
+            ],
+            options={
+                'ordering': ['pk'],
+            },
+        ),
+    ]
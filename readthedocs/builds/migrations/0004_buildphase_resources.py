@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('builds', '0003_buildphase'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='buildphase',
+            name='cpu_time',
+            field=models.FloatField(null=True, verbose_name='CPU seconds', blank=True),
+        ),
+        migrations.AddField(
+            model_name='buildphase',
+            name='max_rss',
+            field=models.IntegerField(null=True, verbose_name='Peak memory (KB)', blank=True),
+        ),
+        migrations.AddField(
+            model_name='buildphase',
+            name='output_size',
+            field=models.BigIntegerField(null=True, verbose_name='Output size (bytes)', blank=True),
+        ),
+    ]
@@ -6,6 +6,8 @@ from shutil import rmtree
 from django.core.urlresolvers import reverse
 from django.conf import settings
 from django.db import models
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _, ugettext
 
 from guardian.shortcuts import assign
@@ -18,7 +20,12 @@ from readthedocs.projects.constants import (PRIVACY_CHOICES, REPO_TYPE_GIT,
                                             REPO_TYPE_HG, GITHUB_URL,
                                             GITHUB_REGEXS, BITBUCKET_URL,
                                             BITBUCKET_REGEXS)
-from readthedocs.core.resolver import resolve
+from readthedocs.core.resolver import invalidate_resolver_context, resolve
+from readthedocs.projects.signals import versions_synced
+from readthedocs.projects.version_handling import invalidate_version_order
+from readthedocs.projects.version_handling import get_cached_version_compare
+from readthedocs.projects.version_handling import invalidate_version_compare
+from readthedocs.projects.version_handling import update_version_compare
 
 from .constants import (BUILD_STATE, BUILD_TYPES, VERSION_TYPES,
                         LATEST, NON_REPOSITORY_VERSIONS, STABLE,
@@ -396,3 +403,81 @@ class BuildCommandResult(BuildCommandResultMixin, models.Model):
         if self.start_time is not None and self.end_time is not None:
             diff = self.end_time - self.start_time
             return diff.seconds
+
+
+class BuildPhase(models.Model):
+
+    """Time spent in one stage of a build, such as publishing the artifacts
+
+    Phases profiled on the builder also record the resources their commands
+    used, see :py:class:`~readthedocs.doc_builder.profiling.BuildPhaseProfiler`.
+    """
+
+    build = models.ForeignKey(Build, verbose_name=_('Build'),
+                              related_name='phases')
+    name = models.CharField(_('Name'), max_length=55)
+    elapsed = models.FloatField(_('Elapsed seconds'))
+    cpu_time = models.FloatField(_('CPU seconds'), null=True, blank=True)
+    max_rss = models.IntegerField(_('Peak memory (KB)'), null=True,
+                                  blank=True)
+    output_size = models.BigIntegerField(_('Output size (bytes)'), null=True,
+                                         blank=True)
+
+    class Meta:
+        ordering = ['pk']
+
+    objects = RelatedBuildManager()
+
+    def __unicode__(self):
+        return (ugettext(u'Build phase {name} for build {build}')
+                .format(name=self.name, build=self.build))
+
+
+@receiver(post_save, sender=Version)
+@receiver(post_delete, sender=Version)
+def invalidate_project_version_order(sender, instance, **kwargs):
+    invalidate_version_order(instance.project_id)
+
+
+@receiver(post_save, sender=Version)
+@receiver(post_delete, sender=Version)
+def invalidate_version_resolver_context(sender, instance, **kwargs):
+    # The default version only resolves to an active version
+    invalidate_resolver_context([instance.project_id])
+
+
+@receiver(versions_synced)
+def invalidate_synced_resolver_context(sender, project, **kwargs):
+    invalidate_resolver_context([project.pk])
+
+
+@receiver(post_init, sender=Version)
+def remember_version_active(sender, instance, **kwargs):
+    instance._loaded_active = instance.active
+
+
+@receiver(post_save, sender=Version)
+def update_saved_version_compare(sender, instance, created, raw, **kwargs):
+    if raw:
+        invalidate_version_compare(instance.project_id)
+        return
+    loaded_active = False if created else instance._loaded_active
+    if instance.active != loaded_active:
+        update_version_compare(instance.project)
+    else:
+        compare = get_cached_version_compare(instance.project_id)
+        if compare is not None and compare.highest_pk == instance.pk:
+            # Keep the highest version's link up to date once it's built
+            invalidate_version_compare(instance.project_id)
+    instance._loaded_active = instance.active
+
+
+@receiver(post_delete, sender=Version)
+def update_deleted_version_compare(sender, instance, **kwargs):
+    if instance.active:
+        invalidate_version_compare(instance.project_id)
+
+
+@receiver(versions_synced)
+def update_synced_version_compare(sender, project, **kwargs):
+    update_version_compare(project)
@@ -101,19 +101,101 @@ class VersionSlugField(models.CharField):
             current = current % length ** exp
         return '_{suffix}'.format(suffix=suffix)
 
-    def create_slug(self, model_instance):
-        # get fields to populate from and slug field to set
-        slug_field = model_instance._meta.get_field(self.attname)
-
-        slug = self.slugify(getattr(model_instance, self._populate_from))
-        next = 0
+    def slug_candidates(self, content):
+        """
+        Yield the slugs ``content`` may get, in the order they are tried.
 
-        # strip slug depending on max_length attribute of the slug field
-        # and clean-up
-        slug_len = slug_field.max_length
+        The first candidate is the plain slug, the following ones carry a
+        ``uniquifying_suffix`` and are truncated to fit ``max_length``.
+        """
+        slug = self.slugify(content)
+        slug_len = self.max_length
         if slug_len:
             slug = slug[:slug_len]
         original_slug = slug
+        if slug:
+            yield slug
+        next = 0
+        while True:
+            slug = original_slug
+            end = self.uniquifying_suffix(next)
+            end_len = len(end)
+            if slug_len and len(slug) + end_len > slug_len:
+                slug = slug[:slug_len - end_len]
+            yield slug + end
+            next += 1
+
+    def slug_prefix(self, content):
+        """
+        Return the prefix shared by the first candidates for ``content``.
+
+        Candidates with suffixes up to three characters long, which covers
+        the first 676 of them, start with this prefix.
+        """
+        slug = self.slugify(content)
+        if self.max_length:
+            slug = slug[:self.max_length - len(self.uniquifying_suffix(675))]
+        return slug
+
+    def unique_slug(self, content, taken):
+        """
+        Return the slug for ``content`` that isn't in ``taken``, without
+        querying the database.
+
+        :param content: Value to create the slug from, usually a verbose name
+        :param taken: Set of slugs already in use in the project
+        """
+        for slug in self.slug_candidates(content):
+            if slug not in taken:
+                break
+        assert self.test_pattern.match(slug), (
+            'Invalid generated slug: {slug}'.format(slug=slug))
+        return slug
+
+    def unique_slugs(self, contents, taken):
+        """
+        Return a unique slug for each of ``contents``, without querying the
+        database.
+
+        Slugs are allocated in order, so later contents never get a slug
+        picked for an earlier one. ``taken`` is updated with the new slugs.
+        """
+        slugs = []
+        # Candidates before the last slug picked for a name are all taken,
+        # so colliding names resume from there instead of starting over
+        candidates = {}
+        for content in contents:
+            key = self.slugify(content)
+            if key not in candidates:
+                candidates[key] = self.slug_candidates(content)
+            for slug in candidates[key]:
+                if slug not in taken:
+                    break
+            assert self.test_pattern.match(slug), (
+                'Invalid generated slug: {slug}'.format(slug=slug))
+            taken.add(slug)
+            slugs.append(slug)
+        return slugs
+
+    def create_slugs(self, contents, **scope):
+        """
+        Return a unique slug for each of ``contents`` with a single query.
+
+        This is meant for creating many instances at once, where
+        ``create_slug`` would run queries for each of them.
+
+        :param contents: Values to create the slugs from
+        :param scope: Values of the fields the slug is unique together with,
+            for instance ``project=project``
+        """
+        queryset = self.get_queryset(self.model, self).filter(**scope)
+        taken = set(queryset.values_list(self.attname, flat=True))
+        return self.unique_slugs(contents, taken)
+
+    def create_slug(self, model_instance):
+        # get fields to populate from and slug field to set
+        slug_field = model_instance._meta.get_field(self.attname)
+        content = getattr(model_instance, self._populate_from)
 
         # exclude the current model instance from the queryset used in finding
         # the next valid slug
@@ -126,20 +208,24 @@ class VersionSlugField(models.CharField):
         for params in model_instance._meta.unique_together:
             if self.attname in params:
                 for param in params:
-                    kwargs[param] = getattr(model_instance, param, None)
-        kwargs[self.attname] = slug
-
-        # increases the number while searching for the next valid slug
-        # depending on the given slug, clean-up
-        while not slug or queryset.filter(**kwargs):
-            slug = original_slug
-            end = self.uniquifying_suffix(next)
-            end_len = len(end)
-            if slug_len and len(slug) + end_len > slug_len:
-                slug = slug[:slug_len - end_len]
-            slug = slug + end
-            kwargs[self.attname] = slug
-            next += 1
+                    if param != self.attname:
+                        kwargs[param] = getattr(model_instance, param, None)
+        queryset = queryset.filter(**kwargs)
+
+        # fetch all slugs the first candidates could collide with at once,
+        # instead of querying for each candidate in turn
+        prefix = self.slug_prefix(content)
+        taken = set(queryset.filter(**{
+            '%s__startswith' % self.attname: prefix,
+        }).values_list(self.attname, flat=True))
+
+        for slug in self.slug_candidates(content):
+            if slug.startswith(prefix):
+                if slug not in taken:
+                    break
+            elif not queryset.filter(**{self.attname: slug}).exists():
+                # truncated beyond the prefix, check this one on its own
+                break
 
         assert self.test_pattern.match(slug), (
             'Invalid generated slug: {slug}'.format(slug=slug))
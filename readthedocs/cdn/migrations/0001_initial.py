@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurgeRequest',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('cdn_id', models.CharField(max_length=255, verbose_name='CDN id', db_index=True)),
+                ('url', models.TextField(verbose_name='URL')),
+                ('date', models.DateTimeField(auto_now_add=True, verbose_name='Date')),
+            ],
+            options={
+                'ordering': ['pk'],
+            },
+        ),
+    ]
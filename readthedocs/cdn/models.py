@@ -0,0 +1,21 @@
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+
+class PurgeRequest(models.Model):
+
+    """A URL waiting to be purged from a CDN zone
+
+    Builds landing close together queue their changed URLs here, and a single
+    delayed task purges them all, see :py:mod:`readthedocs.cdn.tasks`.
+    """
+
+    cdn_id = models.CharField(_('CDN id'), max_length=255, db_index=True)
+    url = models.TextField(_('URL'))
+    date = models.DateTimeField(_('Date'), auto_now_add=True)
+
+    class Meta:
+        ordering = ['pk']
+
+    def __unicode__(self):
+        return u'%s %s' % (self.cdn_id, self.url)
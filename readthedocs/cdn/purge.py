@@ -1,20 +1,127 @@
+"""Purge files from the CDN
+
+URLs are purged in batches no larger than the provider accepts, failed
+batches are retried with exponential backoff, and above
+``CDN_PURGE_ALL_THRESHOLD`` URLs the whole zone is purged instead.
+"""
+
 import logging
+import time
 
 from django.conf import settings
 
 log = logging.getLogger(__name__)
 
-CDN_SERVICE = getattr(settings, 'CDN_SERVICE', None)
-CDN_USERNAME = getattr(settings, 'CDN_USERNAME', None)
-CDN_KEY = getattr(settings, 'CDN_KEY', None)
-CDN_SECRET = getattr(settings, 'CDN_SECRET', None)
 
-if CDN_USERNAME and CDN_KEY and CDN_SECRET and CDN_SERVICE == 'maxcdn':
-    from maxcdn import MaxCDN
-    api = MaxCDN(CDN_USERNAME, CDN_KEY, CDN_SECRET)
+class MaxCDNProvider(object):
+
+    """Purge through the MaxCDN API"""
+
+    # Files per purge request
+    batch_size = 250
+
+    def __init__(self, username, key, secret):
+        from maxcdn import MaxCDN
+        self.api = MaxCDN(username, key, secret)
+
+    def purge(self, id, files):
+        return self.api.purge(id, files)
+
+    def purge_all(self, id):
+        return self.api.purge(id)
+
+
+class LocalProvider(object):
+
+    """Record purges in memory instead of calling a CDN
+
+    For development and tests. ``purges`` holds an ``(id, files)`` tuple per
+    request, with ``files`` set to ``None`` for whole zone purges.
+    """
+
+    batch_size = 250
+
+    def __init__(self):
+        self.purges = []
+
+    def purge(self, id, files):
+        self.purges.append((id, list(files)))
 
-    def purge(id, files):
-        return api.purge(id, files)
-else:
-    def purge(id, files):
+    def purge_all(self, id):
+        self.purges.append((id, None))
+
+
+_providers = {}
+
+
+def get_provider():
+    """Return the provider for ``CDN_SERVICE``, ``None`` if not configured"""
+    service = getattr(settings, 'CDN_SERVICE', None)
+    if service not in _providers:
+        username = getattr(settings, 'CDN_USERNAME', None)
+        key = getattr(settings, 'CDN_KEY', None)
+        secret = getattr(settings, 'CDN_SECRET', None)
+        if service == 'maxcdn' and username and key and secret:
+            _providers[service] = MaxCDNProvider(username, key, secret)
+        elif service == 'local':
+            _providers[service] = LocalProvider()
+        else:
+            return None
+    return _providers[service]
+
+
+def with_retries(func, description):
+    """Call ``func``, retrying with exponential backoff on errors
+
+    :returns: Whether ``func`` eventually succeeded
+    """
+    retries = getattr(settings, 'CDN_PURGE_RETRIES', 3)
+    backoff = getattr(settings, 'CDN_PURGE_BACKOFF', 1)
+    for attempt in range(retries + 1):
+        try:
+            func()
+            return True
+        except Exception:
+            log.warning('CDN purge of %s failed, attempt %s of %s',
+                        description, attempt + 1, retries + 1, exc_info=True)
+            if attempt < retries:
+                time.sleep(backoff * 2 ** attempt)
+    return False
+
+
+def purge_urls(id, urls, provider=None):
+    """Purge ``urls`` from the CDN zone ``id``
+
+    :returns: URLs that couldn't be purged
+    :rtype: list
+    """
+    if provider is None:
+        provider = get_provider()
+    if provider is None:
         log.error("CDN not configured, can't purge files")
+        return []
+    if not urls:
+        return []
+
+    if len(urls) > getattr(settings, 'CDN_PURGE_ALL_THRESHOLD', 1000):
+        log.info('Purging CDN zone %s for %s files', id, len(urls))
+        if with_retries(lambda: provider.purge_all(id), 'zone %s' % id):
+            return []
+        return list(urls)
+
+    batch_size = getattr(settings, 'CDN_PURGE_BATCH_SIZE',
+                         provider.batch_size)
+    failed = []
+    for offset in range(0, len(urls), batch_size):
+        batch = urls[offset:offset + batch_size]
+        if not with_retries(lambda: provider.purge(id, batch),
+                            '%s files from zone %s' % (len(batch), id)):
+            failed.extend(batch)
+    return failed
+
+
+def purge(id, files):
+    """Purge ``files`` from the CDN zone ``id`` right away"""
+    failed = purge_urls(id, list(files))
+    if failed:
+        log.error('Failed to purge %s files from CDN zone %s', len(failed), id)
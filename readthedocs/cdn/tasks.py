@@ -0,0 +1,71 @@
+"""Queued CDN purges
+
+Changed URLs are queued per CDN id and purged by a task delayed by
+``CDN_PURGE_DELAY`` seconds. Builds finishing within that delay share one
+purge, and URLs changed by several of them are only purged once.
+"""
+
+import logging
+
+from celery import task
+from django.conf import settings
+
+from readthedocs.cdn.models import PurgeRequest
+from readthedocs.cdn.purge import purge_urls
+
+log = logging.getLogger(__name__)
+
+# URLs per query when adding or removing queued purges
+QUERY_BATCH_SIZE = 500
+
+
+def _add_urls(cdn_id, urls):
+    urls = sorted(set(urls))
+    queued = set()
+    for offset in range(0, len(urls), QUERY_BATCH_SIZE):
+        queued.update(PurgeRequest.objects
+                      .filter(cdn_id=cdn_id,
+                              url__in=urls[offset:offset + QUERY_BATCH_SIZE])
+                      .values_list('url', flat=True))
+    PurgeRequest.objects.bulk_create(
+        [PurgeRequest(cdn_id=cdn_id, url=url)
+         for url in urls if url not in queued],
+        batch_size=QUERY_BATCH_SIZE)
+
+
+def queue_purge(cdn_id, urls):
+    """Queue ``urls`` to be purged from the CDN zone ``cdn_id``"""
+    if not urls:
+        return
+    _add_urls(cdn_id, urls)
+    flush_purges.apply_async(
+        args=[cdn_id], countdown=getattr(settings, 'CDN_PURGE_DELAY', 30))
+
+
+@task(queue='web')
+def flush_purges(cdn_id):
+    """Purge every URL queued for the CDN zone ``cdn_id``
+
+    URLs that still fail after retrying are queued again, to be purged with
+    the next build's.
+
+    :returns: Number of URLs purged
+    """
+    requests = list(PurgeRequest.objects
+                    .filter(cdn_id=cdn_id)
+                    .values_list('pk', 'url'))
+    if not requests:
+        return 0
+    pks = [pk for pk, __ in requests]
+    for offset in range(0, len(pks), QUERY_BATCH_SIZE):
+        (PurgeRequest.objects
+         .filter(pk__in=pks[offset:offset + QUERY_BATCH_SIZE])
+         .delete())
+
+    urls = sorted(set(url for __, url in requests))
+    failed = purge_urls(cdn_id, urls)
+    if failed:
+        log.error('Failed to purge %s files from CDN zone %s, queued again',
+                  len(failed), cdn_id)
+        _add_urls(cdn_id, failed)
+    return len(urls) - len(failed)
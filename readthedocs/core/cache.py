@@ -0,0 +1,120 @@
+"""Caching helpers
+
+:py:class:`LRUCache` lives in the memory of a single web or build process.
+It is meant for small, hot lookups on the request path where a round trip to
+the database -- or to the shared Django cache -- costs more than the lookup
+itself. Entries expire after a TTL so that changes made by other processes
+are eventually picked up, and model signals are used to drop entries early
+in the process that made the change.
+
+Data that must change everywhere at once is kept in the shared Django cache
+instead, under keys that include a generation, see
+:py:func:`get_cache_generation`.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class LRUCache(object):
+
+    """Thread safe, size bounded mapping with per entry expiry
+
+    :param max_size: Maximum number of entries kept, the least recently used
+        entry is evicted first
+    :param ttl: Seconds an entry is considered fresh. ``None`` disables
+        expiry.
+    """
+
+    def __init__(self, max_size=1000, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._data.pop(key)
+            except KeyError:
+                return default
+            if expires is not None and expires < time.time():
+                return default
+            # Re-insert to mark the entry as most recently used
+            self._data[key] = (expires, value)
+            return value
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        expires = None
+        if ttl is not None:
+            expires = time.time() + ttl
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (expires, value)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_matching(self, predicate):
+        """Remove every entry where ``predicate(key, value)`` is true"""
+        with self._lock:
+            stale = [key for key, (__, value) in self._data.items()
+                     if predicate(key, value)]
+            for key in stale:
+                del self._data[key]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_MISSING = object()
+
+# Seconds a generation is kept, it should outlive the entries using it
+GENERATION_TIMEOUT = getattr(settings, 'CACHE_GENERATION_TIMEOUT',
+                             30 * 24 * 60 * 60)
+
+
+def _generation_key(name, pk):
+    return 'generation:%s:%s' % (name, pk)
+
+
+def get_cache_generation(name, pk):
+    """Return the generation of the ``name`` entries of object ``pk``
+
+    Shared cache entries that depend on an object include its generation in
+    their key. Bumping it with :py:func:`bump_cache_generation` makes every
+    process miss the old entries, which then expire on their own.
+    Generations are random, so a lost generation never brings back entries
+    of an older one.
+    """
+    key = _generation_key(name, pk)
+    generation = cache.get(key)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        if not cache.add(key, generation, GENERATION_TIMEOUT):
+            generation = cache.get(key, generation)
+    return generation
+
+
+def bump_cache_generation(name, pk):
+    """Start a new generation of the ``name`` entries of object ``pk``"""
+    cache.set(_generation_key(name, pk), uuid.uuid4().hex, GENERATION_TIMEOUT)
+
@@ -0,0 +1,48 @@
+import glob
+import os
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from readthedocs.search.parse_json import process_file, process_file_pyquery
+
+
+FIXTURES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))),
+    'rtd_tests', 'files', '*.fjson')
+
+
+class Command(BaseCommand):
+
+    help = ('Compare the lxml search page extractor with the PyQuery one. '
+            'Defaults to the fjson files in rtd_tests/files.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', type=str)
+        parser.add_argument('-n', '--iterations', dest='iterations',
+                            type=int, default=100,
+                            help='Number of times each file is parsed')
+
+    def handle(self, *args, **options):
+        filenames = options['files'] or sorted(glob.glob(FIXTURES))
+        if not filenames:
+            raise CommandError('No files to parse')
+        iterations = options['iterations']
+        for filename in filenames:
+            if process_file(filename) != process_file_pyquery(filename):
+                raise CommandError(
+                    'Extractors disagree on {0}'.format(filename))
+            # Best of a few runs, to keep noise from other processes out
+            pyquery_time = min(timeit.repeat(
+                lambda: process_file_pyquery(filename), number=iterations,
+                repeat=3))
+            lxml_time = min(timeit.repeat(
+                lambda: process_file(filename), number=iterations, repeat=3))
+            self.stdout.write(
+                '{name}: pyquery {pyquery:.2f}ms, lxml {lxml:.2f}ms, '
+                '{speedup:.1f}x'.format(
+                    name=os.path.basename(filename),
+                    pyquery=pyquery_time * 1000 / iterations,
+                    lxml=lxml_time * 1000 / iterations,
+                    speedup=pyquery_time / lxml_time))
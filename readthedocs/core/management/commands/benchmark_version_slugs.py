@@ -0,0 +1,83 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from readthedocs.builds.models import Version
+from readthedocs.projects.models import Project
+
+
+class Rollback(Exception):
+    pass
+
+
+def create_slug_per_candidate(field, version):
+    """Allocate a slug querying for each candidate in turn
+
+    This is how ``VersionSlugField.create_slug`` used to work, kept here as
+    the baseline for the benchmark.
+    """
+    queryset = Version.objects.filter(project=version.project)
+    for slug in field.slug_candidates(version.verbose_name):
+        if not queryset.filter(slug=slug).exists():
+            return slug
+
+
+class Command(BaseCommand):
+
+    help = ('Compare version slug allocation strategies on a project with '
+            'many colliding branch names. Everything is rolled back.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('-n', '--versions',
+                    dest='versions',
+                    type='int',
+                    default=200,
+                    help='Number of colliding versions to create'),
+    )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.benchmark(options['versions'])
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def benchmark(self, count):
+        project = Project.objects.create(name='slug-benchmark',
+                                         slug='slug-benchmark')
+        field = Version._meta.get_field('slug')
+        # Branch names that only differ in characters slugify replaces
+        names = ['feature/%s' % ('x' * num) for num in range(1, 4)]
+        names += ['feature-%s' % ('x' * num) for num in range(1, 4)]
+        names = [names[num % len(names)] for num in range(count)]
+        for slug in field.create_slugs(names, project=project):
+            Version.objects.create(project=project, verbose_name=slug,
+                                   slug=slug, identifier=slug)
+
+        strategies = [
+            ('per candidate', lambda version: create_slug_per_candidate(
+                field, version)),
+            ('prefix query', field.create_slug),
+        ]
+        for name, allocate in strategies:
+            version = Version(project=project, verbose_name='feature/x')
+            with CaptureQueriesContext(connection) as queries:
+                start = time.time()
+                slug = allocate(version)
+                elapsed = time.time() - start
+            self.stdout.write(
+                '{name}: {slug} in {queries} queries, {ms:.2f}ms'.format(
+                    name=name, slug=slug, queries=len(queries),
+                    ms=elapsed * 1000))
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.time()
+            field.create_slugs(names, project=project)
+            elapsed = time.time() - start
+        self.stdout.write(
+            'batch of {count}: {queries} queries, {ms:.2f}ms'.format(
+                count=count, queries=len(queries), ms=elapsed * 1000))
@@ -0,0 +1,54 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from readthedocs.projects.blobstore import (TreeUsage, get_blob_store,
+                                            tree_usage)
+from readthedocs.projects.models import Project
+
+
+class Command(BaseCommand):
+
+    help = ('Measure the space built HTML takes per project, as plain copies '
+            'and on disk, and the size of the blob store.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('projects', nargs='*', type=str)
+        parser.add_argument('--content', action='store_true', default=False,
+                            help=('Hash every file to measure the space the '
+                                  'HTML would take in a blob store'))
+
+    def handle(self, *args, **options):
+        queryset = Project.objects.all()
+        if options['projects']:
+            queryset = queryset.filter(slug__in=options['projects'])
+
+        totals = [0, 0, 0, 0]
+        for project in queryset.order_by('slug').iterator():
+            builds_path = os.path.join(project.doc_path, 'rtd-builds')
+            if not os.path.isdir(builds_path):
+                continue
+            paths = [os.path.join(builds_path, name)
+                     for name in os.listdir(builds_path)
+                     if not name.startswith('.')]
+            usage = tree_usage(paths, content=options['content'])
+            self.write_usage(project.slug, usage)
+            totals = [total + (value or 0)
+                      for total, value in zip(totals, usage)]
+        if not options['content']:
+            totals[3] = None
+        self.write_usage('total', TreeUsage(*totals))
+
+        store = get_blob_store()
+        if store is not None:
+            count, size = store.usage()
+            self.stdout.write('blob store: {count} blobs, {size} bytes'
+                              .format(count=count, size=size))
+
+    def write_usage(self, name, usage):
+        line = ('{name}: {files} files, {bytes} bytes copied, '
+                '{disk_bytes} bytes on disk'
+                .format(name=name, **usage._asdict()))
+        if usage.unique_bytes is not None:
+            line += ', {0} bytes unique'.format(usage.unique_bytes)
+        self.stdout.write(line)
@@ -0,0 +1,56 @@
+import datetime
+import math
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from readthedocs.builds.models import BuildPhase
+
+METRICS = ['elapsed', 'cpu_time', 'max_rss', 'output_size']
+PERCENTILES = [50, 90, 99]
+
+
+def percentile(values, percent):
+    """Return the nearest rank ``percent`` percentile of sorted ``values``"""
+    if not values:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
+
+
+class Command(BaseCommand):
+
+    help = ('Print percentiles of the wall time, CPU time, peak memory and '
+            'output size of each build phase, across all recent builds.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('phases', nargs='*', type=str)
+        parser.add_argument('--days', dest='days', type=int, default=30,
+                            help='Only include builds from the last DAYS days')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - datetime.timedelta(days=options['days'])
+        queryset = BuildPhase.objects.filter(build__date__gte=since)
+        if options['phases']:
+            queryset = queryset.filter(name__in=options['phases'])
+
+        values = defaultdict(lambda: defaultdict(list))
+        for row in queryset.values_list('name', *METRICS).iterator():
+            for metric, value in zip(METRICS, row[1:]):
+                if value is not None:
+                    values[row[0]][metric].append(value)
+
+        for name in sorted(values):
+            self.stdout.write('{name}: {count} builds'.format(
+                name=name, count=len(values[name]['elapsed'])))
+            for metric in METRICS:
+                metric_values = sorted(values[name][metric])
+                if not metric_values:
+                    continue
+                self.stdout.write('  {metric}: {percentiles}'.format(
+                    metric=metric,
+                    percentiles=', '.join(
+                        'p{0}={1:g}'.format(percent,
+                                            percentile(metric_values, percent))
+                        for percent in PERCENTILES)))
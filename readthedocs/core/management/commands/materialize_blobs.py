@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from readthedocs.projects.blobstore import get_blob_store, load_manifest
+
+
+class Command(BaseCommand):
+
+    help = ('Replace a directory with the files of a blob store manifest. '
+            'Run on app servers after their blobs are synced.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('manifest', help='Path of the manifest')
+        parser.add_argument('target', help='Directory to materialize')
+
+    def handle(self, *args, **options):
+        store = get_blob_store()
+        if store is None:
+            raise CommandError('BLOB_STORE_ROOT is not set')
+        manifest = load_manifest(options['manifest'])
+        if manifest is None:
+            raise CommandError('Unreadable manifest: %s' % options['manifest'])
+        try:
+            store.materialize(manifest, options['target'])
+        except (IOError, OSError) as e:
+            raise CommandError(str(e))
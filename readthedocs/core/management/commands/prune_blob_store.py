@@ -0,0 +1,39 @@
+import glob
+import os
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from readthedocs.projects.blobstore import get_blob_store, load_manifest
+
+
+class Command(BaseCommand):
+
+    help = ('Remove blobs no version manifest under DOCROOT refers to. Run '
+            'on each server holding a blob store.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--dryrun',
+                    action='store_true',
+                    dest='dryrun',
+                    default=False,
+                    help='Only report what would be removed'),
+    )
+
+    def handle(self, *args, **options):
+        store = get_blob_store()
+        if store is None:
+            raise CommandError('BLOB_STORE_ROOT is not set')
+        referenced = set()
+        for manifest_path in glob.glob(os.path.join(
+                settings.DOCROOT, '*', 'rtd-builds', '.*.blobs.json')):
+            manifest = load_manifest(manifest_path)
+            if manifest is None:
+                raise CommandError(
+                    'Unreadable manifest, not pruning: %s' % manifest_path)
+            referenced.update(manifest.values())
+        count, size = store.prune(referenced, dryrun=options['dryrun'])
+        self.stdout.write('{action} {count} blobs, {size} bytes'.format(
+            action='Would remove' if options['dryrun'] else 'Removed',
+            count=count, size=size))
@@ -19,6 +19,11 @@ class Command(BaseCommand):
                     dest='project',
                     default='',
                     help='Project to index'),
+        make_option('--full',
+                    action='store_true',
+                    dest='full',
+                    default=False,
+                    help='Reindex every page, even if it is unchanged'),
     )
 
     def handle(self, *args, **options):
@@ -48,6 +53,7 @@ class Command(BaseCommand):
 
             try:
                 update_search(version.pk, commit,
-                              delete_non_commit_files=False)
+                              delete_non_commit_files=False,
+                              incremental=not options['full'])
             except Exception:
                 log.error('Reindex failed for %s' % version, exc_info=True)
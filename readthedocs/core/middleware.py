@@ -1,17 +1,177 @@
+import atexit
 import logging
+import threading
+import time
+from collections import defaultdict, namedtuple
 
 from django.utils.translation import ugettext_lazy as _
 from django.conf import settings
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.http import Http404
 
+from readthedocs.core.cache import LRUCache
 from readthedocs.projects.models import Project, Domain
 
 log = logging.getLogger(__name__)
 
 LOG_TEMPLATE = u"(Middleware) {msg} [{host}{path}]"
 
+DomainResolution = namedtuple(
+    'DomainResolution',
+    ['domain_pk', 'project_pk', 'slug', 'urlconf'])
+
+# Host -> DomainResolution for hosts that have a Domain object, or ``None``
+# for hosts that were looked up and have none.
+domain_cache = LRUCache(
+    max_size=getattr(settings, 'DOMAIN_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'DOMAIN_CACHE_TTL', 5 * 60),
+)
+
+
+# Slug -> tuple of the project's field values, or ``None`` for slugs that
+# don't match a project. Each request builds its own instance from them.
+project_cache = LRUCache(
+    max_size=getattr(settings, 'PROJECT_CACHE_SIZE', 1000),
+    ttl=getattr(settings, 'PROJECT_CACHE_TTL', 60),
+)
+
+
+class DomainHitCounter(object):
+
+    """Buffer ``Domain.count`` increments and write them in batches
+
+    Hits are kept in memory per domain and flushed with one ``UPDATE`` per
+    distinct increment once ``flush_size`` hits are pending or
+    ``flush_interval`` seconds have passed since the last flush. Hits still
+    pending when the process exits are flushed then.
+    """
+
+    def __init__(self, flush_size=100, flush_interval=60):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._pending = defaultdict(int)
+        self._pending_total = 0
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+
+    def incr(self, domain_pk):
+        with self._lock:
+            self._pending[domain_pk] += 1
+            self._pending_total += 1
+            should_flush = (
+                self._pending_total >= self.flush_size or
+                time.time() - self._last_flush >= self.flush_interval)
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = defaultdict(int)
+            self._pending_total = 0
+            self._last_flush = time.time()
+        by_hits = defaultdict(list)
+        for domain_pk, hits in pending.items():
+            by_hits[hits].append(domain_pk)
+        for hits, domain_pks in by_hits.items():
+            try:
+                (Domain.objects.filter(pk__in=domain_pks)
+                 .update(count=F('count') + hits))
+            except Exception:
+                log.error('Failed to flush domain hit counts', exc_info=True)
+        return len(pending)
+
+
+domain_hits = DomainHitCounter(
+    flush_size=getattr(settings, 'DOMAIN_COUNT_FLUSH_SIZE', 100),
+    flush_interval=getattr(settings, 'DOMAIN_COUNT_FLUSH_INTERVAL', 60),
+)
+atexit.register(domain_hits.flush)
+
+
+def resolve_domain_host(host):
+    """Return the :py:class:`DomainResolution` for ``host``, or ``None``
+
+    Results, including misses, are kept in ``domain_cache``.
+    """
+    resolution = domain_cache.get(host, False)
+    if resolution is not False:
+        return resolution
+    resolution = None
+    domain = (Domain.objects.filter(domain=host)
+              .select_related('project').first())
+    if domain is not None:
+        resolution = DomainResolution(
+            domain_pk=domain.pk,
+            project_pk=domain.project.pk,
+            slug=domain.project.slug,
+            urlconf='core.subdomain_urls',
+        )
+    domain_cache.set(host, resolution)
+    return resolution
+
+
+def get_cached_project(slug):
+    """Return a new instance of the project for ``slug``, or ``None``
+
+    Only the field values of the project are kept in ``project_cache``, so
+    that state set on an instance during a request never leaks into others.
+    """
+    field_names = [field.name for field in Project._meta.concrete_fields]
+    values = project_cache.get(slug, False)
+    if values is False:
+        values = (Project.objects.filter(slug=slug)
+                  .values_list(*field_names).first())
+        project_cache.set(slug, values)
+    if values is None:
+        return None
+    return Project.from_db('default', field_names, values)
+
+
+def get_request_project(request, slug):
+    """Return the project for ``slug``, resolving it once per request
+
+    Middleware, views and redirect handling all need the project being
+    served. The first caller resolves it, later callers on the same request
+    get the same instance back without touching the database.
+
+    :param request: Request being served
+    :param slug: Project slug
+    :returns: :py:class:`Project` instance or ``None``
+    """
+    projects = getattr(request, '_resolved_projects', None)
+    if projects is None:
+        projects = request._resolved_projects = {}
+    if slug not in projects:
+        projects[slug] = get_cached_project(slug)
+    return projects[slug]
+
+
+@receiver(post_save, sender=Domain)
+@receiver(post_delete, sender=Domain)
+def invalidate_domain_cache(sender, instance, **kwargs):
+    domain_cache.delete(instance.domain)
+    domain_cache.delete_matching(
+        lambda host, resolution: (resolution is not None and
+                                  resolution.domain_pk == instance.pk))
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_project_domain_cache(sender, instance, **kwargs):
+    domain_cache.delete_matching(
+        lambda host, resolution: (resolution is not None and
+                                  resolution.project_pk == instance.pk))
+    pk_index = Project._meta.concrete_fields.index(Project._meta.pk)
+    project_cache.delete(instance.slug)
+    project_cache.delete_matching(
+        lambda slug, values: (values is not None and
+                              values[pk_index] == instance.pk))
+
 
 class SubdomainMiddleware(object):
 
@@ -41,18 +201,14 @@ class SubdomainMiddleware(object):
            'localhost' not in host and \
            'testserver' not in host:
             request.cname = True
-            domains = Domain.objects.filter(domain=host)
-            if domains.count():
-                for domain in domains:
-                    if domain.domain == host:
-                        request.slug = domain.project.slug
-                        request.urlconf = 'core.subdomain_urls'
-                        request.domain_object = True
-                        domain.count = domain.count + 1
-                        domain.save()
-                        log.debug(LOG_TEMPLATE.format(
-                            msg='Domain Object Detected: %s' % domain.domain, **log_kwargs))
-                        break
+            resolution = resolve_domain_host(host)
+            if resolution is not None:
+                request.slug = resolution.slug
+                request.urlconf = resolution.urlconf
+                request.domain_object = True
+                domain_hits.incr(resolution.domain_pk)
+                log.debug(LOG_TEMPLATE.format(
+                    msg='Domain Object Detected: %s' % host, **log_kwargs))
             if not hasattr(request, 'domain_object') and 'HTTP_X_RTD_SLUG' in request.META:
                 request.slug = request.META['HTTP_X_RTD_SLUG'].lower()
                 request.urlconf = 'readthedocs.core.subdomain_urls'
@@ -87,8 +243,8 @@ class SubdomainMiddleware(object):
                         if created:
                             domain.machine = True
                             domain.cname = True
-                        domain.count = domain.count + 1
-                        domain.save()
+                            domain.save()
+                        domain_hits.incr(domain.pk)
                     except (ObjectDoesNotExist, MultipleObjectsReturned):
                         log.debug(LOG_TEMPLATE.format(
                             msg='Project CNAME does not exist: %s' % slug,
@@ -144,9 +300,9 @@ class SingleVersionMiddleware(object):
     def process_request(self, request):
         slug = self._get_slug(request)
         if slug:
-            try:
-                proj = Project.objects.get(slug=slug)
-            except (ObjectDoesNotExist, MultipleObjectsReturned):
+            proj = get_request_project(request, slug)
+            request.project = proj
+            if proj is None:
                 # Let 404 be handled further up stack.
                 return None
 
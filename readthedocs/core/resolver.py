@@ -26,8 +26,108 @@ All possible URL's::
     /docs/<project_slug>/projects/<subproject_slug>/<filename> # Subproject Single Version
 """
 
-from django.conf import settings
 import re
+from collections import namedtuple
+
+from django.conf import settings
+
+from readthedocs.core.cache import LRUCache
+
+
+ResolverContext = namedtuple('ResolverContext', [
+    'project_pk',
+    # Slug and subproject alias the project's URLs are served under
+    'project_slug', 'subproject_slug', 'translation',
+    # Canonical domain used for paths, which is the parent's for subprojects
+    'path_domain',
+    # Project and canonical domain the project's docs are served from
+    'canonical_slug', 'canonical_domain',
+    # ``Project.default_version`` and the version slug it resolves to
+    'default_version', 'resolved_default_version',
+    # Projects whose changes make this context stale
+    'related_pks',
+])
+
+# Project pk -> ResolverContext
+resolver_context_cache = LRUCache(
+    max_size=getattr(settings, 'RESOLVER_CACHE_SIZE', 5000),
+    ttl=getattr(settings, 'RESOLVER_CACHE_TTL', 5 * 60),
+)
+
+
+def get_resolver_context(project):
+    """
+    Return the :py:class:`ResolverContext` of ``project``
+
+    This holds everything resolving a project's URLs needs from the
+    database: its parent relation, translation root, canonical domains and
+    default version. Contexts are cached per project and dropped when any
+    of those change. Callers resolving many URLs of one project can get the
+    context once and pass it to :py:func:`resolve_path` and
+    :py:func:`resolve_domain`.
+    """
+    context = None
+    if project.pk is not None:
+        context = resolver_context_cache.get(project.pk)
+    if context is None:
+        context = _build_resolver_context(project)
+        if project.pk is not None:
+            resolver_context_cache.set(project.pk, context)
+    return context
+
+
+def _build_resolver_context(project):
+    relation = project.superprojects.select_related('parent').first()
+    main_language_project = project.main_language_project
+    domain = _canonical_domain(project)
+    related_pks = [project.pk]
+
+    if main_language_project:
+        project_slug = main_language_project.slug
+        subproject_slug = None
+        path_domain = domain
+        canonical_project = main_language_project
+        canonical_domain = _canonical_domain(main_language_project)
+    elif relation:
+        project_slug = relation.parent.slug
+        subproject_slug = relation.alias
+        path_domain = _canonical_domain(relation.parent)
+        canonical_project = relation.parent
+        canonical_domain = path_domain
+    else:
+        project_slug = project.slug
+        subproject_slug = None
+        path_domain = domain
+        canonical_project = project
+        canonical_domain = domain
+    related_pks.append(canonical_project.pk)
+
+    return ResolverContext(
+        project_pk=project.pk,
+        project_slug=project_slug,
+        subproject_slug=subproject_slug,
+        translation=bool(main_language_project),
+        path_domain=path_domain,
+        canonical_slug=canonical_project.slug,
+        canonical_domain=canonical_domain,
+        default_version=project.default_version,
+        resolved_default_version=project.get_default_version(),
+        related_pks=frozenset(related_pks),
+    )
+
+
+def _canonical_domain(project):
+    domain = project.domains.filter(canonical=True).first()
+    if domain:
+        return domain.domain
+    return None
+
+
+def invalidate_resolver_context(project_pks):
+    """Drop cached contexts depending on any of ``project_pks``"""
+    project_pks = set(project_pks)
+    resolver_context_cache.delete_matching(
+        lambda pk, context: not project_pks.isdisjoint(context.related_pks))
 
 
 def _fix_filename(project, filename):
@@ -78,29 +178,31 @@ def base_resolve_path(project_slug, filename, version_slug=None, language=None,
 
 
 def resolve_path(project, filename='', version_slug=None, language=None,
-                 single_version=None, subdomain=None, cname=None):
+                 single_version=None, subdomain=None, cname=None,
+                 context=None):
     """ Resolve a URL with a subset of fields defined."""
     subdomain = getattr(settings, 'USE_SUBDOMAIN', False)
-    relation = project.superprojects.first()
-    cname = cname or project.domains.filter(canonical=True).first()
-    main_language_project = project.main_language_project
+    if context is None:
+        context = get_resolver_context(project)
 
-    version_slug = version_slug or project.get_default_version()
+    if not version_slug:
+        if context.default_version == project.default_version:
+            version_slug = context.resolved_default_version
+        else:
+            version_slug = project.get_default_version()
     language = language or project.language
 
     filename = _fix_filename(project, filename)
 
-    if main_language_project:
-        project_slug = main_language_project.slug
+    project_slug = context.project_slug
+    subproject_slug = context.subproject_slug
+    if context.translation:
         language = project.language
-        subproject_slug = None
-    elif relation:
-        project_slug = relation.parent.slug
-        subproject_slug = relation.alias
-        cname = relation.parent.domains.filter(canonical=True).first()
+        cname = cname or context.path_domain
+    elif subproject_slug:
+        cname = context.path_domain
     else:
-        project_slug = project.slug
-        subproject_slug = None
+        cname = cname or context.path_domain
 
     if project.single_version or single_version:
         single_version = True
@@ -113,32 +215,27 @@ def resolve_path(project, filename='', version_slug=None, language=None,
                              subdomain=subdomain, cname=cname)
 
 
-def resolve_domain(project):
-    main_language_project = project.main_language_project
-    relation = project.superprojects.first()
+def resolve_domain(project, context=None):
     subdomain = getattr(settings, 'USE_SUBDOMAIN', False)
     prod_domain = getattr(settings, 'PRODUCTION_DOMAIN')
-    if main_language_project:
-        canonical_project = main_language_project
-    elif relation:
-        canonical_project = relation.parent
-    else:
-        canonical_project = project
+    if context is None:
+        context = get_resolver_context(project)
 
-    domain = canonical_project.domains.filter(canonical=True).first()
     # Force domain even if USE_SUBDOMAIN is on
-    if domain:
-        return domain.domain
+    if context.canonical_domain:
+        return context.canonical_domain
     elif subdomain:
-        subdomain_slug = canonical_project.slug.replace('_', '-')
+        subdomain_slug = context.canonical_slug.replace('_', '-')
         return "%s.%s" % (subdomain_slug, prod_domain)
     else:
         return prod_domain
 
 
 def resolve(project, protocol='http', filename='', **kwargs):
+    context = kwargs.pop('context', None) or get_resolver_context(project)
     return '{protocol}://{domain}{path}'.format(
         protocol=protocol,
-        domain=resolve_domain(project),
-        path=resolve_path(project, filename=filename, **kwargs),
+        domain=resolve_domain(project, context=context),
+        path=resolve_path(project, filename=filename, context=context,
+                          **kwargs),
     )
@@ -9,7 +9,10 @@ from django.conf import settings
 from django.http import HttpResponse, HttpResponseRedirect, Http404, HttpResponseNotFound
 from django.shortcuts import render_to_response, get_object_or_404, redirect
 from django.db.models import Max, F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.template import RequestContext
+from django.utils.cache import patch_cache_control
 from django.views.decorators.csrf import csrf_exempt
 from django.views.static import serve
 from django.views.generic import TemplateView
@@ -20,12 +23,15 @@ import stripe
 
 from readthedocs.builds.models import Build
 from readthedocs.builds.models import Version
+from readthedocs.core.cache import LRUCache
 from readthedocs.core.forms import FacetedSearchForm
+from readthedocs.core.middleware import get_cached_project, get_request_project
 from readthedocs.core.utils import trigger_build
 from readthedocs.donate.mixins import DonateProgressMixin
 from readthedocs.builds.constants import LATEST
 from readthedocs.projects import constants
 from readthedocs.projects.models import Project, ImportedFile, ProjectRelationship
+from readthedocs.projects.signals import versions_synced
 from readthedocs.projects.tasks import remove_dir, update_imported_docs
 from readthedocs.redirects.models import Redirect
 from readthedocs.redirects.utils import get_redirect_response
@@ -35,11 +41,23 @@ import mimetypes
 import os
 import logging
 import re
+from collections import namedtuple
 
 log = logging.getLogger(__name__)
 pc_log = logging.getLogger(__name__ + '.post_commit')
 
 
+SuggestionIndex = namedtuple(
+    'SuggestionIndex',
+    ['translations', 'version_slugs', 'public_versions', 'related_pks'])
+
+# Project pk -> SuggestionIndex
+suggestion_index_cache = LRUCache(
+    max_size=getattr(settings, 'SUGGESTION_CACHE_SIZE', 5000),
+    ttl=getattr(settings, 'SUGGESTION_CACHE_TTL', 5 * 60),
+)
+
+
 class NoProjectException(Exception):
     pass
 
@@ -417,22 +435,20 @@ def redirect_page_with_filename(request, filename, project_slug=None):
 def serve_docs(request, lang_slug, version_slug, filename, project_slug=None):
     if not project_slug:
         project_slug = request.slug
+    proj = get_request_project(request, project_slug)
+    if proj is not None and proj.privacy_level not in [constants.PUBLIC,
+                                                       constants.PROTECTED]:
+        # Private projects depend on the user's permissions
+        proj = Project.objects.protected(request.user).filter(pk=proj.pk).first()
     try:
-        proj = Project.objects.protected(request.user).get(slug=project_slug)
         ver = Version.objects.public(request.user).get(
             project__slug=project_slug, slug=version_slug)
-    except (Project.DoesNotExist, Version.DoesNotExist):
-        proj = None
+    except Version.DoesNotExist:
         ver = None
     if not proj or not ver:
         return server_helpful_404(request, project_slug, lang_slug, version_slug,
                                   filename)
 
-    if ver not in proj.versions.public(request.user, proj, only_active=False):
-        r = render_to_response('401.html',
-                               context_instance=RequestContext(request))
-        r.status_code = 401
-        return r
     return _serve_docs(request, project=proj, version=ver, filename=filename,
                        lang_slug=lang_slug, version_slug=version_slug,
                        project_slug=project_slug)
@@ -498,10 +514,10 @@ def _serve_docs(request, project, version, filename, lang_slug=None,
 def serve_single_version_docs(request, filename, project_slug=None):
     if not project_slug:
         project_slug = request.slug
-    proj = get_object_or_404(Project, slug=project_slug)
+    proj = get_request_project(request, project_slug)
 
     # This function only handles single version projects
-    if not proj.single_version:
+    if proj is None or not proj.single_version:
         raise Http404
 
     return serve_docs(request, proj.language, proj.default_version,
@@ -539,16 +555,82 @@ def server_helpful_404(
         return response
     pagename = re.sub(
         r'/index$', r'', re.sub(r'\.html$', r'', re.sub(r'/$', r'', filename)))
+    project = None
+    if project_slug:
+        project = get_request_project(request, project_slug)
     suggestion = get_suggestion(
-        project_slug, lang_slug, version_slug, pagename, request.user)
+        project_slug, lang_slug, version_slug, pagename, request.user,
+        project=project)
     r = render_to_response(template_name,
                            {'suggestion': suggestion},
                            context_instance=RequestContext(request))
     r.status_code = 404
+    if not request.user.is_authenticated():
+        # Crawlers hit the same missing pages over and over
+        patch_cache_control(
+            r, public=True,
+            max_age=getattr(settings, 'NOT_FOUND_CACHE_MAX_AGE', 5 * 60))
     return r
 
 
-def get_suggestion(project_slug, lang_slug, version_slug, pagename, user):
+def get_suggestion_index(project):
+    """
+    Return the :py:class:`SuggestionIndex` of ``project``
+
+    The index holds what 404 suggestions need to know about a project and
+    its translations: the slugs of all their versions, and of their public
+    active versions, keyed by project pk. It is built with two queries and
+    cached, so suggesting a page doesn't query the database.
+    """
+    index = suggestion_index_cache.get(project.pk)
+    if index is None:
+        translations = tuple(project.translations.all())
+        projects = dict((p.pk, p) for p in (project,) + translations)
+        version_slugs = dict((pk, set()) for pk in projects)
+        public_versions = dict((pk, []) for pk in projects)
+        for (project_pk, slug, active, privacy_level) in (
+                Version.objects.filter(project__in=projects.keys())
+                .values_list('project', 'slug', 'active', 'privacy_level')):
+            version_slugs[project_pk].add(slug)
+            if (active and privacy_level == constants.PUBLIC and
+                    projects[project_pk].privacy_level == constants.PUBLIC):
+                public_versions[project_pk].append(slug)
+        index = SuggestionIndex(
+            translations=translations,
+            version_slugs=version_slugs,
+            public_versions=public_versions,
+            related_pks=frozenset(projects),
+        )
+        suggestion_index_cache.set(project.pk, index)
+    return index
+
+
+def invalidate_suggestion_index(project_pks):
+    project_pks = set(project_pks)
+    suggestion_index_cache.delete_matching(
+        lambda pk, index: not project_pks.isdisjoint(index.related_pks))
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_project_suggestions(sender, instance, **kwargs):
+    invalidate_suggestion_index(
+        [instance.pk, instance.main_language_project_id])
+
+
+@receiver(post_save, sender=Version)
+@receiver(post_delete, sender=Version)
+def invalidate_version_suggestions(sender, instance, **kwargs):
+    invalidate_suggestion_index([instance.project_id])
+
+
+@receiver(versions_synced)
+def invalidate_synced_suggestions(sender, project, **kwargs):
+    invalidate_suggestion_index([project.pk])
+
+
+def get_suggestion(project_slug, lang_slug, version_slug, pagename, user,
+                   project=None):
     """
     | # | project | version | language | What to show |
     | 1 |    0    |    0    |     0    | Error message |
@@ -559,99 +641,97 @@ def get_suggestion(project_slug, lang_slug, version_slug, pagename, user):
     | 6 |    1    |    0    |     1    | Available versions on the translation project |
     | 7 |    1    |    1    |     0    | Available translations of requested version |
     | 8 |    1    |    1    |     1    | A link to top-level page of requested version |
+
+    Versions and translations are looked up in the project's
+    :py:class:`SuggestionIndex`. Only listing versions for a logged in
+    user, who may see private versions, queries the database.
+
+    :param project: The project for ``project_slug``, if already fetched
     """
 
     suggestion = {}
+    proj = None
     if project_slug:
-        try:
-            proj = Project.objects.get(slug=project_slug)
-            if not lang_slug:
-                lang_slug = proj.language
-            try:
-                ver = Version.objects.get(
-                    project__slug=project_slug, slug=version_slug)
-            except Version.DoesNotExist:
-                ver = None
-
-            if ver:  # if requested version is available on main project
-                if lang_slug != proj.language:
-                    try:
-                        translations = proj.translations.filter(
-                            language=lang_slug)
-                        if translations:
-                            ver = Version.objects.get(
-                                project__slug=translations[0].slug, slug=version_slug)
-                        else:
-                            ver = None
-                    except Version.DoesNotExist:
-                        ver = None
-                # if requested version is available on translation project too
-                if ver:
-                    # Case #8: Show a link to top-level page of the version
-                    suggestion['type'] = 'top'
-                    suggestion['message'] = "What are you looking for?"
-                    suggestion['href'] = proj.get_docs_url(ver.slug, lang_slug)
-                # requested version is available but not in requested language
-                else:
-                    # Case #7: Show available translations of the version
-                    suggestion['type'] = 'list'
-                    suggestion['message'] = (
-                        "Requested page seems not to be translated in "
-                        "requested language. But it's available in these "
-                        "languages.")
-                    suggestion['list'] = []
-                    suggestion['list'].append({
-                        'label': proj.language,
-                        'project': proj,
-                        'version_slug': version_slug,
-                        'pagename': pagename
-                    })
-                    for t in proj.translations.all():
-                        try:
-                            Version.objects.get(
-                                project__slug=t.slug, slug=version_slug)
-                            suggestion['list'].append({
-                                'label': t.language,
-                                'project': t,
-                                'version_slug': version_slug,
-                                'pagename': pagename
-                            })
-                        except Version.DoesNotExist:
-                            pass
-            else:  # requested version does not exist on main project
-                if lang_slug == proj.language:
-                    trans = proj
-                else:
-                    translations = proj.translations.filter(language=lang_slug)
-                    trans = translations[0] if translations else None
-                if trans:  # requested language is available
-                    # Case #6: Show available versions of the translation
-                    suggestion['type'] = 'list'
-                    suggestion['message'] = (
-                        "Requested version seems not to have been built yet. "
-                        "But these versions are available.")
-                    suggestion['list'] = []
-                    for v in Version.objects.public(user, trans, True):
+        proj = project or get_cached_project(project_slug)
+    if proj is not None:
+        index = get_suggestion_index(proj)
+        if not lang_slug:
+            lang_slug = proj.language
+
+        def translation(language):
+            for trans in index.translations:
+                if trans.language == language:
+                    return trans
+
+        ver = version_slug in index.version_slugs[proj.pk]
+        if ver:  # if requested version is available on main project
+            if lang_slug != proj.language:
+                trans = translation(lang_slug)
+                ver = (trans is not None and
+                       version_slug in index.version_slugs[trans.pk])
+            # if requested version is available on translation project too
+            if ver:
+                # Case #8: Show a link to top-level page of the version
+                suggestion['type'] = 'top'
+                suggestion['message'] = "What are you looking for?"
+                suggestion['href'] = proj.get_docs_url(version_slug, lang_slug)
+            # requested version is available but not in requested language
+            else:
+                # Case #7: Show available translations of the version
+                suggestion['type'] = 'list'
+                suggestion['message'] = (
+                    "Requested page seems not to be translated in "
+                    "requested language. But it's available in these "
+                    "languages.")
+                suggestion['list'] = []
+                suggestion['list'].append({
+                    'label': proj.language,
+                    'project': proj,
+                    'version_slug': version_slug,
+                    'pagename': pagename
+                })
+                for t in index.translations:
+                    if version_slug in index.version_slugs[t.pk]:
                         suggestion['list'].append({
-                            'label': v.slug,
-                            'project': trans,
-                            'version_slug': v.slug,
+                            'label': t.language,
+                            'project': t,
+                            'version_slug': version_slug,
                             'pagename': pagename
                         })
-                # requested project exists but requested version and language
-                # are not available.
+        else:  # requested version does not exist on main project
+            if lang_slug == proj.language:
+                trans = proj
+            else:
+                trans = translation(lang_slug)
+            if trans:  # requested language is available
+                # Case #6: Show available versions of the translation
+                suggestion['type'] = 'list'
+                suggestion['message'] = (
+                    "Requested version seems not to have been built yet. "
+                    "But these versions are available.")
+                suggestion['list'] = []
+                if user is not None and user.is_authenticated():
+                    slugs = [v.slug for v in
+                             Version.objects.public(user, trans, True)]
                 else:
-                    # Case #5: Show a link to top-level page of default version
-                    # of main project
-                    suggestion['type'] = 'top'
-                    suggestion['message'] = 'What are you looking for??'
-                    suggestion['href'] = proj.get_docs_url()
-        except Project.DoesNotExist:
-            # Case #1-4: Show error mssage
-            suggestion['type'] = 'none'
-            suggestion[
-                'message'] = "We're sorry, we don't know what you're looking for"
+                    slugs = index.public_versions[trans.pk]
+                for slug in slugs:
+                    suggestion['list'].append({
+                        'label': slug,
+                        'project': trans,
+                        'version_slug': slug,
+                        'pagename': pagename
+                    })
+            # requested project exists but requested version and language
+            # are not available.
+            else:
+                # Case #5: Show a link to top-level page of default version
+                # of main project
+                suggestion['type'] = 'top'
+                suggestion['message'] = 'What are you looking for??'
+                suggestion['href'] = proj.get_docs_url()
     else:
+        # Case #1-4: Show error mssage
         suggestion['type'] = 'none'
         suggestion[
             'message'] = "We're sorry, we don't know what you're looking for"
@@ -0,0 +1,127 @@
+"""Resource usage of build phases
+
+Each phase of a build, like cloning the repository, installing the
+virtualenv or running one of the doc builders, records its wall time, CPU
+time, peak memory and output size. Phases are saved through the API as
+:py:class:`~readthedocs.builds.models.BuildPhase` objects, and summarized
+across builds by the ``build_phase_percentiles`` management command.
+"""
+
+import logging
+import os
+import resource
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from readthedocs.projects.constants import LOG_TEMPLATE
+from readthedocs.restapi.client import api as api_v2
+
+log = logging.getLogger(__name__)
+
+PhaseProfile = namedtuple('PhaseProfile', ['name', 'elapsed', 'cpu_time',
+                                           'max_rss', 'output_size'])
+
+
+def path_size(path):
+    """Return the total size in bytes of the files under ``path``"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    size = 0
+    for root, __, filenames in os.walk(path):
+        for filename in filenames:
+            full_path = os.path.join(root, filename)
+            if not os.path.islink(full_path):
+                size += os.path.getsize(full_path)
+    return size
+
+
+class BuildPhaseProfiler(object):
+
+    """Profile the phases of a build
+
+    CPU time and peak memory come from :py:func:`resource.getrusage`, for
+    this process and the commands it waited for. Commands run in a Docker
+    container aren't children of this process and are left out.
+
+    Peak memory is the largest resident set size of any command run so far,
+    as the kernel keeps no per phase figure. It is only recorded for phases
+    that raised it, and is in kilobytes on Linux.
+
+    :param build_env: Build environment the phases run commands through
+    """
+
+    def __init__(self, build_env=None):
+        self.build_env = build_env
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name, output_path=None, skip_idle=False):
+        """Profile the wrapped block as the phase ``name``
+
+        :param output_path: File or directory the phase writes to, measured
+            once the phase is done
+        :param skip_idle: Don't record the phase if it ran no build commands
+
+        Failing to measure or record the phase is logged, and never replaces
+        an exception raised by the phase.
+        """
+        commands = self.command_count()
+        own_usage = resource.getrusage(resource.RUSAGE_SELF)
+        children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            try:
+                if not skip_idle or self.command_count() > commands:
+                    self.record(name, elapsed, own_usage, children_usage,
+                                output_path)
+            except Exception:
+                self.log_failure('Failed to profile build phase %s' % name)
+
+    def command_count(self):
+        if self.build_env is None:
+            return 0
+        return len(self.build_env.commands)
+
+    def record(self, name, elapsed, own_usage, children_usage, output_path):
+        own_end = resource.getrusage(resource.RUSAGE_SELF)
+        children_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_time = sum(end.ru_utime + end.ru_stime -
+                       begin.ru_utime - begin.ru_stime
+                       for begin, end in [(own_usage, own_end),
+                                          (children_usage, children_end)])
+        max_rss = None
+        if children_end.ru_maxrss > children_usage.ru_maxrss:
+            max_rss = children_end.ru_maxrss
+        output_size = None
+        if output_path is not None and os.path.exists(output_path):
+            output_size = path_size(output_path)
+        profile = PhaseProfile(name=name, elapsed=elapsed, cpu_time=cpu_time,
+                               max_rss=max_rss, output_size=output_size)
+        self.phases.append(profile)
+        self.save(profile)
+
+    def save(self, profile):
+        """Save ``profile`` on the build through the API"""
+        build_env = self.build_env
+        if build_env is None or not build_env.record:
+            return
+        build_id = build_env.build.get('id')
+        if not build_id:
+            return
+        data = dict(profile._asdict(), build=build_id)
+        try:
+            api_v2.phase.post(data)
+        except Exception:
+            # Profiling must not fail the build
+            self.log_failure('Failed to save build phase %s' % profile.name)
+
+    def log_failure(self, msg):
+        build_env = self.build_env
+        if build_env is not None:
+            msg = LOG_TEMPLATE.format(project=build_env.project.slug,
+                                      version=build_env.version.slug, msg=msg)
+        log.warning(msg, exc_info=True)
@@ -0,0 +1,143 @@
+"""Reusable virtualenvs for builds
+
+Creating a virtualenv and installing the pinned build requirements into it
+is often the longest part of a build. The result only depends on the python
+interpreter, the pinned requirements and whether system packages are used,
+so it is kept as a per project template, keyed by :py:func:`template_key`,
+and copied into the version's virtualenv. A version's virtualenv records the
+template it was created from, along with a digest of the project's
+requirements file, in a state file so later builds can reuse it as is.
+Requirements files that could install something else without changing
+have no digest, see :py:func:`requirements_digest`, and are installed on
+every build as before.
+
+Templates are not shared between projects, as a project's build could
+modify any file it can write to.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+
+log = logging.getLogger(__name__)
+
+STATE_FILE = 'readthedocs-environment.json'
+
+BASE_REQUIREMENTS = [
+    'sphinx==1.3.1',
+    'Pygments==2.0.2',
+    'virtualenv==13.1.0',
+    'setuptools==18.0.1',
+    'docutils==0.11',
+    'mkdocs==0.14.0',
+    'mock==1.0.1',
+    'pillow==2.6.1',
+    'readthedocs-sphinx-ext==0.5.4',
+    'sphinx-rtd-theme==0.1.9',
+    'alabaster>=0.7,<0.8,!=0.7.5',
+    'recommonmark==0.1.1',
+]
+
+# A requirement pinned to one version, with optional extras and markers
+PINNED_REQUIREMENT = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*\s*'
+                                r'(\[[^\]]*\])?\s*===?\s*[^\s*,;]+\s*(;.*)?$')
+
+# Larger files in bin/ are binaries, like the python interpreter
+MAX_SCRIPT_SIZE = 1024 * 1024
+
+
+def template_key(python_interpreter, requirements, use_system_packages):
+    """Return the key of the template for these virtualenv settings"""
+    settings = [python_interpreter, sorted(requirements),
+                bool(use_system_packages)]
+    return hashlib.sha256(json.dumps(settings)).hexdigest()[:16]
+
+
+def load_state(path):
+    """Return the state saved in the virtualenv at ``path``"""
+    try:
+        with open(os.path.join(path, STATE_FILE)) as fh:
+            return json.load(fh)
+    except (IOError, ValueError):
+        return {}
+
+
+def save_state(path, state):
+    with open(os.path.join(path, STATE_FILE), 'w') as fh:
+        json.dump(state, fh)
+
+
+def requirements_digest(path):
+    """Return a digest of the requirements file at ``path``
+
+    Only the file itself is hashed, so ``None`` is returned unless every
+    requirement is pinned to an exact version. Unpinned, VCS and URL
+    requirements, included files and installs from the checkout can all
+    install something else without the file changing. ``None`` is also
+    returned when the file can't be read.
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as fh:
+            for line in fh:
+                digest.update(line)
+                requirement = re.sub(r'(^|\s)#.*', '', line)
+                requirement = requirement.strip().rstrip('\\').strip()
+                if not requirement:
+                    continue
+                if requirement.startswith('-'):
+                    if requirement.startswith(('-r', '-c', '--requirement',
+                                               '--constraint', '-e',
+                                               '--editable')):
+                        return None
+                    # Index options, and hashes continued from a requirement
+                    continue
+                requirement = re.sub(r'\s--hash[=\s]\S+', '', requirement)
+                if not PINNED_REQUIREMENT.match(requirement):
+                    return None
+    except IOError:
+        return None
+    return digest.hexdigest()
+
+
+def relocate_virtualenv(path, old_path):
+    """Point the virtualenv at ``path``, last at ``old_path``, to itself
+
+    Virtualenvs record their absolute path in script shebang lines, the
+    activate scripts, ``.pth`` files and some symlinks.
+    """
+    old_path = old_path.rstrip('/')
+    path = path.rstrip('/')
+    for root, dirnames, filenames in os.walk(path):
+        for name in dirnames + filenames:
+            full_path = os.path.join(root, name)
+            if os.path.islink(full_path):
+                link = os.readlink(full_path)
+                if link == old_path or link.startswith(old_path + '/'):
+                    os.remove(full_path)
+                    os.symlink(path + link[len(old_path):], full_path)
+                continue
+            if name not in filenames:
+                continue
+            if not (os.path.basename(root) == 'bin' or
+                    name.endswith(('.pth', '.egg-link'))):
+                continue
+            if os.path.getsize(full_path) > MAX_SCRIPT_SIZE:
+                continue
+            with open(full_path, 'rb') as fh:
+                content = fh.read()
+            if b'\0' in content or old_path not in content:
+                continue
+            with open(full_path, 'wb') as fh:
+                fh.write(content.replace(old_path, path))
+
+
+def clone_virtualenv(source, target):
+    """Replace the virtualenv at ``target`` with a copy of ``source``"""
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    shutil.copytree(source, target, symlinks=True)
+    relocate_virtualenv(target, source)
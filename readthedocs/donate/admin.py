@@ -11,7 +11,7 @@ class SupporterAdmin(admin.ModelAdmin):
 
 class SupporterPromoAdmin(admin.ModelAdmin):
     model = SupporterPromo
-    list_display = ('name', 'display_type', 'text', 'live')
+    list_display = ('name', 'display_type', 'text', 'live', 'weight')
     list_filter = ('live', 'display_type')
 
 
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donate', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supporterpromo',
+            name='weight',
+            field=models.PositiveIntegerField(default=1, help_text='Share of views relative to the other live promos of the same display type', verbose_name='Weight'),
+        ),
+    ]
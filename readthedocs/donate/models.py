@@ -62,6 +62,10 @@ class SupporterPromo(models.Model):
                                     choices=DISPLAY_CHOICES, default='doc')
 
     live = models.BooleanField(_('Live'), default=False)
+    weight = models.PositiveIntegerField(
+        _('Weight'), default=1,
+        help_text=_('Share of views relative to the other live promos of '
+                    'the same display type'))
 
     def __str__(self):
         return self.name
@@ -0,0 +1,117 @@
+"""Promo selection
+
+Live promos change a few times a day, but one is picked on every page view
+that shows a promo. They are kept in process memory per display type,
+reloaded once ``PROMO_CACHE_TTL`` seconds have passed or a promo is saved,
+and picked with the alias method, so a weighted pick costs the same as a
+uniform one.
+"""
+
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import SupporterPromo
+
+
+class WeightedChoice(object):
+
+    """Constant time weighted random choice over a fixed list of items
+
+    :param items: Items to choose from
+    :param weights: Relative weight of each item
+    """
+
+    def __init__(self, items, weights):
+        self.items = list(items)
+        count = len(self.items)
+        total = float(sum(weights))
+        self._probability = [1.0] * count
+        self._alias = range(count)
+        if not count or total <= 0:
+            self.items = []
+            return
+        scaled = [weight * count / total for weight in weights]
+        small = [num for num, prob in enumerate(scaled) if prob < 1]
+        large = [num for num, prob in enumerate(scaled) if prob >= 1]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self._probability[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+
+    def choice(self):
+        """Return a random item, or ``None`` if there are none"""
+        if not self.items:
+            return None
+        position = random.random() * len(self.items)
+        num = int(position)
+        if position - num < self._probability[num]:
+            return self.items[num]
+        return self.items[self._alias[num]]
+
+
+class PromoRotation(object):
+
+    """Live promos per display type, held in memory
+
+    :param ttl: Seconds before promos are reloaded from the database
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._choices = None
+        self._loaded = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        promos = defaultdict(list)
+        for promo in SupporterPromo.objects.filter(live=True, weight__gt=0):
+            promos[promo.display_type].append(promo)
+        return dict(
+            (display_type, WeightedChoice(items, [promo.weight for promo in items]))
+            for (display_type, items) in promos.items())
+
+    def get(self, display_type):
+        """Return a live promo for ``display_type``, or ``None``"""
+        choices = self._choices
+        if choices is None or time.time() - self._loaded > self.ttl:
+            with self._lock:
+                choices = self._choices
+                if choices is None or time.time() - self._loaded > self.ttl:
+                    choices = self._choices = self._load()
+                    self._loaded = time.time()
+        if display_type not in choices:
+            return None
+        return choices[display_type].choice()
+
+    def invalidate(self):
+        self._choices = None
+
+
+promo_rotation = PromoRotation(ttl=getattr(settings, 'PROMO_CACHE_TTL', 60))
+
+
+def get_promo(display_type='doc'):
+    """Pick a live promo for a placement
+
+    :param display_type: One of ``doc``, ``site-footer`` or ``search``
+    :rtype: :py:class:`SupporterPromo` or ``None``
+    """
+    return promo_rotation.get(display_type)
+
+
+@receiver(post_save, sender=SupporterPromo)
+@receiver(post_delete, sender=SupporterPromo)
+def invalidate_promo_rotation(sender, **kwargs):
+    promo_rotation.invalidate()
@@ -1,12 +1,23 @@
 import getpass
 import logging
 import os
+import pipes
 import shutil
+import subprocess
+import tempfile
+import time
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
 
 from django.conf import settings
 
+from readthedocs.projects.blobstore import load_manifest
+
 log = logging.getLogger(__name__)
 
+SyncResult = namedtuple(
+    'SyncResult', ['server', 'command', 'returncode', 'elapsed', 'output'])
+
 
 class LocalSyncer(object):
 
@@ -28,43 +39,204 @@ class LocalSyncer(object):
                 shutil.rmtree(target)
             shutil.copytree(path, target)
 
+    @classmethod
+    def copy_blobs(cls, store, manifest_path, target, **kwargs):
+        """Materialize the manifest at ``manifest_path`` in ``target``
+
+        :param store: :py:class:`~readthedocs.projects.blobstore.BlobStore`
+            already holding every blob of the manifest
+        """
+        log.info("Local Materialize %s to %s" % (manifest_path, target))
+        store.materialize(load_manifest(manifest_path), target)
+
 
 class RemoteSyncer(object):
 
+    """Push files to all ``MULTIPLE_APP_SERVERS`` at once
+
+    Each server gets a single ``rsync`` over SSH, which also creates the
+    target directory, and servers are synced in parallel by up to
+    ``SYNC_WORKERS`` threads. SSH connections are shared between syncs to
+    the same server through ``ControlMaster``, so the several copies made
+    for a build only connect once.
+
+    With a blob store, servers are only sent the blobs they are missing and
+    the manifest, which ``BLOB_STORE_MATERIALIZE_COMMAND`` then materializes
+    on the server.
+    """
+
     @classmethod
     def copy(cls, path, target, file=False, **kwargs):
         """
         A better copy command that works with files or directories.
 
         Respects the ``MULTIPLE_APP_SERVERS`` setting when copying.
+
+        :returns: A :py:class:`SyncResult` for each server
         """
-        sync_user = getattr(settings, 'SYNC_USER', getpass.getuser())
+        log.info("Remote Copy %s to %s" % (path, target))
+
+        def _sync(server):
+            return cls.sync_server(server, path, target, file=file)
+
+        return cls.sync_servers(_sync, "Remote Copy %s to %s" % (path, target))
+
+    @classmethod
+    def copy_blobs(cls, store, manifest_path, target, **kwargs):
+        """Send the blobs and manifest at ``manifest_path`` to the servers
+
+        Blobs already on a server aren't sent again, as blobs never change.
+
+        :returns: A :py:class:`SyncResult` for each server
+        """
+        log.info("Remote Materialize %s to %s" % (manifest_path, target))
+        blobs = sorted(set(os.path.relpath(store.blob_path(digest), store.root)
+                           for digest in load_manifest(manifest_path).values()))
+        fd, files_from = tempfile.mkstemp(prefix='rtd-blobs-')
+        with os.fdopen(fd, 'w') as fh:
+            fh.write(''.join(blob + '\n' for blob in blobs))
+
+        def _sync(server):
+            commands = [
+                cls.get_blobs_command(server, store.root, files_from),
+                cls.get_command(server, manifest_path, manifest_path,
+                                file=True),
+                cls.get_materialize_command(server, manifest_path, target),
+            ]
+            elapsed = 0
+            for command in commands:
+                result = cls.run_command(server, command)
+                elapsed += result.elapsed
+                if result.returncode != 0:
+                    break
+            return result._replace(elapsed=elapsed)
+
+        try:
+            return cls.sync_servers(
+                _sync, "Remote Materialize %s to %s" % (manifest_path, target))
+        finally:
+            os.remove(files_from)
+
+    @classmethod
+    def sync_servers(cls, sync, description):
+        """Call ``sync`` with each server, in parallel, and log the results"""
         app_servers = getattr(settings, 'MULTIPLE_APP_SERVERS', [])
-        if app_servers:
-            log.info("Remote Copy %s to %s" % (path, target))
-            for server in app_servers:
-                mkdir_cmd = ("ssh %s@%s mkdir -p %s" % (sync_user, server, target))
-                ret = os.system(mkdir_cmd)
-                if ret != 0:
-                    log.info("COPY ERROR to app servers:")
-                    log.info(mkdir_cmd)
-                if file:
-                    slash = ""
-                else:
-                    slash = "/"
-                # Add a slash when copying directories
-                sync_cmd = (
-                    "rsync -e 'ssh -T' -av --delete {path}{slash} {user}@{server}:{target}"
-                    .format(
-                        path=path,
-                        slash=slash,
-                        user=sync_user,
-                        server=server,
-                        target=target))
-                ret = os.system(sync_cmd)
-                if ret != 0:
-                    log.info("COPY ERROR to app servers.")
-                    log.info(sync_cmd)
+        if not app_servers:
+            return []
+        workers = getattr(settings, 'SYNC_WORKERS', 4)
+        if workers > 1 and len(app_servers) > 1:
+            pool = ThreadPool(min(workers, len(app_servers)))
+            try:
+                results = pool.map(sync, app_servers)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [sync(server) for server in app_servers]
+
+        for result in results:
+            if result.returncode != 0:
+                log.error("COPY ERROR to %s (%s): %s\n%s",
+                          result.server, result.returncode,
+                          ' '.join(result.command), result.output)
+        log.info("%s done: %s", description, ', '.join(
+            '%s %s in %.2fs' % (result.server,
+                                'ok' if result.returncode == 0 else 'failed',
+                                result.elapsed)
+            for result in results))
+        return results
+
+    @classmethod
+    def sync_server(cls, server, path, target, file=False):
+        """Copy ``path`` to ``target`` on ``server``
+
+        :rtype: SyncResult
+        """
+        return cls.run_command(
+            server, cls.get_command(server, path, target, file=file))
+
+    @classmethod
+    def run_command(cls, server, command):
+        """Run ``command``, which acts on ``server``
+
+        :rtype: SyncResult
+        """
+        start = time.time()
+        try:
+            proc = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT)
+            output = proc.communicate()[0]
+            returncode = proc.returncode
+        except OSError as e:
+            output = str(e)
+            returncode = -1
+        return SyncResult(server=server, command=command,
+                          returncode=returncode,
+                          elapsed=time.time() - start, output=output)
+
+    @classmethod
+    def get_command(cls, server, path, target, file=False):
+        """Return the ``rsync`` command copying ``path`` to ``server``
+
+        Directories are copied with their trailing slash, so their contents
+        end up in ``target``. The remote ``rsync`` is started after creating
+        the target directory, instead of running ``mkdir`` over a separate
+        connection.
+        """
+        sync_user = getattr(settings, 'SYNC_USER', getpass.getuser())
+        if file:
+            target_dir = os.path.dirname(target)
+            slash = ''
+        else:
+            target_dir = target
+            slash = '/'
+        return [
+            'rsync', '-e', ' '.join(cls.get_ssh_command()), '-av', '--delete',
+            '--rsync-path', 'mkdir -p %s && rsync' % pipes.quote(target_dir),
+            '{path}{slash}'.format(path=path, slash=slash),
+            '{user}@{server}:{target}'.format(
+                user=sync_user, server=server, target=target),
+        ]
+
+    @classmethod
+    def get_blobs_command(cls, server, root, files_from):
+        """Return the ``rsync`` command sending the blobs in ``files_from``
+
+        Blobs the server already has are skipped without comparing them.
+        """
+        sync_user = getattr(settings, 'SYNC_USER', getpass.getuser())
+        return [
+            'rsync', '-e', ' '.join(cls.get_ssh_command()), '-a',
+            '--ignore-existing', '--files-from', files_from,
+            '--rsync-path', 'mkdir -p %s && rsync' % pipes.quote(root),
+            '{root}/'.format(root=root.rstrip('/')),
+            '{user}@{server}:{root}'.format(user=sync_user, server=server,
+                                            root=root),
+        ]
+
+    @classmethod
+    def get_materialize_command(cls, server, manifest_path, target):
+        sync_user = getattr(settings, 'SYNC_USER', getpass.getuser())
+        command = getattr(settings, 'BLOB_STORE_MATERIALIZE_COMMAND',
+                          'python manage.py materialize_blobs')
+        return cls.get_ssh_command() + [
+            '{user}@{server}'.format(user=sync_user, server=server),
+            ' '.join([command, pipes.quote(manifest_path),
+                      pipes.quote(target)]),
+        ]
+
+    @classmethod
+    def get_ssh_command(cls):
+        control_path = getattr(
+            settings, 'SYNC_SSH_CONTROL_PATH',
+            os.path.join(tempfile.gettempdir(), 'rtd-sync-%r@%h:%p'))
+        return [
+            'ssh', '-T',
+            '-o', 'ControlMaster=auto',
+            '-o', 'ControlPath=%s' % control_path,
+            '-o', 'ControlPersist=%s' % getattr(
+                settings, 'SYNC_SSH_CONTROL_PERSIST', 60),
+        ]
 
 
 class DoubleRemotePuller(object):
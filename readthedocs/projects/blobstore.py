@@ -0,0 +1,245 @@
+"""Content addressed storage for built documentation
+
+Most files in a project's HTML output, theme assets, fonts and images, are
+identical across versions. With ``BLOB_STORE_ROOT`` set, built HTML is
+stored once per unique content, as ``<root>/<sha256[:2]>/<sha256[2:]>``, and
+each version gets a manifest mapping its relative file paths to digests.
+The version's directory is then materialized from the store with hardlinks,
+or symlinks with ``BLOB_STORE_LINK = 'symlink'``, so identical files take
+space once and only blobs a server is missing need to be transferred.
+"""
+
+import errno
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+
+from readthedocs.projects.checksums import CHUNK_SIZE
+
+
+log = logging.getLogger(__name__)
+
+IngestStats = namedtuple('IngestStats', ['files', 'bytes', 'new_blobs',
+                                         'new_bytes'])
+
+
+def sha256_file(path, chunk_size=CHUNK_SIZE):
+    """Return the hex sha256 digest of the file at ``path``, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_blob_store():
+    """Return the configured :py:class:`BlobStore`, ``None`` if disabled"""
+    root = getattr(settings, 'BLOB_STORE_ROOT', None)
+    if not root:
+        return None
+    return BlobStore(root, link=getattr(settings, 'BLOB_STORE_LINK',
+                                        'hardlink'))
+
+
+def load_manifest(path):
+    """Return the manifest saved at ``path``, ``None`` if there isn't one"""
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (IOError, ValueError):
+        return None
+
+
+def save_manifest(manifest, path):
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    tmp_path = '%s.%s.tmp' % (path, uuid.uuid4().hex)
+    with open(tmp_path, 'w') as fh:
+        json.dump(manifest, fh)
+    os.rename(tmp_path, path)
+
+
+class BlobStore(object):
+
+    """Files stored by the sha256 digest of their content
+
+    :param root: Directory holding the blobs
+    :param link: How materialized trees refer to blobs, ``hardlink`` or
+        ``symlink``. Hardlinks fall back to copies across filesystems.
+    """
+
+    def __init__(self, root, link='hardlink'):
+        if link not in ('hardlink', 'symlink'):
+            raise ValueError('Unknown blob store link type: %s' % link)
+        self.root = root
+        self.link = link
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def has(self, digest):
+        return os.path.exists(self.blob_path(digest))
+
+    def missing(self, digests):
+        """Return the digests in ``digests`` that aren't stored"""
+        return set(digest for digest in digests if not self.has(digest))
+
+    def add(self, path, digest=None):
+        """Store the file at ``path``
+
+        :returns: The file's digest and whether a new blob was stored
+        """
+        if digest is None:
+            digest = sha256_file(path)
+        blob_path = self.blob_path(digest)
+        if os.path.exists(blob_path):
+            return digest, False
+        try:
+            os.makedirs(os.path.dirname(blob_path))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        # Copy under a unique name first, so concurrent builds adding the
+        # same content never expose a partial blob
+        tmp_path = '%s.%s.tmp' % (blob_path, uuid.uuid4().hex)
+        shutil.copyfile(path, tmp_path)
+        os.rename(tmp_path, blob_path)
+        return digest, True
+
+    def ingest(self, path):
+        """Store every file of the directory at ``path``
+
+        :returns: The manifest, mapping each file's path relative to ``path``
+            to its digest, and an :py:class:`IngestStats`
+        """
+        manifest = {}
+        total = new_blobs = new_bytes = 0
+        for root, __, filenames in os.walk(path):
+            for filename in filenames:
+                full_path = os.path.join(root, filename)
+                size = os.path.getsize(full_path)
+                digest, added = self.add(full_path)
+                manifest[os.path.relpath(full_path, path)] = digest
+                total += size
+                if added:
+                    new_blobs += 1
+                    new_bytes += size
+        return manifest, IngestStats(files=len(manifest), bytes=total,
+                                     new_blobs=new_blobs, new_bytes=new_bytes)
+
+    def materialize(self, manifest, target):
+        """Replace the directory at ``target`` with the files of ``manifest``
+
+        The tree is built next to ``target`` and swapped in once complete.
+        """
+        missing = self.missing(manifest.values())
+        if missing:
+            raise IOError('Blobs missing from the store: %s'
+                          % ', '.join(sorted(missing)[:5]))
+        tmp_target = '%s.%s.tmp' % (target.rstrip('/'), uuid.uuid4().hex)
+        old_target = '%s.old' % tmp_target
+        try:
+            for relative_path, digest in manifest.items():
+                file_path = os.path.join(tmp_target, relative_path)
+                if not os.path.exists(os.path.dirname(file_path)):
+                    os.makedirs(os.path.dirname(file_path))
+                self.link_blob(digest, file_path)
+            if not manifest:
+                os.makedirs(tmp_target)
+            if os.path.exists(target):
+                os.rename(target, old_target)
+            os.rename(tmp_target, target)
+        finally:
+            for path in (tmp_target, old_target):
+                if os.path.exists(path):
+                    shutil.rmtree(path)
+
+    def link_blob(self, digest, path):
+        blob_path = self.blob_path(digest)
+        if self.link == 'symlink':
+            os.symlink(os.path.abspath(blob_path), path)
+            return
+        try:
+            os.link(blob_path, path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.copyfile(blob_path, path)
+
+    def blobs(self):
+        """Yield the digest and path of every stored blob"""
+        if not os.path.isdir(self.root):
+            return
+        for prefix in sorted(os.listdir(self.root)):
+            prefix_path = os.path.join(self.root, prefix)
+            if len(prefix) != 2 or not os.path.isdir(prefix_path):
+                continue
+            for name in sorted(os.listdir(prefix_path)):
+                if not name.endswith('.tmp'):
+                    yield prefix + name, os.path.join(prefix_path, name)
+
+    def usage(self):
+        """Return the number of blobs and their total size in bytes"""
+        count = size = 0
+        for __, path in self.blobs():
+            count += 1
+            size += os.path.getsize(path)
+        return count, size
+
+    def prune(self, referenced, dryrun=False):
+        """Remove blobs whose digest isn't in ``referenced``
+
+        :returns: The number of blobs removed and their total size in bytes
+        """
+        count = size = 0
+        for digest, path in self.blobs():
+            if digest in referenced:
+                continue
+            count += 1
+            size += os.path.getsize(path)
+            if not dryrun:
+                os.remove(path)
+        return count, size
+
+
+TreeUsage = namedtuple('TreeUsage', ['files', 'bytes', 'disk_bytes',
+                                     'unique_bytes'])
+
+
+def tree_usage(paths, content=False):
+    """Measure the space taken by the files under ``paths``
+
+    :param paths: Directories to measure together
+    :param content: Also hash every file, to measure the space identical
+        content would take once stored in a :py:class:`BlobStore`
+    :returns: A :py:class:`TreeUsage`, where ``bytes`` counts every file,
+        ``disk_bytes`` counts hardlinked and symlinked files once and
+        ``unique_bytes`` counts identical content once, or is ``None``
+        without ``content``
+    """
+    files = total = disk_bytes = unique_bytes = 0
+    inodes = set()
+    digests = set()
+    for path in paths:
+        for root, __, filenames in os.walk(path):
+            for filename in filenames:
+                full_path = os.path.join(root, filename)
+                stat = os.stat(full_path)
+                files += 1
+                total += stat.st_size
+                if (stat.st_dev, stat.st_ino) not in inodes:
+                    inodes.add((stat.st_dev, stat.st_ino))
+                    disk_bytes += stat.st_size
+                if content:
+                    digest = sha256_file(full_path)
+                    if digest not in digests:
+                        digests.add(digest)
+                        unique_bytes += stat.st_size
+    return TreeUsage(files=files, bytes=total, disk_bytes=disk_bytes,
+                     unique_bytes=unique_bytes if content else None)
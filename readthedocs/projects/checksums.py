@@ -0,0 +1,143 @@
+"""Checksums for built documentation files
+
+Files are hashed in fixed size chunks so large artifacts never need to be
+held in memory. A sidecar file records the size, modification time and md5
+of every file seen on the previous run, so unchanged files are not read
+again on rebuilds.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from multiprocessing.pool import ThreadPool
+
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+def md5_file(path, chunk_size=CHUNK_SIZE):
+    """Return the hex md5 digest of the file at ``path``, read in chunks"""
+    digest = hashlib.md5()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ChecksumCache(object):
+
+    """Persisted ``(path, size, mtime) -> md5`` mapping
+
+    :param cache_path: Path of the JSON sidecar. With ``None``, nothing is
+        loaded or saved and every file is hashed.
+    :param workers: Number of threads used to hash files that miss the cache
+    """
+
+    def __init__(self, cache_path=None, workers=1):
+        self.cache_path = cache_path
+        self.workers = workers
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path) as fh:
+                    self.entries = json.load(fh)
+            except (IOError, ValueError):
+                log.warning('Ignoring unreadable checksum cache: %s', cache_path)
+
+    def hash_files(self, files):
+        """Return md5 digests for ``files``
+
+        :param files: Mapping of cache key, usually a path relative to the
+            build directory, to full file path
+        :returns: Mapping of cache key to md5 digest
+        :rtype: dict
+        """
+        digests = {}
+        stats = {}
+        to_hash = []
+        for key, full_path in files.items():
+            stat = os.stat(full_path)
+            stats[key] = [stat.st_size, stat.st_mtime]
+            entry = self.entries.get(key)
+            if entry is not None and entry[:2] == stats[key]:
+                digests[key] = entry[2]
+            else:
+                to_hash.append(key)
+        self.hits = len(digests)
+        self.misses = len(to_hash)
+
+        paths = [files[key] for key in to_hash]
+        if self.workers > 1 and len(paths) > 1:
+            pool = ThreadPool(min(self.workers, len(paths)))
+            try:
+                hashed = pool.map(md5_file, paths)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            hashed = [md5_file(path) for path in paths]
+        digests.update(zip(to_hash, hashed))
+
+        # Only keep files that still exist, so removed files drop out
+        self.entries = dict((key, stats[key] + [digests[key]])
+                            for key in files)
+        return digests
+
+    def save(self):
+        if not self.cache_path:
+            return
+        tmp_path = self.cache_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as fh:
+                json.dump(self.entries, fh)
+            os.rename(tmp_path, self.cache_path)
+        except (IOError, OSError):
+            log.warning('Failed to write checksum cache: %s', self.cache_path,
+                        exc_info=True)
+
+
+def tree_digests(paths, checksums):
+    """Return one md5 digest for the contents of each directory in ``paths``
+
+    A digest covers the relative path and md5 of every file in the tree, so
+    it changes when any file is added, removed, renamed or modified. All
+    trees are hashed in one pass, so ``checksums`` keeps entries for all of
+    them.
+
+    :param paths: Mapping of name to directory path
+    :param checksums: :py:class:`ChecksumCache` used to hash the files
+    :returns: Mapping of name to digest, directories that don't exist are
+        left out
+    :rtype: dict
+    """
+    files = {}
+    trees = {}
+    for name, path in paths.items():
+        if not os.path.isdir(path):
+            continue
+        trees[name] = []
+        for root, __, filenames in os.walk(path):
+            for filename in filenames:
+                full_path = os.path.join(root, filename)
+                files[full_path] = full_path
+                trees[name].append(full_path)
+    file_digests = checksums.hash_files(files)
+
+    digests = {}
+    for name, tree in trees.items():
+        digest = hashlib.md5()
+        for full_path in sorted(tree):
+            relative_path = os.path.relpath(full_path, paths[name])
+            if isinstance(relative_path, unicode):
+                relative_path = relative_path.encode('utf-8')
+            digest.update(relative_path)
+            digest.update(b'\0')
+            digest.update(file_digests[full_path])
+            digest.update(b'\n')
+        digests[name] = digest.hexdigest()
+    return digests
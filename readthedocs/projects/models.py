@@ -10,6 +10,8 @@ from django.contrib.auth.models import User
 from django.core.exceptions import MultipleObjectsReturned
 from django.core.urlresolvers import reverse
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.template.defaultfilters import slugify
 from django.utils.translation import ugettext_lazy as _
 
@@ -28,8 +30,11 @@ from readthedocs.projects.templatetags.projects_tags import sort_version_aware
 from readthedocs.projects.utils import (make_api_version, symlink,
                                         update_static_metadata)
 from readthedocs.projects.version_handling import determine_stable_version
+from readthedocs.projects.version_handling import invalidate_version_compare
+from readthedocs.projects.version_handling import order_versions
+from readthedocs.projects.version_handling import update_version_compare
 from readthedocs.projects.version_handling import version_windows
-from readthedocs.core.resolver import resolve
+from readthedocs.core.resolver import invalidate_resolver_context, resolve
 from readthedocs.core.validators import validate_domain_name
 
 from readthedocs.vcs_support.base import VCSProject
@@ -408,6 +413,10 @@ class Project(models.Model):
     def venv_path(self, version=LATEST):
         return os.path.join(self.doc_path, 'envs', version)
 
+    def venv_template_path(self, key):
+        """The path to the virtualenv template ``key``, shared by versions"""
+        return os.path.join(self.doc_path, 'envs', '.templates', key)
+
     #
     # Paths for symlinks in project doc_path.
     #
@@ -501,6 +510,24 @@ class Project(models.Model):
         """The destination path where the built docs are copied"""
         return os.path.join(self.doc_path, 'rtd-builds', version)
 
+    def checksum_cache_path(self, version=LATEST):
+        """The path to the file checksum cache for the built docs"""
+        return os.path.join(self.doc_path, 'rtd-builds', '.%s.md5.json' % version)
+
+    def artifact_checksum_cache_path(self, version=LATEST):
+        """The path to the file checksum cache for the build artifacts"""
+        return os.path.join(self.doc_path, 'artifacts', '.%s.md5.json' % version)
+
+    def blob_manifest_path(self, version=LATEST):
+        """The path to the blob store manifest of the built docs"""
+        return os.path.join(self.doc_path, 'rtd-builds',
+                            '.%s.blobs.json' % version)
+
+    def published_manifest_path(self, version=LATEST):
+        """The path to the digests of the artifacts last published"""
+        return os.path.join(self.doc_path, 'rtd-builds',
+                            '.%s.manifest.json' % version)
+
     def static_metadata_path(self):
         """The path to the static metadata JSON settings file"""
         return os.path.join(self.doc_path, 'metadata.json')
@@ -654,7 +681,7 @@ class Project(models.Model):
         if user:
             kwargs['user'] = user
         versions = Version.objects.public(**kwargs)
-        return sort_version_aware(versions)
+        return order_versions(self, versions)
 
     def all_active_versions(self):
         """Get queryset with all active versions
@@ -705,6 +732,7 @@ class Project(models.Model):
                             version=new_stable.identifier))
                     current_stable.identifier = new_stable.identifier
                     current_stable.save()
+                    update_version_compare(self)
                     return new_stable
             else:
                 log.info(
@@ -714,6 +742,7 @@ class Project(models.Model):
                 current_stable = self.versions.create_stable(
                     type=new_stable.type,
                     identifier=new_stable.identifier)
+                update_version_compare(self)
                 return new_stable
 
     def version_from_branch_name(self, branch):
@@ -906,3 +935,28 @@ class Domain(models.Model):
         else:
             self.domain = parsed.path
         super(Domain, self).save(*args, **kwargs)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_project_resolver_context(sender, instance, **kwargs):
+    invalidate_resolver_context([instance.pk])
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_project_version_compare(sender, instance, **kwargs):
+    # The highest version is shown with the project's name
+    invalidate_version_compare(instance.pk)
+
+
+@receiver(post_save, sender=Domain)
+@receiver(post_delete, sender=Domain)
+def invalidate_domain_resolver_context(sender, instance, **kwargs):
+    invalidate_resolver_context([instance.project_id])
+
+
+@receiver(post_save, sender=ProjectRelationship)
+@receiver(post_delete, sender=ProjectRelationship)
+def invalidate_relationship_resolver_context(sender, instance, **kwargs):
+    invalidate_resolver_context([instance.parent_id, instance.child_id])
@@ -17,6 +17,10 @@ after_build = django.dispatch.Signal(providing_args=["version"])
 
 project_import = django.dispatch.Signal(providing_args=["project"])
 
+# Sent after versions are synced with the repository, which updates and
+# deletes versions in bulk without sending model signals
+versions_synced = django.dispatch.Signal(providing_args=["project"])
+
 
 log = logging.getLogger(__name__)
 
@@ -9,40 +9,53 @@ import shutil
 import json
 import logging
 import socket
+import time
+import uuid
 import requests
-import hashlib
 from collections import defaultdict
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 
 from celery import task, Task
 from djcelery import celery as celery_app
 from django.conf import settings
 from django.core.urlresolvers import reverse
+from django.db import transaction
+from django.db.models import Case, Value, When
 from django.utils.translation import ugettext_lazy as _
 
 from readthedocs.builds.constants import (LATEST,
                                           BUILD_STATE_CLONING,
                                           BUILD_STATE_INSTALLING,
                                           BUILD_STATE_BUILDING)
-from readthedocs.builds.models import Build, Version
+from readthedocs.builds.models import Build, BuildPhase, Version
 from readthedocs.core.utils import send_email, run_on_app_servers
-from readthedocs.cdn.purge import purge
+from readthedocs.cdn.tasks import queue_purge
 from readthedocs.doc_builder.loader import get_builder_class
 from readthedocs.doc_builder.environments import (LocalEnvironment,
                                                   DockerEnvironment)
 from readthedocs.doc_builder.exceptions import BuildEnvironmentError
+from readthedocs.doc_builder.profiling import BuildPhaseProfiler
+from readthedocs.doc_builder.virtualenv import (BASE_REQUIREMENTS,
+                                                clone_virtualenv, load_state,
+                                                relocate_virtualenv,
+                                                requirements_digest,
+                                                save_state, template_key)
+from readthedocs.projects.blobstore import get_blob_store, save_manifest
+from readthedocs.projects.checksums import ChecksumCache, tree_digests
 from readthedocs.projects.exceptions import ProjectImportError
 from readthedocs.projects.models import ImportedFile, Project
 from readthedocs.projects.utils import make_api_version, make_api_project, symlink
 from readthedocs.projects.constants import LOG_TEMPLATE
 from readthedocs.privacy.loader import Syncer
-from readthedocs.search.parse_json import process_all_json_files
-from readthedocs.search.utils import process_mkdocs_json
+from readthedocs.search.parse_json import iter_all_json_files
+from readthedocs.search.utils import iter_mkdocs_json
 from readthedocs.restapi.utils import index_search_request
 from readthedocs.vcs_support import utils as vcs_support_utils
 from readthedocs.api.client import api as api_v1
 from readthedocs.restapi.client import api as api_v2
 from readthedocs.projects.signals import before_vcs, after_vcs, before_build, after_build
-from readthedocs.core.resolver import resolve_path
+from readthedocs.core.resolver import get_resolver_context, resolve_path
 
 
 log = logging.getLogger(__name__)
@@ -87,6 +100,7 @@ class UpdateDocsTask(Task):
         self.project = {}
         if project is not None:
             self.project = project
+        self.profiler = BuildPhaseProfiler(build_env)
 
     def run(self, pk, version_pk=None, build_pk=None, record=True, docker=False,
             search=True, force=False, localmedia=True, **kwargs):
@@ -102,12 +116,17 @@ class UpdateDocsTask(Task):
         self.build_force = force
         self.build_env = env_cls(project=self.project, version=self.version,
                                  build=self.build, record=record)
+        self.profiler = BuildPhaseProfiler(self.build_env)
         with self.build_env:
             if self.project.skip:
                 raise BuildEnvironmentError(
                     _('Builds for this project are temporarily disabled'))
             try:
-                self.setup_vcs()
+                with self.profiler.phase(
+                        'setup_vcs',
+                        output_path=self.project.checkout_path(
+                            self.version.slug)):
+                    self.setup_vcs()
             except vcs_support_utils.LockTimeout, e:
                 self.retry(exc=e, throw=False)
                 raise BuildEnvironmentError(
@@ -117,7 +136,10 @@ class UpdateDocsTask(Task):
 
             if self.project.documentation_type == 'auto':
                 self.update_documentation_type()
-            self.setup_environment()
+            with self.profiler.phase(
+                    'setup_environment',
+                    output_path=self.project.venv_path(self.version.slug)):
+                self.setup_environment()
 
             # TODO the build object should have an idea of these states, extend
             # the model to include an idea of these outcomes
@@ -135,6 +157,7 @@ class UpdateDocsTask(Task):
                     localmedia=outcomes['localmedia'],
                     pdf=outcomes['pdf'],
                     epub=outcomes['epub'],
+                    manifests=self.get_artifact_manifests(outcomes),
                 )
 
         if self.build_env.failed:
@@ -213,69 +236,21 @@ class UpdateDocsTask(Task):
         """
         Build the virtualenv and install the project into it.
 
-        Always build projects with a virtualenv.
+        Always build projects with a virtualenv. The virtualenv is copied
+        from a template, see :py:mod:`readthedocs.doc_builder.virtualenv`,
+        and reused by the next builds until the template or the project's
+        requirements change. Requirements are only installed into a new
+        virtualenv, unless they can't be checked for changes, which is the
+        case unless they are all pinned. Forced builds start from a new
+        template.
 
         :param build_env: Build environment to pass commands and execution through.
         """
-        build_dir = os.path.join(
-            self.project.venv_path(version=self.version.slug),
-            'build')
+        venv_path = self.project.venv_path(version=self.version.slug)
+        build_dir = os.path.join(venv_path, 'build')
 
         self.build_env.update_build(state=BUILD_STATE_INSTALLING)
 
-        if os.path.exists(build_dir):
-            log.info(LOG_TEMPLATE
-                     .format(project=self.project.slug,
-                             version=self.version.slug,
-                             msg='Removing existing build directory'))
-            shutil.rmtree(build_dir)
-        site_packages = '--no-site-packages'
-        if self.project.use_system_packages:
-            site_packages = '--system-site-packages'
-        self.build_env.run(
-            self.project.python_interpreter,
-            '-mvirtualenv',
-            site_packages,
-            self.project.venv_path(version=self.version.slug)
-        )
-
-        # Install requirements
-        wheeldir = os.path.join(settings.SITE_ROOT, 'deploy', 'wheels')
-        requirements = [
-            'sphinx==1.3.1',
-            'Pygments==2.0.2',
-            'virtualenv==13.1.0',
-            'setuptools==18.0.1',
-            'docutils==0.11',
-            'mkdocs==0.14.0',
-            'mock==1.0.1',
-            'pillow==2.6.1',
-            'readthedocs-sphinx-ext==0.5.4',
-            'sphinx-rtd-theme==0.1.9',
-            'alabaster>=0.7,<0.8,!=0.7.5',
-            'recommonmark==0.1.1',
-        ]
-
-        cmd = [
-            'python',
-            self.project.venv_bin(version=self.version.slug, filename='pip'),
-            'install',
-            '--use-wheel',
-            '--find-links={0}'.format(wheeldir),
-            '-U',
-        ]
-        if self.project.use_system_packages:
-            # Other code expects sphinx-build to be installed inside the
-            # virtualenv.  Using the -I option makes sure it gets installed
-            # even if it is already installed system-wide (and
-            # --system-site-packages is used)
-            cmd.append('-I')
-        cmd.extend(requirements)
-        self.build_env.run(
-            *cmd,
-            bin_path=self.project.venv_bin(version=self.version.slug)
-        )
-
         # Handle requirements
         requirements_file_path = self.project.requirements_file
         checkout_path = self.project.checkout_path(self.version.slug)
@@ -289,17 +264,54 @@ class UpdateDocsTask(Task):
                     if os.path.exists(test_path):
                         requirements_file_path = test_path
                         break
+        digest = None
+        if requirements_file_path:
+            digest = requirements_digest(
+                os.path.join(checkout_path, requirements_file_path))
+
+        key = template_key(self.project.python_interpreter, BASE_REQUIREMENTS,
+                           self.project.use_system_packages)
+        state = load_state(venv_path)
+        if (self.build_force or state.get('template') != key or
+                state.get('requirements') != digest):
+            self.clone_virtualenv_template(key)
+            state = {'template': key}
+        else:
+            log.info(LOG_TEMPLATE
+                     .format(project=self.project.slug,
+                             version=self.version.slug,
+                             msg='Reusing virtualenv from template %s' % key))
+
+        if os.path.exists(build_dir):
+            log.info(LOG_TEMPLATE
+                     .format(project=self.project.slug,
+                             version=self.version.slug,
+                             msg='Removing existing build directory'))
+            shutil.rmtree(build_dir)
 
         if requirements_file_path:
-            self.build_env.run(
-                'python',
-                self.project.venv_bin(version=self.version.slug, filename='pip'),
-                'install',
-                '--exists-action=w',
-                '-r{0}'.format(requirements_file_path),
-                cwd=checkout_path,
-                bin_path=self.project.venv_bin(version=self.version.slug)
-            )
+            if digest is not None and 'requirements' in state:
+                log.info(LOG_TEMPLATE
+                         .format(project=self.project.slug,
+                                 version=self.version.slug,
+                                 msg=('Requirements unchanged, skipped '
+                                      'installing them, which took {0:.1f}s '
+                                      'last time'.format(
+                                          state['requirements_time']))))
+            else:
+                start = time.time()
+                self.build_env.run(
+                    'python',
+                    self.project.venv_bin(version=self.version.slug, filename='pip'),
+                    'install',
+                    '--exists-action=w',
+                    '-r{0}'.format(requirements_file_path),
+                    cwd=checkout_path,
+                    bin_path=self.project.venv_bin(version=self.version.slug)
+                )
+                state['requirements'] = digest
+                state['requirements_time'] = time.time() - start
+        save_state(venv_path, state)
 
         # Handle setup.py
         checkout_path = self.project.checkout_path(self.version.slug)
@@ -325,6 +337,75 @@ class UpdateDocsTask(Task):
                     bin_path=self.project.venv_bin(version=self.version.slug)
                 )
 
+    def clone_virtualenv_template(self, key):
+        """Copy the virtualenv template ``key`` to the version's virtualenv
+
+        The template is created first if it doesn't exist yet, or the build
+        is forced. It's created under a temporary name and moved in place
+        once complete, so concurrent builds never use a partial template.
+        """
+        template_path = self.project.venv_template_path(key)
+        venv_path = self.project.venv_path(version=self.version.slug)
+        template_state = load_state(template_path)
+        if self.build_force or 'time' not in template_state:
+            tmp_path = '%s.%s.tmp' % (template_path, uuid.uuid4().hex)
+            start = time.time()
+            try:
+                self.create_virtualenv(tmp_path)
+                template_state = {'time': time.time() - start}
+                save_state(tmp_path, template_state)
+                if os.path.exists(template_path):
+                    shutil.rmtree(template_path)
+                os.rename(tmp_path, template_path)
+                relocate_virtualenv(template_path, tmp_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    shutil.rmtree(tmp_path)
+
+        start = time.time()
+        clone_virtualenv(template_path, venv_path)
+        log.info(LOG_TEMPLATE
+                 .format(project=self.project.slug,
+                         version=self.version.slug,
+                         msg=('Copied virtualenv template {key} in {copy:.1f}s, '
+                              'creating it took {create:.1f}s'.format(
+                                  key=key, copy=time.time() - start,
+                                  create=template_state['time']))))
+
+    def create_virtualenv(self, path):
+        """Create a virtualenv at ``path`` with the build requirements"""
+        site_packages = '--no-site-packages'
+        if self.project.use_system_packages:
+            site_packages = '--system-site-packages'
+        self.build_env.run(
+            self.project.python_interpreter,
+            '-mvirtualenv',
+            site_packages,
+            path
+        )
+
+        # Install requirements
+        wheeldir = os.path.join(settings.SITE_ROOT, 'deploy', 'wheels')
+        cmd = [
+            'python',
+            os.path.join(path, 'bin', 'pip'),
+            'install',
+            '--use-wheel',
+            '--find-links={0}'.format(wheeldir),
+            '-U',
+        ]
+        if self.project.use_system_packages:
+            # Other code expects sphinx-build to be installed inside the
+            # virtualenv.  Using the -I option makes sure it gets installed
+            # even if it is already installed system-wide (and
+            # --system-site-packages is used)
+            cmd.append('-I')
+        cmd.extend(BASE_REQUIREMENTS)
+        self.build_env.run(
+            *cmd,
+            bin_path=os.path.join(path, 'bin')
+        )
+
     def build_docs(self):
         """Wrapper to all build functions
 
@@ -338,15 +419,28 @@ class UpdateDocsTask(Task):
         self.build_env.update_build(state=BUILD_STATE_BUILDING)
         before_build.send(sender=self.version)
 
+        search_type = 'sphinx_search'
+        if self.project.is_type_mkdocs:
+            search_type = 'mkdocs_json'
+        builds = [
+            ('html', self.build_docs_html, self.project.documentation_type),
+            ('search', self.build_docs_search, search_type),
+            ('localmedia', self.build_docs_localmedia, 'sphinx_localmedia'),
+            ('pdf', self.build_docs_pdf, 'sphinx_pdf'),
+            ('epub', self.build_docs_epub, 'sphinx_epub'),
+        ]
+
         outcomes = defaultdict(lambda: False)
         with self.project.repo_nonblockinglock(
                 version=self.version,
                 max_lock_age=getattr(settings, 'REPO_LOCK_SECONDS', 30)):
-            outcomes['html'] = self.build_docs_html()
-            outcomes['search'] = self.build_docs_search()
-            outcomes['localmedia'] = self.build_docs_localmedia()
-            outcomes['pdf'] = self.build_docs_pdf()
-            outcomes['epub'] = self.build_docs_epub()
+            for name, build, artifact_type in builds:
+                output_path = self.project.artifact_path(
+                    version=self.version.slug, type_=artifact_type)
+                with self.profiler.phase('build_docs_%s' % name,
+                                         output_path=output_path,
+                                         skip_idle=True):
+                    outcomes[name] = build()
 
         after_build.send(sender=self.version)
         return outcomes
@@ -360,8 +454,10 @@ class UpdateDocsTask(Task):
             html_builder.force()
         html_builder.append_conf()
         success = html_builder.build()
+        manifests = None
         if success:
             html_builder.move()
+            manifests = self.get_artifact_manifests({'html': True})
 
         # Gracefully attempt to move files via task on web workers.
         try:
@@ -369,6 +465,7 @@ class UpdateDocsTask(Task):
                 version_pk=self.version.pk,
                 html=True,
                 hostname=socket.gethostname(),
+                manifests=manifests,
             )
         except socket.error:
             # TODO do something here
@@ -420,6 +517,32 @@ class UpdateDocsTask(Task):
         builder.move()
         return success
 
+    def get_artifact_manifests(self, outcomes):
+        """Digest the built artifacts, so unchanged ones aren't published again
+
+        :param outcomes: Build outcomes, as returned by :py:meth:`build_docs`
+        :returns: Mapping of artifact name to digest, see
+            :py:func:`get_artifact_paths`
+        """
+        artifacts = get_artifact_paths(self.project, self.version.slug,
+                                       **outcomes)
+        checksums = ChecksumCache(
+            self.project.artifact_checksum_cache_path(self.version.slug),
+            workers=getattr(settings, 'IMPORTED_FILE_HASH_WORKERS', 4))
+        try:
+            manifests = tree_digests(
+                dict((name, from_path) for name, from_path, __ in artifacts),
+                checksums)
+        except (IOError, OSError):
+            log.warning(LOG_TEMPLATE
+                        .format(project=self.project.slug,
+                                version=self.version.slug,
+                                msg='Failed to digest artifacts'),
+                        exc_info=True)
+            return {}
+        checksums.save()
+        return manifests
+
     def send_notifications(self):
         """Send notifications on build failure"""
         send_notifications.delay(self.version.pk, build_pk=self.build['id'])
@@ -507,10 +630,26 @@ def update_imported_docs(version_pk):
 
 
 # Web tasks
+@contextmanager
+def record_phase(phases, name):
+    """Append ``(name, elapsed seconds)`` for the wrapped block to ``phases``"""
+    start = time.time()
+    try:
+        yield
+    finally:
+        phases.append((name, time.time() - start))
+
+
 @task(queue='web')
 def finish_build(version_pk, build_pk, hostname=None, html=False,
-                 localmedia=False, search=False, pdf=False, epub=False):
-    """Build Finished, do house keeping bits"""
+                 localmedia=False, search=False, pdf=False, epub=False,
+                 manifests=None):
+    """Build Finished, do house keeping bits
+
+    The time taken to copy the artifacts, symlink the project and queue the
+    metadata updates is recorded on the build as
+    :py:class:`~readthedocs.builds.models.BuildPhase` objects.
+    """
     version = Version.objects.get(pk=version_pk)
     build = Build.objects.get(pk=build_pk)
 
@@ -524,29 +663,95 @@ def finish_build(version_pk, build_pk, hostname=None, html=False,
     if not epub:
         clear_epub_artifacts(version)
 
-    move_files(
-        version_pk=version_pk,
-        hostname=hostname,
-        html=html,
-        localmedia=localmedia,
-        search=search,
-        pdf=pdf,
-        epub=epub,
-    )
+    phases = []
+    with record_phase(phases, 'copy'):
+        move_files(
+            version_pk=version_pk,
+            hostname=hostname,
+            html=html,
+            localmedia=localmedia,
+            search=search,
+            pdf=pdf,
+            epub=epub,
+            manifests=manifests,
+        )
 
-    symlink(project=version.project)
+    with record_phase(phases, 'symlink'):
+        symlink(project=version.project)
 
     # Delayed tasks
-    update_static_metadata.delay(version.project.pk)
-    fileify.delay(version.pk, commit=build.commit)
-    update_search.delay(version.pk, commit=build.commit)
+    with record_phase(phases, 'metadata'):
+        update_static_metadata.delay(version.project.pk)
+        fileify.delay(version.pk, commit=build.commit)
+        update_search.delay(version.pk, commit=build.commit)
+
+    BuildPhase.objects.bulk_create([
+        BuildPhase(build=build, name=name, elapsed=elapsed)
+        for name, elapsed in phases
+    ])
+
+
+def get_artifact_paths(project, version_slug, html=False, localmedia=False,
+                       search=False, pdf=False, epub=False):
+    """Return the artifacts of a build and where they are published
+
+    :param project: Project the artifacts are built for
+    :param version_slug: Slug of the version built
+    :returns: List of ``(name, from_path, to_path)`` tuples, where ``name`` is
+        one of ``html``, ``localmedia``, ``search``, ``pdf`` or ``epub``
+    """
+    artifacts = []
+    if html:
+        artifacts.append((
+            'html',
+            project.artifact_path(version=version_slug,
+                                  type_=project.documentation_type),
+            project.rtd_build_path(version_slug),
+        ))
+
+    if 'sphinx' in project.documentation_type:
+        # Always move PDF's because the return code lies.
+        for name, built, build_type, media_type in [
+                ('localmedia', localmedia, 'sphinx_localmedia', 'htmlzip'),
+                ('search', search, 'sphinx_search', 'json'),
+                ('pdf', pdf, 'sphinx_pdf', 'pdf'),
+                ('epub', epub, 'sphinx_epub', 'epub')]:
+            if built:
+                artifacts.append((
+                    name,
+                    project.artifact_path(version=version_slug,
+                                          type_=build_type),
+                    project.get_production_media_path(
+                        type_=media_type, version_slug=version_slug,
+                        include_file=False),
+                ))
+
+    if 'mkdocs' in project.documentation_type:
+        if search:
+            artifacts.append((
+                'search',
+                project.artifact_path(version=version_slug,
+                                      type_='mkdocs_json'),
+                project.get_production_media_path(
+                    type_='json', version_slug=version_slug,
+                    include_file=False),
+            ))
+    return artifacts
 
 
 @task(queue='web')
 def move_files(version_pk, hostname, html=False, localmedia=False, search=False,
-               pdf=False, epub=False):
+               pdf=False, epub=False, manifests=None):
     """Task to move built documentation to web servers
 
+    Artifacts are copied concurrently, by up to ``PUBLISH_WORKERS`` threads.
+    The digests of published artifacts are kept next to the version's docs,
+    and an artifact is skipped when its digest in ``manifests`` matches the
+    one last published. Artifacts copied without a digest are forgotten, and
+    those not part of this call keep their digest. With a blob store
+    configured, the HTML is published through the store instead, see
+    :py:func:`publish_blobs`.
+
     :param version_pk: Version id to sync files for
     :param hostname: Hostname to sync to
     :param html: Sync HTML
@@ -559,85 +764,136 @@ def move_files(version_pk, hostname, html=False, localmedia=False, search=False,
     :type pdf: bool
     :param epub: Sync ePub files
     :type epub: bool
+    :param manifests: Mapping of artifact name to the digest of its contents
+    :type manifests: dict
+    :returns: Names of the artifacts copied and skipped
+    :rtype: dict
     """
     version = Version.objects.get(pk=version_pk)
+    project = version.project
+    manifests = manifests or {}
+    manifest_path = project.published_manifest_path(version.slug)
+    published = {}
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path) as fh:
+                published = json.load(fh)
+        except (IOError, ValueError):
+            log.warning('Ignoring unreadable artifact manifest: %s',
+                        manifest_path)
+
+    artifacts = get_artifact_paths(project, version.slug, html=html,
+                                   localmedia=localmedia, search=search,
+                                   pdf=pdf, epub=epub)
+    copies = []
+    skipped = []
+    for name, from_path, to_path in artifacts:
+        digest = manifests.get(name)
+        if (digest is not None and published.get(name) == digest and
+                os.path.exists(to_path)):
+            skipped.append(name)
+        else:
+            copies.append((name, from_path, to_path))
+    if skipped:
+        log.info(LOG_TEMPLATE
+                 .format(project=project.slug, version=version.slug,
+                         msg='Skipping unchanged artifacts: %s'
+                         % ', '.join(skipped)))
+
+    store = get_blob_store()
+
+    def copy(artifact):
+        name, from_path, to_path = artifact
+        if (name == 'html' and store is not None and
+                hasattr(Syncer, 'copy_blobs')):
+            return publish_blobs(store, version, from_path, to_path,
+                                 hostname)
+        return Syncer.copy(from_path, to_path, host=hostname)
+
+    workers = getattr(settings, 'PUBLISH_WORKERS', 4)
+    if workers > 1 and len(copies) > 1:
+        pool = ThreadPool(min(workers, len(copies)))
+        try:
+            results = pool.map(copy, copies)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [copy(artifact) for artifact in copies]
+
+    # Remote syncers report failures per server rather than raising, don't
+    # record those artifacts as published so the next build copies them
+    failed = set(name for (name, __, __), result in zip(copies, results)
+                 if any(server.returncode != 0 for server in result or []))
+    for name, __, __ in copies:
+        if name in manifests and name not in failed:
+            published[name] = manifests[name]
+        else:
+            published.pop(name, None)
+    tmp_path = manifest_path + '.tmp'
+    try:
+        if not os.path.exists(os.path.dirname(manifest_path)):
+            os.makedirs(os.path.dirname(manifest_path))
+        with open(tmp_path, 'w') as fh:
+            json.dump(published, fh)
+        os.rename(tmp_path, manifest_path)
+    except (IOError, OSError):
+        log.warning('Failed to write artifact manifest: %s', manifest_path,
+                    exc_info=True)
+
+    return {
+        'copied': [name for name, __, __ in copies],
+        'skipped': skipped,
+    }
 
-    if html:
-        from_path = version.project.artifact_path(
-            version=version.slug, type_=version.project.documentation_type)
-        target = version.project.rtd_build_path(version.slug)
-        Syncer.copy(from_path, target, host=hostname)
-
-    if 'sphinx' in version.project.documentation_type:
-        if localmedia:
-            from_path = version.project.artifact_path(
-                version=version.slug, type_='sphinx_localmedia')
-            to_path = version.project.get_production_media_path(
-                type_='htmlzip', version_slug=version.slug, include_file=False)
-            Syncer.copy(from_path, to_path, host=hostname)
 
-        if search:
-            from_path = version.project.artifact_path(
-                version=version.slug, type_='sphinx_search')
-            to_path = version.project.get_production_media_path(
-                type_='json', version_slug=version.slug, include_file=False)
-            Syncer.copy(from_path, to_path, host=hostname)
+def publish_blobs(store, version, from_path, to_path, hostname):
+    """Add the HTML at ``from_path`` to ``store`` and materialize it
 
-        # Always move PDF's because the return code lies.
-        if pdf:
-            from_path = version.project.artifact_path(version=version.slug,
-                                                      type_='sphinx_pdf')
-            to_path = version.project.get_production_media_path(
-                type_='pdf', version_slug=version.slug, include_file=False)
-            Syncer.copy(from_path, to_path, host=hostname)
-        if epub:
-            from_path = version.project.artifact_path(version=version.slug,
-                                                      type_='sphinx_epub')
-            to_path = version.project.get_production_media_path(
-                type_='epub', version_slug=version.slug, include_file=False)
-            Syncer.copy(from_path, to_path, host=hostname)
-
-    if 'mkdocs' in version.project.documentation_type:
-        if search:
-            from_path = version.project.artifact_path(version=version.slug,
-                                                      type_='mkdocs_json')
-            to_path = version.project.get_production_media_path(
-                type_='json', version_slug=version.slug, include_file=False)
-            Syncer.copy(from_path, to_path, host=hostname)
+    :returns: The result of the syncer's ``copy_blobs``
+    """
+    manifest, stats = store.ingest(from_path)
+    manifest_path = version.project.blob_manifest_path(version.slug)
+    save_manifest(manifest, manifest_path)
+    log.info(LOG_TEMPLATE
+             .format(project=version.project.slug, version=version.slug,
+                     msg=('Stored {files} files, {bytes} bytes, '
+                          'with {new_blobs} new blobs, {new_bytes} bytes'
+                          .format(**stats._asdict()))))
+    return Syncer.copy_blobs(store, manifest_path, to_path, host=hostname)
 
 
 @task(queue='web')
-def update_search(version_pk, commit, delete_non_commit_files=True):
+def update_search(version_pk, commit, delete_non_commit_files=True,
+                  incremental=True):
     """Task to update search indexes
 
     :param version_pk: Version id to update
     :param commit: Commit that updated index
     :param delete_non_commit_files: Delete files not in commit from index
+    :param incremental: Only reindex pages whose source file, or the way
+        they are indexed, changed
     """
     version = Version.objects.get(pk=version_pk)
 
     if version.project.is_type_sphinx:
-        page_list = process_all_json_files(version, build_dir=False)
+        page_list = iter_all_json_files(version, build_dir=False)
     elif version.project.is_type_mkdocs:
-        page_list = process_mkdocs_json(version, build_dir=False)
+        page_list = iter_mkdocs_json(version, build_dir=False)
     else:
         log.error('Unknown documentation type: %s',
                   version.project.documentation_type)
         return
 
-    log_msg = ' '.join([page['path'] for page in page_list])
-    log.info("(Search Index) Sending Data: %s [%s]", version.project.slug,
-             log_msg)
+    log.info("(Search Index) Sending Data: %s", version.project.slug)
     index_search_request(
         version=version,
         page_list=page_list,
         commit=commit,
         project_scale=0,
         page_scale=0,
-        # Don't index sections to speed up indexing.
-        # They aren't currently exposed anywhere.
-        section=False,
         delete=delete_non_commit_files,
+        incremental=incremental,
     )
 
 
@@ -666,53 +922,123 @@ def fileify(version_pk, commit):
         log.info(LOG_TEMPLATE
                  .format(project=version.project.slug, version=version.slug,
                          msg='Creating ImportedFiles'))
-        _manage_imported_files(version, path, commit)
+        counts = _manage_imported_files(
+            version, path, commit,
+            cache_path=project.checksum_cache_path(version.slug))
+        log.info(LOG_TEMPLATE
+                 .format(project=project.slug, version=version.slug,
+                         msg=('ImportedFiles synced: {added} added, {changed} '
+                              'changed, {removed} removed, {hashed} '
+                              'hashed'.format(**counts))))
+        return counts
     else:
         log.info(LOG_TEMPLATE
                  .format(project=project.slug, version=version.slug,
                          msg='No ImportedFile files'))
 
 
-def _manage_imported_files(version, path, commit):
+def _manage_imported_files(version, path, commit, cache_path=None):
     """Update imported files for version
 
+    Existing :py:class:`ImportedFile` rows for the version are loaded in one
+    query and diffed in memory against the files on disk. New files are
+    inserted with ``bulk_create``, changed files are updated in batches and
+    files that no longer exist are removed.
+
     :param version: Version instance
     :param path: Path to search
     :param commit: Commit that updated path
+    :param cache_path: Checksum cache file, files with an unchanged size and
+        modification time are not hashed again
+    :returns: Counts of ``added``, ``changed`` and ``removed`` files, and of
+        files that had to be ``hashed``
+    :rtype: dict
     """
-    changed_files = set()
+    project = version.project
+    existing = {}
+    duplicates = []
+    queryset = (ImportedFile.objects
+                .filter(project=project, version=version)
+                .order_by('pk')
+                .values_list('pk', 'path', 'md5', 'commit'))
+    for pk, file_path, md5, file_commit in queryset:
+        if file_path in existing:
+            duplicates.append(pk)
+        else:
+            existing[file_path] = (pk, md5, file_commit)
+
+    files = {}
     for root, __, filenames in os.walk(path):
         for filename in filenames:
             dirpath = os.path.join(root.replace(path, '').lstrip('/'),
                                    filename.lstrip('/'))
-            full_path = os.path.join(root, filename)
-            md5 = hashlib.md5(open(full_path, 'rb').read()).hexdigest()
-            try:
-                obj, __ = ImportedFile.objects.get_or_create(
-                    project=version.project,
-                    version=version,
-                    path=dirpath,
-                    name=filename,
-                )
-            except ImportedFile.MultipleObjectsReturned:
-                log.exception('Error creating ImportedFile')
-                continue
-            if obj.md5 != md5:
-                obj.md5 = md5
-                changed_files.add(dirpath)
-            if obj.commit != commit:
-                obj.commit = commit
-            obj.save()
-    # Delete ImportedFiles from previous versions
-    ImportedFile.objects.filter(project=version.project,
-                                version=version
-                                ).exclude(commit=commit).delete()
+            files[dirpath] = os.path.join(root, filename)
+    checksums = ChecksumCache(
+        cache_path, workers=getattr(settings, 'IMPORTED_FILE_HASH_WORKERS', 4))
+    digests = checksums.hash_files(files)
+
+    new_files = []
+    changed_md5 = {}
+    changed_commit = []
+    changed_files = set()
+    for dirpath, md5 in digests.items():
+        try:
+            pk, old_md5, old_commit = existing.pop(dirpath)
+        except KeyError:
+            new_files.append(ImportedFile(
+                project=project,
+                version=version,
+                path=dirpath,
+                name=os.path.basename(dirpath),
+                md5=md5,
+                commit=commit,
+            ))
+            changed_files.add(dirpath)
+            continue
+        if old_md5 != md5:
+            changed_md5[pk] = md5
+            changed_files.add(dirpath)
+        elif old_commit != commit:
+            changed_commit.append(pk)
+    removed = [existing_pk for (existing_pk, __, __) in existing.values()]
+    removed += duplicates
+
+    batch_size = getattr(settings, 'IMPORTED_FILE_BATCH_SIZE', 500)
+    with transaction.atomic():
+        ImportedFile.objects.bulk_create(new_files, batch_size=batch_size)
+        md5_pks = changed_md5.keys()
+        for offset in range(0, len(md5_pks), batch_size):
+            batch = md5_pks[offset:offset + batch_size]
+            ImportedFile.objects.filter(pk__in=batch).update(
+                md5=Case(*[When(pk=file_pk, then=Value(changed_md5[file_pk]))
+                           for file_pk in batch]),
+                commit=commit,
+            )
+        for offset in range(0, len(changed_commit), batch_size):
+            (ImportedFile.objects
+             .filter(pk__in=changed_commit[offset:offset + batch_size])
+             .update(commit=commit))
+        for offset in range(0, len(removed), batch_size):
+            (ImportedFile.objects
+             .filter(pk__in=removed[offset:offset + batch_size])
+             .delete())
+    checksums.save()
+
     # Purge Cache
-    changed_files = [resolve_path(version.project, file) for file in changed_files]
     cdn_ids = getattr(settings, 'CDN_IDS', None)
-    if cdn_ids:
-        if version.project.slug in cdn_ids:
-            purge(cdn_ids[version.project.slug], changed_files)
+    if cdn_ids and project.slug in cdn_ids and changed_files:
+        context = get_resolver_context(project)
+        queue_purge(cdn_ids[project.slug],
+                    [resolve_path(project, file, version_slug=version.slug,
+                                  context=context)
+                     for file in changed_files])
+
+    return {
+        'added': len(new_files),
+        'changed': len(changed_md5),
+        'removed': len(removed),
+        'hashed': checksums.misses,
+    }
 
 
 @task(queue='web')
@@ -872,7 +1198,9 @@ def clear_htmlzip_artifacts(version):
 
 
 def clear_html_artifacts(version):
-    run_on_app_servers('rm -rf %s' % version.project.rtd_build_path(version=version.slug))
+    run_on_app_servers('rm -rf %s %s' % (
+        version.project.rtd_build_path(version=version.slug),
+        version.project.blob_manifest_path(version=version.slug)))
 
 
 @task(queue='web')
@@ -1,11 +1,43 @@
 """Project version handling"""
 
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from django.conf import settings
+from django.core.cache import cache
 from packaging.version import Version
 from packaging.version import InvalidVersion
 
 from readthedocs.builds.constants import LATEST_VERBOSE_NAME
 from readthedocs.builds.constants import STABLE_VERBOSE_NAME
+from readthedocs.core.cache import (LRUCache, bump_cache_generation,
+                                    get_cache_generation)
+
+
+# Version string -> parsed ``Version``, or ``None`` for invalid versions.
+# Parsed versions are immutable, so they are shared between callers.
+parsed_versions = LRUCache(
+    max_size=getattr(settings, 'VERSION_PARSE_CACHE_SIZE', 10000))
+
+# Project pk -> {version pk: position} of all versions of the project, in
+# the order of :py:func:`sort_version_aware`
+version_order_cache = LRUCache(
+    max_size=getattr(settings, 'VERSION_ORDER_CACHE_SIZE', 1000),
+    ttl=getattr(settings, 'VERSION_ORDER_CACHE_TTL', 5 * 60),
+)
+
+# Seconds a VersionCompare is kept in the shared cache. Entries are
+# recomputed when versions are synced, activated or deactivated, and when
+# the stable version changes, so this only bounds unused entries.
+VERSION_COMPARE_CACHE_TTL = getattr(settings, 'VERSION_COMPARE_CACHE_TTL',
+                                    24 * 60 * 60)
+
+VersionCompare = namedtuple(
+    'VersionCompare',
+    ['highest_pk', 'highest_name', 'highest_slug', 'highest_built',
+     'comparable', 'is_highest'])
+
+LATEST_COMPARABLE = Version('99999.0')
+STABLE_COMPARABLE = Version('9999.0')
+UNKNOWN_COMPARABLE = Version('999.0')
 
 
 def get_major(version):
@@ -87,10 +119,9 @@ def version_windows(versions, major=1, minor=1, point=1):
 
     version_identifiers = []
     for version_string in versions:
-        try:
-            version_identifiers.append(Version(version_string))
-        except InvalidVersion:
-            pass
+        version_identifier = parse_version_failsafe(version_string)
+        if version_identifier is not None:
+            version_identifiers.append(version_identifier)
 
     major_version_window = major
     minor_version_window = minor
@@ -106,10 +137,18 @@ def version_windows(versions, major=1, minor=1, point=1):
 
 
 def parse_version_failsafe(version_string):
-    try:
-        return Version(version_string)
-    except InvalidVersion:
-        return None
+    """Parse ``version_string``, returning ``None`` if it isn't a version
+
+    Results are memoized in ``parsed_versions``.
+    """
+    parsed = parsed_versions.get(version_string, False)
+    if parsed is False:
+        try:
+            parsed = Version(version_string)
+        except InvalidVersion:
+            parsed = None
+        parsed_versions.set(version_string, parsed)
+    return parsed
 
 
 def comparable_version(version_string):
@@ -123,14 +162,56 @@ def comparable_version(version_string):
     comparable = parse_version_failsafe(version_string)
     if not comparable:
         if version_string == LATEST_VERBOSE_NAME:
-            comparable = Version('99999.0')
+            comparable = LATEST_COMPARABLE
         elif version_string == STABLE_VERBOSE_NAME:
-            comparable = Version('9999.0')
+            comparable = STABLE_COMPARABLE
         else:
-            comparable = Version('999.0')
+            comparable = UNKNOWN_COMPARABLE
     return comparable
 
 
+def get_version_order(project):
+    """Return the position of each version of ``project`` when sorted
+
+    The order is computed from all versions of the project, once, and kept in
+    ``version_order_cache`` until versions are synced or a version changes.
+
+    :returns: Mapping of version pk to position, newest version first
+    :rtype: dict
+    """
+    order = version_order_cache.get(project.pk)
+    if order is None:
+        versions = sorted(
+            project.versions.values_list('pk', 'verbose_name'),
+            key=lambda version: comparable_version(version[1]),
+            reverse=True)
+        order = dict((pk, position)
+                     for (position, (pk, __)) in enumerate(versions))
+        version_order_cache.set(project.pk, order)
+    return order
+
+
+def invalidate_version_order(project_pk):
+    version_order_cache.delete(project_pk)
+
+
+def order_versions(project, versions):
+    """Sort ``versions`` of ``project`` with the precomputed version order
+
+    This gives the same result as :py:func:`sort_version_aware`, without
+    parsing versions.
+
+    :param versions: Iterable of ``Version`` instances of ``project``
+    """
+    versions = list(versions)
+    order = get_version_order(project)
+    if any(version.pk not in order for version in versions):
+        # Versions were added since the order was computed
+        invalidate_version_order(project.pk)
+        order = get_version_order(project)
+    return sorted(versions, key=lambda version: order.get(version.pk, -1))
+
+
 def sort_versions(version_list):
     """Takes a list of ``Version`` models and return a sorted list,
 
@@ -177,3 +258,83 @@ def determine_stable_version(version_list):
         return version_obj
     else:
         return None
+
+
+def is_highest_version(verbose_name, highest_comparable):
+    """Whether a version is at least as high as ``highest_comparable``
+
+    Versions that aren't valid version numbers are always considered the
+    highest.
+    """
+    comparable = parse_version_failsafe(verbose_name)
+    if comparable and highest_comparable:
+        return comparable >= highest_comparable
+    return True
+
+
+def compute_version_compare(versions):
+    """Return the :py:class:`VersionCompare` of ``versions``
+
+    This holds the highest active version, its normalized version number,
+    and whether each of ``versions`` is the highest one. It only holds plain
+    values, so that it can be kept in the shared cache.
+    """
+    versions = list(versions)
+    highest_obj, highest_comparable = highest_version(
+        [version for version in versions if version.active])
+    return VersionCompare(
+        highest_pk=highest_obj.pk if highest_obj else None,
+        highest_name=unicode(highest_obj),
+        highest_slug=highest_obj.slug if highest_obj else None,
+        highest_built=(highest_obj.built or highest_obj.uploaded
+                       if highest_obj else None),
+        comparable=(unicode(highest_comparable)
+                    if highest_comparable is not None else None),
+        is_highest=dict(
+            (version.slug, is_highest_version(version.verbose_name,
+                                              highest_comparable))
+            for version in versions),
+    )
+
+
+def version_compare_key(project_pk):
+    return 'version_compare:%s:%s' % (
+        project_pk, get_cache_generation('version_compare', project_pk))
+
+
+def invalidate_version_compare(project_pk):
+    """Make every process recompute the compare data of ``project_pk``"""
+    bump_cache_generation('version_compare', project_pk)
+
+
+def update_version_compare(project):
+    """Recompute the :py:class:`VersionCompare` of ``project``
+
+    The result replaces the one in the shared cache for every process.
+    """
+    invalidate_version_compare(project.pk)
+    key = version_compare_key(project.pk)
+    compare = compute_version_compare(project.versions.all())
+    cache.set(key, compare, VERSION_COMPARE_CACHE_TTL)
+    return compare
+
+
+def get_version_compare(project):
+    """Return the :py:class:`VersionCompare` of ``project``
+
+    It is computed at most once per generation, and shared between processes.
+    """
+    key = version_compare_key(project.pk)
+    compare = cache.get(key)
+    if compare is None:
+        compare = compute_version_compare(project.versions.all())
+        cache.set(key, compare, VERSION_COMPARE_CACHE_TTL)
+    return compare
+
+
+def get_cached_version_compare(project_pk):
+    """Return the shared :py:class:`VersionCompare` of ``project_pk``
+
+    :returns: ``None`` if it isn't computed
+    """
+    return cache.get(version_compare_key(project_pk))
@@ -1,12 +1,18 @@
 from django.conf import settings
 from django.core.urlresolvers import reverse
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.translation import ugettext
 from django.utils.translation import ugettext_lazy as _
 import logging
 import re
 
+from readthedocs.builds.models import Version
+from readthedocs.core.cache import LRUCache
+from readthedocs.core.resolver import get_resolver_context
 from readthedocs.projects.models import Project
+from readthedocs.projects.signals import versions_synced
 from .managers import RedirectManager
 
 
@@ -64,6 +70,11 @@ class Redirect(models.Model):
 
     objects = RedirectManager()
 
+    # Version slugs and default version of the project, when already known.
+    # Set by :py:class:`RedirectMatcher` to skip querying for them.
+    version_slugs = None
+    default_version = None
+
     class Meta:
         verbose_name = _('redirect')
         verbose_name_plural = _('redirects')
@@ -97,12 +108,8 @@ class Redirect(models.Model):
         if not self.project.single_version:
             if language is None:
                 language = self.project.language
-            if version_slug is None:
-                version_slug = self.project.get_default_version()
-            else:
-                versions = self.project.versions.all()
-                if not versions.filter(slug=version_slug).exists():
-                    version_slug = self.project.get_default_version()
+            if version_slug is None or not self._version_exists(version_slug):
+                version_slug = self._get_default_version()
             url_kwargs.update({
                 'lang_slug': language,
                 'version_slug': version_slug,
@@ -118,6 +125,16 @@ class Redirect(models.Model):
 
         return reverse('docs_detail', kwargs=url_kwargs)
 
+    def _version_exists(self, version_slug):
+        if self.version_slugs is not None:
+            return version_slug in self.version_slugs
+        return self.project.versions.filter(slug=version_slug).exists()
+
+    def _get_default_version(self):
+        if self.default_version is not None:
+            return self.default_version
+        return self.project.get_default_version()
+
     def get_redirect_path(self, path, language=None, version_slug=None):
         method = getattr(self, 'redirect_{type}'.format(
             type=self.redirect_type))
@@ -172,3 +189,122 @@ class Redirect(models.Model):
                 filename=to,
                 language=language,
                 version_slug=version_slug)
+
+
+class RedirectMatcher(object):
+
+    """Match paths against all redirects of a project
+
+    Redirects are indexed when the matcher is built, so matching a path
+    doesn't depend on how many redirects a project has: page and exact
+    redirects are looked up by path, prefix and ``$rest`` redirects are
+    found walking a trie along the path, and their patterns are compiled
+    once. Only the Sphinx redirects, which match on the end of any path,
+    are tried one by one.
+
+    When several redirects match, the first one in the project's redirect
+    ordering wins, as when trying each redirect in turn.
+
+    :param project: Project the redirects belong to
+    :param redirects: The project's redirects, in order
+    :param version_slugs: Slugs of the project's versions
+    :param default_version: Slug of the project's default version
+    """
+
+    def __init__(self, project, redirects, version_slugs, default_version):
+        self.exact = {}
+        self.trie = {}
+        self.others = []
+        for position, redirect in enumerate(redirects):
+            redirect.project = project
+            redirect.version_slugs = version_slugs
+            redirect.default_version = default_version
+            if redirect.redirect_type in ('page', 'exact'):
+                self.exact.setdefault(redirect.from_url, []).append(
+                    (position, redirect, None))
+            if redirect.redirect_type == 'prefix':
+                self._add_prefix(redirect.from_url, position, redirect)
+            elif (redirect.redirect_type == 'exact' and
+                    '$rest' in redirect.from_url):
+                self._add_prefix(redirect.from_url.split('$rest')[0],
+                                 position, redirect)
+            elif redirect.redirect_type not in ('page', 'exact'):
+                self.others.append((position, redirect, None))
+
+    def _add_prefix(self, prefix, position, redirect):
+        try:
+            pattern = re.compile('^%s' % prefix)
+        except re.error:
+            # Fail on matching, like the redirect does, not for the project
+            self.others.append((position, redirect, None))
+            return
+        node = self.trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node.setdefault(None, []).append((position, redirect, pattern))
+
+    def get_redirect_path(self, path, language=None, version_slug=None):
+        candidates = list(self.exact.get(path, []))
+        node = self.trie
+        candidates.extend(node.get(None, []))
+        for char in path:
+            node = node.get(char)
+            if node is None:
+                break
+            candidates.extend(node.get(None, []))
+        candidates.extend(self.others)
+        candidates.sort(key=lambda candidate: candidate[0])
+        for position, redirect, pattern in candidates:
+            if pattern is None:
+                new_path = redirect.get_redirect_path(
+                    path=path, language=language, version_slug=version_slug)
+            elif redirect.redirect_type == 'exact':
+                new_path = pattern.sub(redirect.to_url, path)
+            else:
+                log.debug('Redirecting %s' % redirect)
+                new_path = redirect.get_full_path(
+                    filename=pattern.sub('', path),
+                    language=language,
+                    version_slug=version_slug)
+            if new_path:
+                return new_path
+
+
+# Project pk -> RedirectMatcher
+redirect_matcher_cache = LRUCache(
+    max_size=getattr(settings, 'REDIRECT_CACHE_SIZE', 1000),
+    ttl=getattr(settings, 'REDIRECT_CACHE_TTL', 5 * 60),
+)
+
+
+def get_redirect_matcher(project):
+    """Return the cached :py:class:`RedirectMatcher` for ``project``"""
+    matcher = redirect_matcher_cache.get(project.pk)
+    if matcher is None:
+        matcher = RedirectMatcher(
+            project,
+            list(project.redirects.all()),
+            frozenset(project.versions.values_list('slug', flat=True)),
+            get_resolver_context(project).resolved_default_version,
+        )
+        redirect_matcher_cache.set(project.pk, matcher)
+    return matcher
+
+
+@receiver(post_save, sender=Redirect)
+@receiver(post_delete, sender=Redirect)
+@receiver(post_save, sender=Version)
+@receiver(post_delete, sender=Version)
+def invalidate_redirect_matcher(sender, instance, **kwargs):
+    redirect_matcher_cache.delete(instance.project_id)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_project_redirect_matcher(sender, instance, **kwargs):
+    redirect_matcher_cache.delete(instance.pk)
+
+
+@receiver(versions_synced)
+def invalidate_synced_redirect_matcher(sender, project, **kwargs):
+    redirect_matcher_cache.delete(project.pk)
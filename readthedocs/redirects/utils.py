@@ -2,7 +2,8 @@ from django.http import HttpResponseRedirect
 import logging
 import re
 
-from readthedocs.projects.models import Project
+from readthedocs.core.middleware import get_request_project
+from readthedocs.redirects.models import get_redirect_matcher
 
 
 log = logging.getLogger(__name__)
@@ -22,10 +23,7 @@ def project_and_path_from_request(request, path):
     else:
         return None, path
 
-    try:
-        project = Project.objects.get(slug=project_slug)
-    except Project.DoesNotExist:
-        return None, path
+    project = get_request_project(request, project_slug)
     return project, path
 
 
@@ -51,7 +49,7 @@ def get_redirect_response(request, path):
     if not project.single_version:
         language, version_slug, path = language_and_version_from_path(path)
 
-    new_path = project.redirects.get_redirect_path(
+    new_path = get_redirect_matcher(project).get_redirect_path(
         path=path, language=language, version_slug=version_slug)
 
     if new_path is None:
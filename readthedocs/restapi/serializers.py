@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
-from readthedocs.builds.models import Build, BuildCommandResult, Version
+from readthedocs.builds.models import (Build, BuildCommandResult, BuildPhase,
+                                       Version)
 from readthedocs.projects.models import Project, Domain
 
 
@@ -40,11 +41,18 @@ class BuildCommandSerializer(serializers.ModelSerializer):
         model = BuildCommandResult
 
 
+class BuildPhaseSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = BuildPhase
+
+
 class BuildSerializer(serializers.ModelSerializer):
 
     """Readonly version of the build serializer, used for user facing display"""
 
     commands = BuildCommandSerializer(many=True, read_only=True)
+    phases = BuildPhaseSerializer(many=True, read_only=True)
     state_display = serializers.ReadOnlyField(source='get_state_display')
 
     class Meta:
@@ -3,13 +3,15 @@ from django.conf.urls import url, patterns, include
 from rest_framework import routers
 
 from .views.model_views import (BuildViewSet, BuildCommandViewSet,
-                                ProjectViewSet, NotificationViewSet,
-                                VersionViewSet, DomainViewSet)
+                                BuildPhaseViewSet, ProjectViewSet,
+                                NotificationViewSet, VersionViewSet,
+                                DomainViewSet)
 from readthedocs.comments.views import CommentViewSet
 
 router = routers.DefaultRouter()
 router.register(r'build', BuildViewSet)
 router.register(r'command', BuildCommandViewSet)
+router.register(r'phase', BuildPhaseViewSet)
 router.register(r'version', VersionViewSet)
 router.register(r'project', ProjectViewSet)
 router.register(r'notification', NotificationViewSet)
@@ -27,6 +29,8 @@ function_urls = patterns(
     url(r'docurl/', 'readthedocs.restapi.views.core_views.docurl', name='docurl'),
     url(r'cname/', 'readthedocs.restapi.views.core_views.cname', name='cname'),
     url(r'footer_html/', 'readthedocs.restapi.views.footer_views.footer_html', name='footer_html'),
+    url(r'version_compare/', 'readthedocs.restapi.views.footer_views.version_compare',
+        name='version_compare'),
 )
 
 search_urls = patterns(
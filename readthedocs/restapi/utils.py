@@ -1,62 +1,134 @@
 import hashlib
+import json
 import logging
 
 import requests
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils.encoding import force_text
+from guardian.models import UserObjectPermission
 
 from readthedocs.builds.constants import NON_REPOSITORY_VERSIONS
 from readthedocs.builds.models import Version
+from readthedocs.projects.version_handling import invalidate_version_order
 from readthedocs.search.indexes import PageIndex, ProjectIndex, SectionIndex
 
 log = logging.getLogger(__name__)
 
+# Bump when the fields indexed for a page change, so that incremental
+# indexing reindexes every page once
+PAGE_INDEX_VERSION = 1
+
 
 def sync_versions(project, versions, type):
     """
     Update the database with the current versions from the repository.
+
+    All changes are worked out against the project's versions in memory, so
+    slugs for new versions are picked without a query per collision. They
+    are then written in one transaction, with ``bulk_create`` for new
+    versions and batched updates for changed ones.
+
+    :returns: Slugs of the added versions
     """
-    # Bookkeeping for keeping tag/branch identifies correct
+    batch_size = getattr(settings, 'VERSION_SYNC_BATCH_SIZE', 500)
     verbose_names = [v['verbose_name'] for v in versions]
-    project.versions.filter(verbose_name__in=verbose_names).update(type=type)
 
     old_versions = {}
-    old_version_values = project.versions.values('identifier', 'verbose_name')
-    for version in old_version_values:
-        old_versions[version['verbose_name']] = version['identifier']
+    taken_slugs = set()
+    for (verbose_name, identifier, slug) in project.versions.values_list(
+            'verbose_name', 'identifier', 'slug'):
+        old_versions[verbose_name] = identifier
+        taken_slugs.add(slug)
 
-    added = set()
-    # Add new versions
+    changed = {}
+    added_versions = []
     for version in versions:
         version_id = version['identifier']
         version_name = version['verbose_name']
-        if version_name in old_versions.keys():
-            if version_id == old_versions[version_name]:
-                # Version is correct
-                continue
-            else:
+        if version_name in old_versions:
+            if version_id != old_versions[version_name]:
                 # Update slug with new identifier
-                Version.objects.filter(
-                    project=project, verbose_name=version_name
-                ).update(
-                    identifier=version_id,
-                    type=type,
-                    machine=False,
-                )
-                log.info("(Sync Versions) Updated Version: [%s=%s] " % (
-                    version['verbose_name'], version['identifier']))
+                changed[version_name] = version_id
         else:
             # New Version
-            created_version = Version.objects.create(
-                project=project,
+            added_versions.append(version)
+
+    slugs = Version._meta.get_field('slug').unique_slugs(
+        [version['verbose_name'] for version in added_versions], taken_slugs)
+    new_versions = [
+        Version(
+            project=project,
+            type=type,
+            identifier=version['identifier'],
+            verbose_name=version['verbose_name'],
+            slug=force_text(slug),
+        )
+        for version, slug in zip(added_versions, slugs)
+    ]
+
+    with transaction.atomic():
+        # Bookkeeping for keeping tag/branch identifies correct
+        for offset in range(0, len(verbose_names), batch_size):
+            project.versions.filter(
+                verbose_name__in=verbose_names[offset:offset + batch_size]
+            ).update(type=type)
+
+        changed_names = list(changed)
+        for offset in range(0, len(changed_names), batch_size):
+            batch = changed_names[offset:offset + batch_size]
+            project.versions.filter(verbose_name__in=batch).update(
+                identifier=Case(*[When(verbose_name=name,
+                                       then=Value(changed[name]))
+                                  for name in batch]),
                 type=type,
-                identifier=version['identifier'],
-                verbose_name=version['verbose_name'],
+                machine=False,
             )
-            added.add(created_version.slug)
+        for name in changed_names:
+            log.info("(Sync Versions) Updated Version: [%s=%s] " % (
+                name, changed[name]))
+
+        Version.objects.bulk_create(new_versions, batch_size=batch_size)
+        added = set(version.slug for version in new_versions)
+        if added:
+            _assign_version_permissions(project, list(added), batch_size)
+            project.sync_supported_versions()
+
+    # Versions are updated in bulk above, without model signals
+    invalidate_version_order(project.pk)
     if added:
         log.info("(Sync Versions) Added Versions: [%s] " % ' '.join(added))
     return added
 
 
+def _assign_version_permissions(project, slugs, batch_size):
+    """Give project owners view permission on new versions
+
+    This is what ``Version.save`` does for each version, for versions
+    created with ``bulk_create``.
+    """
+    owners = list(project.users.all())
+    if not owners:
+        return
+    content_type = ContentType.objects.get_for_model(Version)
+    permission = Permission.objects.get(content_type=content_type,
+                                        codename='view_version')
+    for offset in range(0, len(slugs), batch_size):
+        version_pks = project.versions.filter(
+            slug__in=slugs[offset:offset + batch_size]
+        ).values_list('pk', flat=True)
+        UserObjectPermission.objects.bulk_create([
+            UserObjectPermission(permission=permission, user=owner,
+                                 content_type=content_type,
+                                 object_pk=force_text(version_pk))
+            for version_pk in version_pks
+            for owner in owners
+        ])
+
+
 def delete_versions(project, version_data):
     """
     Delete all versions not in the current repo.
@@ -68,26 +140,50 @@ def delete_versions(project, version_data):
     if 'branches' in version_data:
         for version in version_data['branches']:
             current_versions.append(version['identifier'])
-    to_delete_qs = project.versions.all()
-    to_delete_qs = to_delete_qs.exclude(identifier__in=current_versions)
-    to_delete_qs = to_delete_qs.exclude(uploaded=True)
-    to_delete_qs = to_delete_qs.exclude(active=True)
-    to_delete_qs = to_delete_qs.exclude(slug__in=NON_REPOSITORY_VERSIONS)
-
-    if to_delete_qs.count():
-        ret_val = {obj.slug for obj in to_delete_qs}
+    current_versions = set(current_versions)
+    # Filter in memory, the list of identifiers can be too long for a query
+    to_delete = [
+        (pk, slug) for (pk, slug, identifier) in
+        (project.versions
+         .exclude(uploaded=True)
+         .exclude(active=True)
+         .exclude(slug__in=NON_REPOSITORY_VERSIONS)
+         .values_list('pk', 'slug', 'identifier'))
+        if identifier not in current_versions
+    ]
+
+    if to_delete:
+        ret_val = set(slug for (__, slug) in to_delete)
         log.info("(Sync Versions) Deleted Versions: [%s]" % ' '.join(ret_val))
-        to_delete_qs.delete()
+        batch_size = getattr(settings, 'VERSION_SYNC_BATCH_SIZE', 500)
+        pks = [pk for (pk, __) in to_delete]
+        with transaction.atomic():
+            for offset in range(0, len(pks), batch_size):
+                Version.objects.filter(
+                    pk__in=pks[offset:offset + batch_size]).delete()
         return ret_val
     else:
         return set()
 
 
 def index_search_request(version, page_list, commit, project_scale, page_scale,
-                         section=True, delete=True):
-    log_msg = ' '.join([page['path'] for page in page_list])
-    log.info("(Server Search) Indexing Pages: %s [%s]" % (
-        version.project.slug, log_msg))
+                         section=True, delete=True, incremental=False):
+    """Update search indexes with a version's pages
+
+    :param page_list: Iterable of page dictionaries. Pages are consumed
+        lazily and streamed to Elasticsearch with their sections, so a
+        generator keeps memory bounded for large projects.
+    :param delete: Delete pages of this version that are not in `page_list`
+    :param incremental: Skip pages whose hash matches the hash stored on the
+        indexed page. Pages can carry the hash of their source file in a
+        ``sha`` key, otherwise it is computed from the page data. The stored
+        hash also covers the scales, `section` and
+        :py:data:`PAGE_INDEX_VERSION`, so changing those reindexes every
+        page. A page's sections are sent before it, and its hash is cleared
+        if any of them failed, so that they are sent again next time.
+    """
+    log.info("(Server Search) Indexing Pages: %s:%s" % (
+        version.project.slug, version.slug))
     project = version.project
     page_obj = PageIndex()
     section_obj = SectionIndex()
@@ -107,58 +203,150 @@ def index_search_request(version, page_list, commit, project_scale, page_scale,
         'weight': project_scale,
     })
 
-    index_list = []
-    section_index_list = []
-    for page in page_list:
-        log.debug("(API Index) %s:%s" % (project.slug, page['path']))
-        page_id = hashlib.md5('%s-%s-%s' % (project.slug, version.slug, page['path'])).hexdigest()
-        index_list.append({
-            'id': page_id,
-            'project': project.slug,
-            'version': version.slug,
-            'path': page['path'],
-            'title': page['title'],
-            'headers': page['headers'],
-            'content': page['content'],
-            'taxonomy': None,
-            'commit': commit,
-            'weight': page_scale + project_scale,
-        })
-        if section:
-            for section in page['sections']:
-                section_index_list.append({
-                    'id': hashlib.md5(
+    version_query = {
+        "bool": {
+            "must": [
+                {"term": {"project": project.slug}},
+                {"term": {"version": version.slug}},
+            ]
+        }
+    }
+    existing = {}
+    if delete or incremental:
+        existing = dict(page_obj.scan_fields(
+            version_query, fields=['sha', 'path'], routing=project.slug))
+
+    seen = set()
+    skipped = []
+    indexed_paths = set()
+    seen_sections = set()
+
+    def _actions():
+        for page in page_list:
+            page_id = hashlib.md5('%s-%s-%s' % (project.slug, version.slug,
+                                                page['path'])).hexdigest()
+            seen.add(page_id)
+            sha = _index_hash(page, project_scale, page_scale, section)
+            if incremental and existing.get(page_id, {}).get('sha') == sha:
+                skipped.append(page_id)
+                continue
+            log.debug("(API Index) %s:%s" % (project.slug, page['path']))
+            indexed_paths.add(page['path'])
+            if section:
+                for page_section in page['sections']:
+                    section_id = hashlib.md5(
                         '%s-%s-%s-%s' % (project.slug, version.slug,
-                                         page['path'], section['id'])
-                    ).hexdigest(),
-                    'project': project.slug,
-                    'version': version.slug,
-                    'path': page['path'],
-                    'page_id': section['id'],
-                    'title': section['title'],
-                    'content': section['content'],
-                    'weight': page_scale,
-                })
-            section_obj.bulk_index(section_index_list, parent=page_id, routing=project.slug)
-
-    page_obj.bulk_index(index_list, parent=project.slug)
+                                         page['path'], page_section['id'])
+                    ).hexdigest()
+                    if section_id in seen_sections:
+                        # Duplicate anchors on a page map to the same document
+                        continue
+                    seen_sections.add(section_id)
+                    yield section_obj.get_action({
+                        'id': section_id,
+                        'project': project.slug,
+                        'version': version.slug,
+                        'path': page['path'],
+                        'page_id': page_section['id'],
+                        'title': page_section['title'],
+                        'content': page_section['content'],
+                        'commit': commit,
+                        'weight': page_scale,
+                    }, parent=page_id, routing=project.slug)
+            yield page_obj.get_action({
+                'id': page_id,
+                'sha': sha,
+                'project': project.slug,
+                'version': version.slug,
+                'path': page['path'],
+                'title': page['title'],
+                'headers': page['headers'],
+                'content': page['content'],
+                'taxonomy': None,
+                'commit': commit,
+                'weight': page_scale + project_scale,
+            }, parent=project.slug)
+
+    failed_pages = set()
+    incomplete_pages = set()
+
+    def _failed(action):
+        if action['_type'] == section_obj._type:
+            incomplete_pages.add(action['_parent'])
+        else:
+            failed_pages.add(action['_id'])
+
+    stats = page_obj.streaming_bulk_index(_actions(), on_failure=_failed)
+    log.info(("(Server Search) Indexed %s documents in %s chunks, %s failed, "
+              "%s pages unchanged: %s:%s") % (
+        stats['indexed'], stats['chunks'], stats['failed'], len(skipped),
+        project.slug, version.slug))
+
+    # Pages whose sections failed would be skipped next time with the hash
+    # they were just indexed with, clear it
+    incomplete_pages -= failed_pages
+    if incomplete_pages:
+        page_obj.streaming_bulk_index(
+            {'_op_type': 'update',
+             '_index': page_obj._index,
+             '_type': page_obj._type,
+             '_id': page_id,
+             '_parent': project.slug,
+             'doc': {'sha': ''}}
+            for page_id in incomplete_pages)
 
     if delete:
-        log.info("(Server Search) Deleting files not in commit: %s" % commit)
-        # TODO: AK Make sure this works
-        delete_query = {
-            "query": {
-                "bool": {
-                    "must": [
-                        {"term": {"project": project.slug, }},
-                        {"term": {"version": version.slug, }},
-                    ],
-                    "must_not": {
-                        "term": {
-                            "commit": commit
-                        }
-                    }
-                }
+        stale = [page_id for page_id in existing if page_id not in seen]
+        if stale:
+            log.info("(Server Search) Deleting %s pages not in commit: %s" % (
+                len(stale), commit))
+            page_obj.delete_documents(stale, routing=project.slug)
+        # Sections of removed pages, and sections that no longer exist on
+        # pages that were just reindexed
+        stale_paths = set(existing[page_id].get('path') for page_id in stale)
+        if section:
+            stale_paths.update(indexed_paths)
+        stale_paths.discard(None)
+        stale_sections = [
+            section_id for section_id
+            in _scan_sections(section_obj, version_query, sorted(stale_paths),
+                              routing=project.slug)
+            if section_id not in seen_sections
+        ]
+        if stale_sections:
+            log.info("(Server Search) Deleting %s stale sections: %s" % (
+                len(stale_sections), commit))
+            section_obj.delete_documents(stale_sections,
+                                         routing=project.slug)
+
+
+def _scan_sections(section_obj, version_query, paths, routing, batch_size=500):
+    """Yield the ids of the sections matching ``version_query`` on ``paths``
+
+    Paths are queried in batches, to keep the terms filters small.
+    """
+    for offset in range(0, len(paths), batch_size):
+        query = {
+            "bool": {
+                "must": version_query['bool']['must'] + [
+                    {"terms": {"path": paths[offset:offset + batch_size]}},
+                ]
             }
         }
-        page_obj.delete_document(body=delete_query)
+        for section_id, __ in section_obj.scan_fields(
+                query, fields=['path'], routing=routing):
+            yield section_id
+
+
+def _index_hash(page, project_scale, page_scale, section):
+    """Hash of a page's source and of how it is indexed"""
+    data = json.dumps([PAGE_INDEX_VERSION, page.get('sha') or _page_hash(page),
+                       project_scale, page_scale, bool(section)])
+    return hashlib.md5(data.encode('utf-8')).hexdigest()
+
+
+def _page_hash(page):
+    """Hash of the indexed fields of a page"""
+    data = json.dumps([page['title'], page['headers'], page['content'],
+                       page['sections']], sort_keys=True)
+    return hashlib.md5(data.encode('utf-8')).hexdigest()
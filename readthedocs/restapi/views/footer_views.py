@@ -1,67 +1,182 @@
+import hashlib
+import json
+from collections import namedtuple
+
 from django.shortcuts import get_object_or_404
 from django.template import loader as template_loader
 from django.conf import settings
+from django.core.cache import cache
 from django.core.context_processors import csrf
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+from django.http import Http404
+from django.utils.http import parse_etags
 
 from rest_framework import decorators, permissions
 from rest_framework.renderers import JSONPRenderer, JSONRenderer, BrowsableAPIRenderer
 from rest_framework.response import Response
 
+from readthedocs.builds.constants import BUILD_STATE_FINISHED
 from readthedocs.builds.constants import LATEST
 from readthedocs.builds.constants import TAG
-from readthedocs.builds.models import Version
-from readthedocs.donate.models import SupporterPromo
-from readthedocs.projects.models import Project
-from readthedocs.projects.version_handling import highest_version
+from readthedocs.builds.models import Build, Version
+from readthedocs.core.cache import bump_cache_generation, get_cache_generation
+from readthedocs.donate.utils import get_promo
+from readthedocs.gold.models import GoldUser
+from readthedocs.projects.constants import PUBLIC
+from readthedocs.projects.models import Project, Domain
+from readthedocs.projects.signals import versions_synced
+from readthedocs.projects.version_handling import compute_version_compare
+from readthedocs.projects.version_handling import get_version_compare
+from readthedocs.projects.version_handling import is_highest_version
 from readthedocs.projects.version_handling import parse_version_failsafe
 
 
-def get_version_compare_data(project, base_version=None):
-    highest_version_obj, highest_version_comparable = highest_version(
-        project.versions.filter(active=True))
+# Rendered footers and the data they are rendered from, for anonymous users,
+# are kept in the shared cache. Their keys include the footer generation of
+# the projects they show, see :py:func:`footer_generation`, so that changes
+# to any of these projects drop them in every process. The TTL only bounds
+# how long unused entries are kept.
+FOOTER_CACHE_TTL = getattr(settings, 'FOOTER_CACHE_TTL', 60 * 60)
+
+FooterData = namedtuple(
+    'FooterData',
+    ['project', 'version', 'main_project', 'translations', 'versions',
+     'downloads', 'print_url', 'version_compare', 'promo_allowed'])
+
+FooterPayload = namedtuple('FooterPayload', ['data', 'html', 'etag'])
+
+
+def get_version_compare_data(project, base_version=None, versions=None):
+    """Return how ``base_version`` compares to the highest project version
+
+    :param versions: Versions to compare against, defaults to all of the
+        project's versions, from the per project cache
+    """
+    if versions is None:
+        compare = get_version_compare(project)
+    else:
+        compare = compute_version_compare(versions)
     ret_val = {
-        'project': unicode(highest_version_obj),
-        'version': unicode(highest_version_comparable),
+        'project': compare.highest_name,
+        'version': unicode(compare.comparable),
         'is_highest': True,
     }
-    if highest_version_obj:
-        ret_val['url'] = highest_version_obj.get_absolute_url()
-        ret_val['slug'] = highest_version_obj.slug,
+    if compare.highest_pk is not None:
+        highest = Version(project=project, slug=compare.highest_slug,
+                          built=compare.highest_built, uploaded=False)
+        ret_val['url'] = highest.get_absolute_url()
+        ret_val['slug'] = compare.highest_slug,
     if base_version and base_version.slug != LATEST:
-        try:
-            base_version_comparable = parse_version_failsafe(
-                base_version.verbose_name)
-            if base_version_comparable:
-                # This is only place where is_highest can get set. All error
-                # cases will be set to True, for non- standard versions.
-                ret_val['is_highest'] = (
-                    base_version_comparable >= highest_version_comparable)
-            else:
-                ret_val['is_highest'] = True
-        except (Version.DoesNotExist, TypeError):
-            ret_val['is_highest'] = True
+        # This is only place where is_highest can get set. All error cases
+        # will be set to True, for non- standard versions.
+        is_highest = compare.is_highest.get(base_version.slug)
+        if is_highest is None:
+            # Versions added since the comparison was computed
+            highest_comparable = None
+            if compare.comparable is not None:
+                highest_comparable = parse_version_failsafe(compare.comparable)
+            is_highest = is_highest_version(base_version.verbose_name,
+                                            highest_comparable)
+        ret_val['is_highest'] = is_highest
     return ret_val
 
 
-@decorators.api_view(['GET'])
-@decorators.permission_classes((permissions.AllowAny,))
-@decorators.renderer_classes((JSONRenderer, JSONPRenderer, BrowsableAPIRenderer))
-def footer_html(request):
-    project_slug = request.GET.get('project', None)
-    version_slug = request.GET.get('version', None)
-    page_slug = request.GET.get('page', None)
+def get_footer_data(project, version, versions=None):
+    """Build the user independent data shown in the footer of ``version``
+
+    :param versions: Versions listed in the footer, defaults to the public
+        active versions of the project
+    :rtype: FooterData
+    """
+    main_project = project.main_language_project or project
+    if versions is None:
+        versions = project.ordered_active_versions()
+
+    if version.type == TAG and project.has_pdf(version.slug):
+        print_url = (
+            'https://keminglabs.com/print-the-docs/quote?project={project}&version={version}'
+            .format(
+                project=project.slug,
+                version=version.slug))
+    else:
+        print_url = None
+
+    promo_allowed = (
+        # Explicit promo disabling
+        project.slug not in getattr(settings, 'DISABLE_PROMO_PROJECTS', []) and
+        # A GoldUser has mapped this project
+        not project.gold_owners.exists())
+
+    return FooterData(
+        project=project,
+        version=version,
+        main_project=main_project,
+        translations=list(main_project.translations.all()),
+        versions=list(versions),
+        downloads=version.get_downloads(pretty=True),
+        print_url=print_url,
+        version_compare=get_version_compare_data(project, version),
+        promo_allowed=promo_allowed,
+    )
+
+
+def footer_generation(project_pks):
+    """Return the combined footer generation of ``project_pks``"""
+    return ':'.join(get_cache_generation('footer', pk)
+                    for pk in sorted(set(project_pks)))
+
+
+def footer_key(kind, generation, *parts):
+    digest = hashlib.md5(json.dumps(parts).encode('utf-8')).hexdigest()
+    return 'footer:%s:%s:%s' % (kind, generation, digest)
+
+
+def get_cached_footer_data(project_slug, version_slug):
+    """Return :py:class:`FooterData` for a version anonymous users can see
+
+    The pks of the projects a footer shows are kept per project slug, so
+    that the key of the data can be built without a query.
+
+    :returns: Tuple of the data, or ``None`` if the version doesn't exist or
+        isn't public, and the footer generation of the projects it shows
+    """
+    pks_key = 'footer:projects:%s' % project_slug
+    project_pks = cache.get(pks_key)
+    if project_pks is not None:
+        generation = footer_generation(project_pks)
+        data = cache.get(footer_key('data', generation, project_slug,
+                                    version_slug))
+        if data is not None:
+            return data, generation
+
+    version = (Version.objects.public(only_active=False)
+               .filter(project__slug=project_slug, slug=version_slug)
+               .select_related('project').first())
+    if version is None:
+        return None, None
+    data = get_footer_data(version.project, version)
+    project_pks = (data.project.pk, data.main_project.pk)
+    generation = footer_generation(project_pks)
+    cache.set(pks_key, project_pks, FOOTER_CACHE_TTL)
+    cache.set(footer_key('data', generation, project_slug, version_slug),
+              data, FOOTER_CACHE_TTL)
+    return data, generation
+
+
+def render_footer(request, data):
+    """Render the footer HTML and return it with its ETag
+
+    The ETag covers everything in the response except the promo, which is
+    picked for each request, so it is a weak validator.
+    """
     theme = request.GET.get('theme', False)
+    page_slug = request.GET.get('page', None)
     docroot = request.GET.get('docroot', '')
-    subproject = request.GET.get('subproject', False)
     source_suffix = request.GET.get('source_suffix', '.rst')
-
-    new_theme = (theme == "sphinx_rtd_theme")
-    using_theme = (theme == "default")
-    project = get_object_or_404(Project, slug=project_slug)
-    version = get_object_or_404(
-        Version.objects.public(request.user, project=project, only_active=False),
-        slug=version_slug)
-    main_project = project.main_language_project or project
+    project = data.project
+    version = data.version
+    main_project = data.main_project
 
     if page_slug and page_slug != "index":
         if (
@@ -75,61 +190,201 @@ def footer_html(request):
     else:
         path = ""
 
-    if version.type == TAG and version.project.has_pdf(version.slug):
-        print_url = (
-            'https://keminglabs.com/print-the-docs/quote?project={project}&version={version}'
-            .format(
-                project=project.slug,
-                version=version.slug))
-    else:
-        print_url = None
-
-    show_promo = getattr(settings, 'USE_PROMOS', True)
-    # User is a gold user, no promos for them!
-    if request.user.is_authenticated():
-        if request.user.gold.count() or request.user.goldonce.count():
-            show_promo = False
-    # Explicit promo disabling
-    if project.slug in getattr(settings, 'DISABLE_PROMO_PROJECTS', []):
-        show_promo = False
-    # A GoldUser has mapped this project
-    if project.gold_owners.count():
-        show_promo = False
-
-    promo_obj = SupporterPromo.objects.filter(live=True, display_type='doc').order_by('?').first()
-    if not promo_obj:
-        show_promo = False
-
-    version_compare_data = get_version_compare_data(project, version)
-
     context = {
         'project': project,
         'path': path,
-        'downloads': version.get_downloads(pretty=True),
+        'downloads': data.downloads,
         'current_version': version.verbose_name,
-        'versions': project.ordered_active_versions(user=request.user),
+        'versions': data.versions,
         'main_project': main_project,
-        'translations': main_project.translations.all(),
+        'translations': data.translations,
         'current_language': project.language,
-        'using_theme': using_theme,
-        'new_theme': new_theme,
+        'using_theme': theme == "default",
+        'new_theme': theme == "sphinx_rtd_theme",
         'settings': settings,
-        'subproject': subproject,
-        'print_url': print_url,
+        'subproject': request.GET.get('subproject', False),
+        'print_url': data.print_url,
         'github_edit_url': version.get_github_url(docroot, page_slug, source_suffix, 'edit'),
         'github_view_url': version.get_github_url(docroot, page_slug, source_suffix, 'view'),
         'bitbucket_url': version.get_bitbucket_url(docroot, page_slug, source_suffix),
     }
-
     context.update(csrf(request))
     html = template_loader.get_template('restapi/footer.html').render(context)
+    etag = hashlib.md5(json.dumps(
+        [html, version.active, version.supported, data.version_compare,
+         data.promo_allowed],
+        sort_keys=True, default=unicode).encode('utf-8')).hexdigest()
+    return html, 'W/"%s"' % etag
+
+
+def etag_matches(request, etag):
+    """Whether ``request`` has ``etag`` in If-None-Match, compared weakly"""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    return parse_etags(etag)[0] in parse_etags(header)
+
+
+def get_footer_payload(request, project_slug, version_slug):
+    """Return the :py:class:`FooterPayload` for ``request``
+
+    Anonymous users share rendered footers from the shared cache. Logged in
+    users can see private versions, so their footer is rendered for them,
+    from cached data when the version is public.
+    """
+    if request.user.is_authenticated():
+        project = get_object_or_404(Project, slug=project_slug)
+        version = get_object_or_404(
+            Version.objects.public(request.user, project=project, only_active=False),
+            slug=version_slug)
+        versions = project.ordered_active_versions(user=request.user)
+        data, __ = get_cached_footer_data(project_slug, version_slug)
+        if data is None:
+            data = get_footer_data(project, version, versions=versions)
+        else:
+            data = data._replace(versions=versions)
+        html, etag = render_footer(request, data)
+        return FooterPayload(data=data, html=html, etag=etag)
+
+    data, generation = get_cached_footer_data(project_slug, version_slug)
+    if data is None:
+        raise Http404('No Version matches the given query.')
+    key = footer_key('html', generation, project_slug, version_slug, *[
+        request.GET.get(arg) for arg in
+        ['theme', 'page', 'docroot', 'subproject', 'source_suffix']])
+    rendered = cache.get(key)
+    if rendered is None:
+        rendered = render_footer(request, data)
+        cache.set(key, rendered, FOOTER_CACHE_TTL)
+    html, etag = rendered
+    return FooterPayload(data=data, html=html, etag=etag)
+
+
+def invalidate_footer_cache(project_pks):
+    """Make every process drop the footers showing any of ``project_pks``"""
+    for pk in set(project_pks):
+        if pk is not None:
+            bump_cache_generation('footer', pk)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_project_footer(sender, instance, **kwargs):
+    # The main project of a translation may have changed
+    cache.delete('footer:projects:%s' % instance.slug)
+    invalidate_footer_cache([instance.pk, instance.main_language_project_id])
+
+
+@receiver(post_save, sender=Version)
+@receiver(post_delete, sender=Version)
+@receiver(post_save, sender=Domain)
+@receiver(post_delete, sender=Domain)
+def invalidate_version_footer(sender, instance, **kwargs):
+    invalidate_footer_cache([instance.project_id])
+
+
+@receiver(post_save, sender=Build)
+def invalidate_build_footer(sender, instance, **kwargs):
+    if instance.state == BUILD_STATE_FINISHED:
+        invalidate_footer_cache([instance.project_id])
+
+
+@receiver(versions_synced)
+def invalidate_synced_footer(sender, project, **kwargs):
+    invalidate_footer_cache([project.pk])
+
+
+@receiver(m2m_changed, sender=GoldUser.projects.through)
+def invalidate_gold_footer(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action.startswith('post_'):
+            invalidate_footer_cache([instance.pk])
+    elif action == 'pre_clear':
+        # The cleared projects are only known before they are removed
+        instance._cleared_project_pks = list(
+            instance.projects.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        invalidate_footer_cache(getattr(instance, '_cleared_project_pks', []))
+    elif action.startswith('post_') and pk_set:
+        invalidate_footer_cache(pk_set)
+
+
+@decorators.api_view(['GET'])
+@decorators.permission_classes((permissions.AllowAny,))
+@decorators.renderer_classes((JSONRenderer, JSONPRenderer, BrowsableAPIRenderer))
+def footer_html(request):
+    project_slug = request.GET.get('project', None)
+    version_slug = request.GET.get('version', None)
+    payload = get_footer_payload(request, project_slug, version_slug)
+    if etag_matches(request, payload.etag):
+        resp = Response(status=304)
+        resp['ETag'] = payload.etag
+        return resp
+
+    data = payload.data
+    show_promo = getattr(settings, 'USE_PROMOS', True) and data.promo_allowed
+    # User is a gold user, no promos for them!
+    if show_promo and request.user.is_authenticated():
+        if request.user.gold.count() or request.user.goldonce.count():
+            show_promo = False
+
+    promo_obj = None
+    if show_promo:
+        promo_obj = get_promo('doc')
+        if not promo_obj:
+            show_promo = False
+
     resp_data = {
-        'html': html,
-        'version_active': version.active,
-        'version_compare': version_compare_data,
-        'version_supported': version.supported,
+        'html': payload.html,
+        'version_active': data.version.active,
+        'version_compare': data.version_compare,
+        'version_supported': data.version.supported,
         'promo': show_promo,
     }
     if show_promo and promo_obj:
         resp_data['promo_data'] = promo_obj.as_dict()
-    return Response(resp_data)
+    resp = Response(resp_data)
+    resp['ETag'] = payload.etag
+    return resp
+
+
+@decorators.api_view(['GET'])
+@decorators.permission_classes((permissions.AllowAny,))
+@decorators.renderer_classes((JSONRenderer, JSONPRenderer, BrowsableAPIRenderer))
+def version_compare(request):
+    """Return how ``version`` compares to the highest version of ``project``
+
+    The response is the ``version_compare`` data of the footer, computed
+    from the versions the user can see. When every version of the project
+    is public it doesn't depend on the user, so clients and proxies may
+    cache it for ``VERSION_COMPARE_MAX_AGE`` seconds, otherwise only the
+    client may. Either way it can be revalidated with its ETag.
+    """
+    project = get_object_or_404(
+        Project.objects.protected(request.user),
+        slug=request.GET.get('project'))
+    versions = list(Version.objects.public(request.user, project=project,
+                                           only_active=False))
+    version_slug = request.GET.get('version')
+    base_version = None
+    if version_slug and version_slug != LATEST:
+        base_version = next((version for version in versions
+                             if version.slug == version_slug), None)
+    shared = (project.privacy_level == PUBLIC and
+              not project.versions.exclude(privacy_level=PUBLIC).exists())
+    if shared:
+        data = get_version_compare_data(project, base_version)
+    else:
+        data = get_version_compare_data(project, base_version,
+                                        versions=versions)
+    etag = '"%s"' % hashlib.md5(
+        json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+    if etag_matches(request, etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(data)
+    resp['ETag'] = etag
+    resp['Cache-Control'] = '%s, max-age=%d' % (
+        'public' if shared else 'private',
+        getattr(settings, 'VERSION_COMPARE_MAX_AGE', 5 * 60))
+    return resp
@@ -9,19 +9,22 @@ from rest_framework.response import Response
 from readthedocs.builds.constants import BRANCH
 from readthedocs.builds.constants import TAG
 from readthedocs.builds.filters import VersionFilter
-from readthedocs.builds.models import Build, BuildCommandResult, Version
+from readthedocs.builds.models import (Build, BuildCommandResult, BuildPhase,
+                                       Version)
 from readthedocs.restapi import utils as api_utils
 from readthedocs.core.utils import trigger_build
 from readthedocs.oauth import utils as oauth_utils
 from readthedocs.projects.filters import ProjectFilter, DomainFilter
 from readthedocs.projects.models import Project, EmailHook, Domain
+from readthedocs.projects.signals import versions_synced
 from readthedocs.projects.version_handling import determine_stable_version
 
 from ..permissions import (APIPermission, APIRestrictedPermission,
                            RelatedProjectIsOwner)
 from ..serializers import (BuildSerializerFull, BuildSerializer,
-                           BuildCommandSerializer, ProjectSerializer,
-                           VersionSerializer, DomainSerializer)
+                           BuildCommandSerializer, BuildPhaseSerializer,
+                           ProjectSerializer, VersionSerializer,
+                           DomainSerializer)
 
 log = logging.getLogger(__name__)
 
@@ -127,6 +130,8 @@ class ProjectViewSet(viewsets.ModelViewSet):
         except Exception, e:
             log.exception("Sync Versions Error: %s" % e.message)
             return Response({'error': e.message}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            versions_synced.send(sender=Project, project=project)
 
         try:
             old_stable = project.get_stable_version()
@@ -196,6 +201,16 @@ class BuildCommandViewSet(viewsets.ModelViewSet):
         return self.model.objects.api(self.request.user)
 
 
+class BuildPhaseViewSet(viewsets.ModelViewSet):
+    permission_classes = [APIRestrictedPermission]
+    renderer_classes = [JSONRenderer, BrowsableAPIRenderer]
+    serializer_class = BuildPhaseSerializer
+    model = BuildPhase
+
+    def get_queryset(self):
+        return self.model.objects.api(self.request.user)
+
+
 class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (permissions.IsAuthenticated, RelatedProjectIsOwner)
     renderer_classes = (JSONRenderer, BrowsableAPIRenderer)
@@ -1,7 +1,11 @@
 import lxml.html
 
+from django.contrib.auth.models import AnonymousUser
 from django.test import TestCase
 
+from readthedocs.core.middleware import project_cache
+from readthedocs.core.resolver import resolver_context_cache
+from readthedocs.core.views import get_suggestion, suggestion_index_cache
 from readthedocs.projects.models import Project
 
 
@@ -57,3 +61,50 @@ class Testmaker(TestCase):
         self.assertEqual(r['X-Accel-Redirect'], '/user_builds/pip/translations/es/latest/nonexistent_dir/bogus.html')
         r = self.client.get('/user_builds/pip/translations/es/latest/nonexistent_dir/bogus.html', {})
         self.assertContains(r, '<p>What are you looking for?</p>', status_code=404, html=False)
+
+
+class SuggestionIndexTests(TestCase):
+    fixtures = ["eric", "test_data"]
+
+    def setUp(self):
+        for cache in [project_cache, resolver_context_cache,
+                      suggestion_index_cache]:
+            cache.clear()
+        self.pip = Project.objects.get(slug='pip')
+        self.latest = self.pip.versions.create_latest()
+        self.pip_es = Project.objects.create(
+            name="PIP-ES", slug='pip-es', language='es',
+            main_language_project=self.pip)
+
+    def test_suggestions_without_queries(self):
+        user = AnonymousUser()
+        get_suggestion('pip', 'es', 'nonexistent', 'index', user)
+        with self.assertNumQueries(0):
+            suggestion = get_suggestion('pip', 'fr', 'latest', 'index', user)
+            self.assertEqual(
+                [item['label'] for item in suggestion['list']], ['en', 'es'])
+            suggestion = get_suggestion('pip', 'en', 'nope', 'index', user)
+            self.assertIn('latest', [item['label']
+                                     for item in suggestion['list']])
+
+    def test_new_version_invalidates(self):
+        user = AnonymousUser()
+        suggestion = get_suggestion('pip', 'es', 'nonexistent', 'index', user)
+        self.assertEqual(
+            [item['label'] for item in suggestion['list']], ['latest'])
+        self.pip_es.versions.create(verbose_name='2.0', slug='2.0',
+                                    active=True)
+        suggestion = get_suggestion('pip', 'es', 'nonexistent', 'index', user)
+        self.assertEqual(
+            [item['label'] for item in suggestion['list']], ['latest', '2.0'])
+
+    def test_anonymous_404_is_cacheable(self):
+        r = self.client.get('/docs/pip/en/nonexistent_ver/bogus.html')
+        self.assertEqual(r.status_code, 404)
+        self.assertIn('max-age=300', r['Cache-Control'])
+        self.assertIn('public', r['Cache-Control'])
+
+        self.client.login(username='eric', password='test')
+        r = self.client.get('/docs/pip/en/nonexistent_ver/bogus.html')
+        self.assertEqual(r.status_code, 404)
+        self.assertFalse(r.has_header('Cache-Control'))
@@ -138,6 +138,41 @@ class APIBuildTests(TestCase):
         self.assertEqual(build['commands'][0]['run_time'], 5)
         self.assertEqual(build['commands'][0]['description'], 'foo')
 
+    def test_make_build_phases(self):
+        """Save a profiled build phase and read it back on the build"""
+        client = APIClient()
+        client.login(username='super', password='test')
+        build = get(Build, project_id=1, version_id=1)
+        resp = client.post(
+            '/api/v2/phase/',
+            {
+                'build': build.pk,
+                'name': 'build_docs_html',
+                'elapsed': 12.5,
+                'cpu_time': 10.25,
+                'max_rss': 204800,
+                'output_size': 4096,
+            },
+            format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        resp = client.get('/api/v2/build/%s/' % build.pk)
+        self.assertEqual(resp.status_code, 200)
+        phases = resp.data['phases']
+        self.assertEqual(len(phases), 1)
+        self.assertEqual(phases[0]['name'], 'build_docs_html')
+        self.assertEqual(phases[0]['max_rss'], 204800)
+        self.assertEqual(phases[0]['output_size'], 4096)
+
+    def test_make_build_phases_without_permission(self):
+        client = APIClient()
+        build = get(Build, project_id=1, version_id=1)
+        resp = client.post(
+            '/api/v2/phase/',
+            {'build': build.pk, 'name': 'setup_vcs', 'elapsed': 1},
+            format='json')
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(build.phases.exists())
+
 
 class APITests(TestCase):
     fixtures = ['eric.json', 'test_data.json']
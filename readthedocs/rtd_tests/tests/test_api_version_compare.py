@@ -1,7 +1,15 @@
+import json
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.test.utils import override_settings
 
 from readthedocs.builds.constants import LATEST
+from readthedocs.core.resolver import resolver_context_cache
 from readthedocs.projects.models import Project
+from readthedocs.projects.signals import versions_synced
+from readthedocs.projects.version_handling import (
+    get_cached_version_compare, get_version_compare)
 from readthedocs.restapi.views.footer_views import get_version_compare_data
 
 
@@ -31,3 +39,88 @@ class VersionCompareTests(TestCase):
 
         data = get_version_compare_data(project, version)
         self.assertEqual(data['is_highest'], True)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CachedVersionCompareTests(TestCase):
+    fixtures = ['eric.json', 'test_data.json']
+
+    def setUp(self):
+        cache.clear()
+        resolver_context_cache.clear()
+        self.project = Project.objects.get(slug='read-the-docs')
+
+    def test_computed_once(self):
+        version = self.project.versions.get(slug='0.2.1')
+        get_version_compare_data(self.project, version)
+        with self.assertNumQueries(0):
+            data = get_version_compare_data(self.project, version)
+        self.assertFalse(data['is_highest'])
+        self.assertEqual(data['slug'], ('0.2.2',))
+
+    def test_activation_recomputes(self):
+        version = self.project.versions.get(slug='0.2.1')
+        self.assertFalse(
+            get_version_compare_data(self.project, version)['is_highest'])
+        highest = self.project.versions.get(slug='0.2.2')
+        highest.active = False
+        highest.save()
+        self.assertTrue(
+            get_version_compare_data(self.project, version)['is_highest'])
+
+    def test_sync_recomputes(self):
+        version = self.project.versions.get(slug='0.2.1')
+        get_version_compare_data(self.project, version)
+        self.project.versions.filter(slug='0.2.2').update(active=False)
+        versions_synced.send(sender=Project, project=self.project)
+        # Stored in the shared cache for every process
+        compare = get_cached_version_compare(self.project.pk)
+        self.assertTrue(compare.is_highest['0.2.1'])
+        self.assertTrue(
+            get_version_compare_data(self.project, version)['is_highest'])
+
+    def test_project_save_invalidates(self):
+        compare = get_version_compare(self.project)
+        self.assertIn(self.project.name, compare.highest_name)
+        self.project.name = 'Renamed'
+        self.project.save()
+        self.assertIsNone(get_cached_version_compare(self.project.pk))
+        self.assertIn('Renamed', get_version_compare(self.project).highest_name)
+
+    def test_api(self):
+        url = '/api/v2/version_compare/?project=read-the-docs&version=0.2.1'
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(json.loads(resp.content)['is_highest'])
+        self.assertIn('max-age=', resp['Cache-Control'])
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+
+    def test_api_private_version(self):
+        self.project.versions.filter(slug='0.2.2').update(
+            privacy_level='private')
+        url = '/api/v2/version_compare/?project=read-the-docs&version=0.2.1'
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        data = json.loads(resp.content)
+        self.assertNotEqual(data['slug'], ['0.2.2'])
+        self.assertTrue(data['is_highest'])
+        self.assertTrue(resp['Cache-Control'].startswith('private'))
+
+        self.client.login(username='super', password='test')
+        resp = self.client.get(url)
+        data = json.loads(resp.content)
+        self.assertEqual(data['slug'], ['0.2.2'])
+        self.assertFalse(data['is_highest'])
+        self.assertTrue(resp['Cache-Control'].startswith('private'))
+
+    def test_api_private_project(self):
+        self.project.privacy_level = 'private'
+        self.project.save()
+        url = '/api/v2/version_compare/?project=read-the-docs'
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.login(username='super', password='test')
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp['Cache-Control'].startswith('private'))
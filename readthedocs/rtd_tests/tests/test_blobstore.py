@@ -0,0 +1,193 @@
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
+import mock
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from readthedocs.privacy.backends.syncers import RemoteSyncer, SyncResult
+from readthedocs.projects.blobstore import (BlobStore, save_manifest,
+                                            tree_usage)
+from readthedocs.projects.models import Project
+from readthedocs.projects.tasks import move_files
+
+
+def write(path, content):
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as fh:
+        fh.write(content)
+
+
+class BlobStoreTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.store = BlobStore(os.path.join(self.root, 'blobs'))
+        for version in ['1.0', '2.0']:
+            write(self.path('build', version, 'index.html'), version)
+            write(self.path('build', version, '_static', 'theme.css'), 'css')
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def test_identical_files_stored_once(self):
+        manifest, stats = self.store.ingest(self.path('build', '1.0'))
+        self.assertEqual(sorted(manifest), ['_static/theme.css', 'index.html'])
+        self.assertEqual(stats.new_blobs, 2)
+        manifest, stats = self.store.ingest(self.path('build', '2.0'))
+        self.assertEqual(stats.files, 2)
+        self.assertEqual(stats.new_blobs, 1)
+        self.assertEqual(stats.new_bytes, len('2.0'))
+        self.assertEqual(self.store.usage(), (3, len('1.02.0css')))
+
+    def test_materialize_hardlinks(self):
+        for version in ['1.0', '2.0']:
+            manifest, __ = self.store.ingest(self.path('build', version))
+            self.store.materialize(manifest, self.path('docs', version))
+        css = [os.stat(self.path('docs', version, '_static', 'theme.css'))
+               for version in ['1.0', '2.0']]
+        self.assertEqual(css[0].st_ino, css[1].st_ino)
+        with open(self.path('docs', '2.0', 'index.html')) as fh:
+            self.assertEqual(fh.read(), '2.0')
+
+        usage = tree_usage([self.path('docs')], content=True)
+        self.assertEqual(usage.files, 4)
+        self.assertEqual(usage.bytes, len('1.02.0csscss'))
+        self.assertEqual(usage.disk_bytes, len('1.02.0css'))
+        self.assertEqual(usage.unique_bytes, len('1.02.0css'))
+        usage = tree_usage([self.path('build')], content=True)
+        self.assertEqual(usage.disk_bytes, len('1.02.0csscss'))
+        self.assertEqual(usage.unique_bytes, len('1.02.0css'))
+
+    def test_materialize_symlinks(self):
+        store = BlobStore(self.store.root, link='symlink')
+        manifest, __ = store.ingest(self.path('build', '1.0'))
+        store.materialize(manifest, self.path('docs', '1.0'))
+        self.assertTrue(os.path.islink(self.path('docs', '1.0', 'index.html')))
+        with open(self.path('docs', '1.0', 'index.html')) as fh:
+            self.assertEqual(fh.read(), '1.0')
+
+    def test_materialize_replaces_target(self):
+        write(self.path('docs', '1.0', 'removed.html'), 'old')
+        manifest, __ = self.store.ingest(self.path('build', '1.0'))
+        self.store.materialize(manifest, self.path('docs', '1.0'))
+        self.assertEqual(sorted(os.listdir(self.path('docs', '1.0'))),
+                         ['_static', 'index.html'])
+        self.assertEqual(os.listdir(self.path('docs')), ['1.0'])
+
+    def test_missing_blobs(self):
+        manifest, __ = self.store.ingest(self.path('build', '1.0'))
+        os.remove(self.store.blob_path(manifest['index.html']))
+        self.assertRaises(IOError, self.store.materialize, manifest,
+                          self.path('docs', '1.0'))
+        self.assertFalse(os.path.exists(self.path('docs')) and
+                         os.listdir(self.path('docs')))
+
+    def test_prune(self):
+        manifest, __ = self.store.ingest(self.path('build', '1.0'))
+        self.store.ingest(self.path('build', '2.0'))
+        self.assertEqual(
+            self.store.prune(set(manifest.values()), dryrun=True), (1, 3))
+        self.assertEqual(self.store.usage()[0], 3)
+        self.assertEqual(self.store.prune(set(manifest.values())), (1, 3))
+        self.assertEqual(self.store.usage()[0], 2)
+
+
+class PublishBlobsTests(TestCase):
+    fixtures = ['eric', 'test_data']
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.settings = override_settings(
+            DOCROOT=os.path.join(self.root, 'docroot'),
+            BLOB_STORE_ROOT=os.path.join(self.root, 'blobs'))
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        self.project = Project.objects.get(slug='pip')
+        self.versions = []
+        for slug in ['0.8', '0.8.1']:
+            version = self.project.versions.get(slug=slug)
+            path = self.project.artifact_path(
+                version=slug, type_=self.project.documentation_type)
+            write(os.path.join(path, 'index.html'), slug)
+            write(os.path.join(path, '_static', 'theme.css'), 'css')
+            self.versions.append(version)
+
+    def test_html_published_from_store(self):
+        for version in self.versions:
+            move_files(version.pk, 'builder', html=True)
+        css = [os.stat(os.path.join(self.project.rtd_build_path(slug),
+                                    '_static', 'theme.css'))
+               for slug in ['0.8', '0.8.1']]
+        self.assertEqual(css[0].st_ino, css[1].st_ino)
+        self.assertTrue(os.path.exists(
+            self.project.blob_manifest_path('0.8')))
+
+        out = StringIO()
+        call_command('blob_store_usage', 'pip', stdout=out)
+        self.assertIn('pip: 4 files, 14 bytes copied, 11 bytes on disk',
+                      out.getvalue())
+        self.assertIn('blob store: 3 blobs, 11 bytes', out.getvalue())
+
+        out = StringIO()
+        call_command('prune_blob_store', stdout=out)
+        self.assertIn('Removed 0 blobs', out.getvalue())
+
+
+class RemoteSyncerBlobTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.store = BlobStore(os.path.join(self.root, 'blobs'))
+        write(os.path.join(self.root, 'build', 'index.html'), 'index')
+        manifest, __ = self.store.ingest(os.path.join(self.root, 'build'))
+        self.digest = manifest['index.html']
+        self.manifest_path = os.path.join(self.root, 'manifest.json')
+        save_manifest(manifest, self.manifest_path)
+
+    @override_settings(MULTIPLE_APP_SERVERS=['web01', 'web02'],
+                       SYNC_USER='docs')
+    def test_blobs_then_manifest_then_materialize(self):
+        commands = []
+
+        def run_command(server, command):
+            if command[0] == 'rsync' and '--files-from' in command:
+                files_from = command[command.index('--files-from') + 1]
+                with open(files_from) as fh:
+                    command = command + [fh.read()]
+            commands.append((server, command))
+            returncode = 1 if server == 'web02' else 0
+            return SyncResult(server=server, command=command,
+                              returncode=returncode, elapsed=1, output='')
+
+        with mock.patch.object(RemoteSyncer, 'run_command',
+                               side_effect=run_command):
+            results = RemoteSyncer.copy_blobs(self.store, self.manifest_path,
+                                              '/srv/docs/pip/latest')
+        self.assertEqual([(result.server, result.returncode, result.elapsed)
+                          for result in results],
+                         [('web01', 0, 3), ('web02', 1, 1)])
+
+        web01 = [command for server, command in commands if server == 'web01']
+        self.assertIn('--ignore-existing', web01[0])
+        self.assertEqual(web01[0][-3:], [
+            self.store.root + '/',
+            'docs@web01:' + self.store.root,
+            '%s/%s\n' % (self.digest[:2], self.digest[2:]),
+        ])
+        self.assertEqual(web01[1][-1],
+                         'docs@web01:' + self.manifest_path)
+        self.assertEqual(web01[2][-2:], [
+            'docs@web01',
+            'python manage.py materialize_blobs %s /srv/docs/pip/latest'
+            % self.manifest_path,
+        ])
+        self.assertEqual(
+            len([server for server, __ in commands if server == 'web02']), 1)
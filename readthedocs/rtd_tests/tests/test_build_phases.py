@@ -0,0 +1,157 @@
+import datetime
+import os
+import shutil
+import subprocess
+import tempfile
+from StringIO import StringIO
+
+import mock
+from django.core.management import call_command
+from django.test import TestCase
+from django_dynamic_fixture import get
+
+from readthedocs.builds.models import Build, BuildPhase
+from readthedocs.core.management.commands.build_phase_percentiles import (
+    percentile)
+from readthedocs.doc_builder.profiling import BuildPhaseProfiler, path_size
+from readthedocs.projects.models import Project
+
+
+class BuildPhaseProfilerTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.build_env = mock.Mock(commands=[], record=True, build={'id': 42})
+        patcher = mock.patch('readthedocs.doc_builder.profiling.api_v2')
+        self.api = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_phase(self):
+        output_path = os.path.join(self.root, 'html')
+        profiler = BuildPhaseProfiler(self.build_env)
+        with profiler.phase('build_docs_html', output_path=output_path):
+            os.makedirs(os.path.join(output_path, '_static'))
+            with open(os.path.join(output_path, 'index.html'), 'w') as fh:
+                fh.write('x' * 100)
+            with open(os.path.join(output_path, '_static/a.css'), 'w') as fh:
+                fh.write('x' * 20)
+            subprocess.check_call(['true'])
+
+        profile, = profiler.phases
+        self.assertEqual(profile.name, 'build_docs_html')
+        self.assertGreaterEqual(profile.elapsed, 0)
+        self.assertGreaterEqual(profile.cpu_time, 0)
+        self.assertEqual(profile.output_size, 120)
+        data = self.api.phase.post.call_args[0][0]
+        self.assertEqual(data['build'], 42)
+        self.assertEqual(data['name'], 'build_docs_html')
+        self.assertEqual(data['output_size'], 120)
+
+    def test_phase_missing_output(self):
+        profiler = BuildPhaseProfiler(self.build_env)
+        with profiler.phase('setup_vcs',
+                            output_path=os.path.join(self.root, 'missing')):
+            pass
+        self.assertIsNone(profiler.phases[0].output_size)
+
+    def test_phase_failed(self):
+        profiler = BuildPhaseProfiler(self.build_env)
+        with self.assertRaises(ValueError):
+            with profiler.phase('setup_environment'):
+                raise ValueError()
+        self.assertEqual([profile.name for profile in profiler.phases],
+                         ['setup_environment'])
+
+    def test_measure_error(self):
+        profiler = BuildPhaseProfiler(self.build_env)
+        measure = mock.patch(
+            'readthedocs.doc_builder.profiling.path_size',
+            side_effect=OSError('No such file or directory'))
+        with measure:
+            with profiler.phase('setup_vcs', output_path=self.root):
+                pass
+            # The phase's own exception is raised, not the profiler's
+            with self.assertRaises(ValueError):
+                with profiler.phase('setup_environment',
+                                    output_path=self.root):
+                    raise ValueError()
+        self.assertEqual(profiler.phases, [])
+        self.assertFalse(self.api.phase.post.called)
+
+    def test_skip_idle(self):
+        profiler = BuildPhaseProfiler(self.build_env)
+        with profiler.phase('build_docs_pdf', skip_idle=True):
+            pass
+        with profiler.phase('build_docs_epub', skip_idle=True):
+            self.build_env.commands.append(mock.Mock())
+        self.assertEqual([profile.name for profile in profiler.phases],
+                         ['build_docs_epub'])
+        self.assertEqual(self.api.phase.post.call_count, 1)
+
+    def test_not_recorded(self):
+        self.build_env.record = False
+        profiler = BuildPhaseProfiler(self.build_env)
+        with profiler.phase('setup_vcs'):
+            pass
+        self.assertEqual(len(profiler.phases), 1)
+        self.assertFalse(self.api.phase.post.called)
+
+    def test_api_error(self):
+        self.api.phase.post.side_effect = Exception('Down')
+        profiler = BuildPhaseProfiler(self.build_env)
+        with profiler.phase('setup_vcs'):
+            pass
+        self.assertEqual(len(profiler.phases), 1)
+
+    def test_path_size(self):
+        path = os.path.join(self.root, 'index.html')
+        with open(path, 'w') as fh:
+            fh.write('x' * 10)
+        os.symlink(path, os.path.join(self.root, 'link.html'))
+        self.assertEqual(path_size(path), 10)
+        self.assertEqual(path_size(self.root), 10)
+
+
+class BuildPhasePercentilesTests(TestCase):
+
+    def test_percentile(self):
+        values = range(1, 101)
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 90), 90)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3], 99), 3)
+        self.assertEqual(percentile([1, 2], 0), 1)
+        self.assertIsNone(percentile([], 50))
+
+    def test_command(self):
+        project = get(Project)
+        for num in range(1, 11):
+            build = get(Build, project=project, version=None)
+            get(BuildPhase, build=build, name='build_docs_html',
+                elapsed=num, cpu_time=None, max_rss=num * 1000,
+                output_size=None)
+            get(BuildPhase, build=build, name='setup_vcs', elapsed=1,
+                cpu_time=1, max_rss=None, output_size=None)
+        old = get(Build, project=project, version=None)
+        Build.objects.filter(pk=old.pk).update(
+            date=datetime.datetime(2000, 1, 1))
+        get(BuildPhase, build=old, name='build_docs_html', elapsed=1000)
+
+        out = StringIO()
+        call_command('build_phase_percentiles', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines, [
+            'build_docs_html: 10 builds',
+            '  elapsed: p50=5, p90=9, p99=10',
+            '  max_rss: p50=5000, p90=9000, p99=10000',
+            'setup_vcs: 10 builds',
+            '  elapsed: p50=1, p90=1, p99=1',
+            '  cpu_time: p50=1, p90=1, p99=1',
+        ])
+
+        out = StringIO()
+        call_command('build_phase_percentiles', 'setup_vcs', stdout=out)
+        self.assertEqual(out.getvalue().splitlines()[0],
+                         'setup_vcs: 10 builds')
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
@@ -0,0 +1,103 @@
+import mock
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from readthedocs.cdn import purge as cdn_purge
+from readthedocs.cdn.models import PurgeRequest
+from readthedocs.cdn.purge import LocalProvider, get_provider, purge_urls
+from readthedocs.cdn.tasks import flush_purges, queue_purge
+
+
+class FlakyProvider(LocalProvider):
+
+    def __init__(self, failures):
+        super(FlakyProvider, self).__init__()
+        self.failures = failures
+
+    def purge(self, id, files):
+        if self.failures:
+            self.failures -= 1
+            raise IOError('CDN unavailable')
+        super(FlakyProvider, self).purge(id, files)
+
+
+@override_settings(CDN_PURGE_BACKOFF=1, CDN_PURGE_RETRIES=2)
+class PurgeUrlsTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('readthedocs.cdn.purge.time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(CDN_PURGE_BATCH_SIZE=2)
+    def test_batches(self):
+        provider = LocalProvider()
+        self.assertEqual(purge_urls('zone', ['/a', '/b', '/c', '/d', '/e'],
+                                    provider=provider), [])
+        self.assertEqual(provider.purges, [
+            ('zone', ['/a', '/b']),
+            ('zone', ['/c', '/d']),
+            ('zone', ['/e']),
+        ])
+
+    @override_settings(CDN_PURGE_ALL_THRESHOLD=3)
+    def test_whole_zone_above_threshold(self):
+        provider = LocalProvider()
+        purge_urls('zone', ['/a', '/b', '/c'], provider=provider)
+        purge_urls('zone', ['/a', '/b', '/c', '/d'], provider=provider)
+        self.assertEqual(provider.purges,
+                         [('zone', ['/a', '/b', '/c']), ('zone', None)])
+
+    def test_retries_with_backoff(self):
+        provider = FlakyProvider(failures=2)
+        self.assertEqual(purge_urls('zone', ['/a'], provider=provider), [])
+        self.assertEqual(provider.purges, [('zone', ['/a'])])
+        self.assertEqual([call[0][0] for call in self.sleep.call_args_list],
+                         [1, 2])
+
+    @override_settings(CDN_PURGE_BATCH_SIZE=1)
+    def test_failed_batches_returned(self):
+        provider = FlakyProvider(failures=3)
+        self.assertEqual(purge_urls('zone', ['/a', '/b'], provider=provider),
+                         ['/a'])
+        self.assertEqual(provider.purges, [('zone', ['/b'])])
+
+    def test_not_configured(self):
+        self.assertIsNone(get_provider())
+        self.assertEqual(purge_urls('zone', ['/a']), [])
+
+
+@override_settings(CDN_SERVICE='local', CDN_PURGE_BACKOFF=0)
+class PurgeQueueTests(TestCase):
+
+    def setUp(self):
+        cdn_purge._providers.clear()
+        self.provider = get_provider()
+
+    def test_builds_deduplicated(self):
+        with mock.patch.object(flush_purges, 'apply_async') as apply_async:
+            queue_purge('zone', ['/en/latest/', '/en/latest/api.html'])
+            queue_purge('zone', ['/en/latest/', '/en/latest/install.html'])
+            queue_purge('other', ['/en/latest/'])
+        self.assertEqual(apply_async.call_count, 3)
+        self.assertEqual(PurgeRequest.objects.filter(cdn_id='zone').count(), 3)
+
+        self.assertEqual(flush_purges('zone'), 3)
+        self.assertEqual(self.provider.purges, [('zone', [
+            '/en/latest/', '/en/latest/api.html', '/en/latest/install.html'])])
+        # A flush already scheduled by a later build has nothing left
+        self.assertEqual(flush_purges('zone'), 0)
+        self.assertEqual(len(self.provider.purges), 1)
+        self.assertEqual(PurgeRequest.objects.filter(cdn_id='other').count(), 1)
+
+    def test_failures_queued_again(self):
+        with mock.patch.object(self.provider, 'purge',
+                               side_effect=IOError('CDN unavailable')):
+            queue_purge('zone', ['/en/latest/'])
+        self.assertEqual(
+            list(PurgeRequest.objects.values_list('url', flat=True)),
+            ['/en/latest/'])
+        queue_purge('zone', ['/en/latest/api.html'])
+        self.assertEqual(self.provider.purges, [
+            ('zone', ['/en/latest/', '/en/latest/api.html'])])
+        self.assertFalse(PurgeRequest.objects.exists())
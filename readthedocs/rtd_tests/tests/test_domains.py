@@ -7,7 +7,8 @@ from django.test.utils import override_settings
 
 from django_dynamic_fixture import get
 
-from readthedocs.core.middleware import SubdomainMiddleware
+from readthedocs.core.middleware import (SubdomainMiddleware, domain_cache,
+                                         domain_hits)
 from readthedocs.projects.models import Project, Domain
 
 
@@ -18,6 +19,8 @@ class MiddlewareTests(TestCase):
         self.middleware = SubdomainMiddleware()
         self.url = '/'
         self.old_cache_get = cache.get
+        domain_cache.clear()
+        domain_hits.flush()
 
     def tearDown(self):
         cache.get = self.old_cache_get
@@ -51,10 +54,12 @@ class MiddlewareTests(TestCase):
         self.middleware.process_request(request)
         self.assertEqual(Domain.objects.count(), 1)
         self.assertEqual(Domain.objects.first().domain, 'my.valid.hostname')
+        domain_hits.flush()
         self.assertEqual(Domain.objects.first().count, 1)
 
         self.middleware.process_request(request)
         self.assertEqual(Domain.objects.count(), 1)
+        domain_hits.flush()
         self.assertEqual(Domain.objects.first().count, 2)
 
 
@@ -1,9 +1,17 @@
 import json
 import mock
 
+from django.core.cache import cache
 from django.test import TestCase
+from django.test.utils import override_settings
 
+from django_dynamic_fixture import get
+
+from readthedocs.builds.constants import BUILD_STATE_FINISHED
+from readthedocs.builds.models import Build
 from readthedocs.rtd_tests.mocks.paths import fake_paths_by_regex
+from readthedocs.donate.models import SupporterPromo
+from readthedocs.donate.utils import promo_rotation
 from readthedocs.projects.models import Project
 
 
@@ -11,6 +19,7 @@ class Testmaker(TestCase):
     fixtures = ["eric", "test_data"]
 
     def setUp(self):
+        promo_rotation.invalidate()
         self.client.login(username='eric', password='test')
         self.pip = Project.objects.get(slug='pip')
         self.latest = self.pip.versions.create_latest()
@@ -71,3 +80,79 @@ class Testmaker(TestCase):
             response = self.client.get(
                 '/api/v2/footer_html/?project=pip&version=latest&page=index', {})
         self.assertNotContains(response, 'epub')
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestFooterCache(TestCase):
+    fixtures = ["eric", "test_data"]
+    url = '/api/v2/footer_html/?project=pip&version=latest&page=index'
+
+    def setUp(self):
+        cache.clear()
+        promo_rotation.invalidate()
+        self.pip = Project.objects.get(slug='pip')
+        self.latest = self.pip.versions.create_latest()
+
+    def test_anonymous_footer_cached(self):
+        first = self.client.get(self.url)
+        self.assertIsNotNone(first.context)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertIsNone(second.context)
+        self.assertEqual(json.loads(first.content), json.loads(second.content))
+
+    def test_promo(self):
+        promo = SupporterPromo.objects.create(
+            name='Promo', analytics_id='promo-1', live=True, display_type='doc')
+        with self.settings(USE_PROMOS=True):
+            resp = json.loads(self.client.get(self.url).content)
+        self.assertTrue(resp['promo'])
+        self.assertEqual(resp['promo_data'], promo.as_dict())
+
+    def test_etag(self):
+        resp = self.client.get(self.url)
+        etag = resp['ETag']
+        # The promo isn't covered, so the ETag is weak
+        self.assertTrue(etag.startswith('W/"'))
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp['ETag'], etag)
+        resp = self.client.get(self.url,
+                               HTTP_IF_NONE_MATCH='"other", %s' % etag[2:])
+        self.assertEqual(resp.status_code, 304)
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(resp.status_code, 200)
+
+    def test_version_save_invalidates(self):
+        resp = self.client.get(self.url)
+        self.assertTrue(json.loads(resp.content)['version_active'])
+        etag = resp['ETag']
+        self.latest.active = False
+        self.latest.save()
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(json.loads(resp.content)['version_active'])
+
+    def test_build_finish_invalidates(self):
+        self.client.get(self.url)
+        self.assertIsNone(self.client.get(self.url).context)
+        Build.objects.create(project=self.pip, version=self.latest,
+                             state=BUILD_STATE_FINISHED)
+        self.assertIsNotNone(self.client.get(self.url).context)
+
+    def test_translation_save_invalidates_main_project(self):
+        translation = get(Project, main_language_project=None, users=[])
+        self.client.get(self.url)
+        translation.main_language_project = self.pip
+        with mock.patch('readthedocs.projects.models.symlink'):
+            with mock.patch('readthedocs.projects.models.update_static_metadata'):
+                translation.save()
+        resp = self.client.get(self.url)
+        self.assertIn(translation, resp.context['translations'])
+
+    def test_private_version_not_found(self):
+        self.latest.privacy_level = 'private'
+        self.latest.save()
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 404)
@@ -1,6 +1,12 @@
 import os
+import shutil
+import tempfile
+
+import mock
 from django.test import TestCase
+from django.test.utils import override_settings
 
+from readthedocs.projects.checksums import md5_file
 from readthedocs.projects.tasks import _manage_imported_files
 from readthedocs.projects.models import Project, ImportedFile
 
@@ -47,3 +53,95 @@ class ImportedFileTests(TestCase):
         self.assertNotEqual(ImportedFile.objects.get(name='test.html').md5, 'c7532f22a052d716f7b2310fb52ad981')
 
         self.assertEqual(ImportedFile.objects.count(), 2)
+
+    def test_sync_counts(self):
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        for name in ['one.html', 'two.html', 'three.html']:
+            with open(os.path.join(test_dir, name), 'w') as f:
+                f.write(name)
+
+        counts = _manage_imported_files(self.version, test_dir, 'commit01')
+        self.assertEqual(counts, {'added': 3, 'changed': 0, 'removed': 0,
+                                  'hashed': 3})
+
+        with open(os.path.join(test_dir, 'one.html'), 'w') as f:
+            f.write('changed')
+        os.remove(os.path.join(test_dir, 'three.html'))
+        with open(os.path.join(test_dir, 'four.html'), 'w') as f:
+            f.write('four.html')
+        counts = _manage_imported_files(self.version, test_dir, 'commit02')
+        self.assertEqual(counts, {'added': 1, 'changed': 1, 'removed': 1,
+                                  'hashed': 3})
+        self.assertEqual(
+            set(ImportedFile.objects.values_list('path', flat=True)),
+            set(['one.html', 'two.html', 'four.html']))
+        self.assertEqual(
+            set(ImportedFile.objects.values_list('commit', flat=True)),
+            set(['commit02']))
+
+    def test_sync_query_count(self):
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        for num in range(20):
+            with open(os.path.join(test_dir, '%s.html' % num), 'w') as f:
+                f.write(str(num))
+        _manage_imported_files(self.version, test_dir, 'commit01')
+        # Select existing rows and a single commit update, wrapped in a
+        # savepoint
+        with self.assertNumQueries(4):
+            _manage_imported_files(self.version, test_dir, 'commit02')
+
+    def test_checksum_cache(self):
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        build_dir = os.path.join(test_dir, 'html')
+        cache_path = os.path.join(test_dir, 'checksums.json')
+        os.mkdir(build_dir)
+        for name in ['one.html', 'two.html']:
+            with open(os.path.join(build_dir, name), 'w') as f:
+                f.write(name)
+
+        counts = _manage_imported_files(self.version, build_dir, 'commit01',
+                                        cache_path=cache_path)
+        self.assertEqual(counts['hashed'], 2)
+        self.assertTrue(os.path.exists(cache_path))
+
+        counts = _manage_imported_files(self.version, build_dir, 'commit02',
+                                        cache_path=cache_path)
+        self.assertEqual(counts['hashed'], 0)
+        self.assertEqual(counts['changed'], 0)
+
+        with open(os.path.join(build_dir, 'one.html'), 'w') as f:
+            f.write('something longer')
+        counts = _manage_imported_files(self.version, build_dir, 'commit03',
+                                        cache_path=cache_path)
+        self.assertEqual(counts['hashed'], 1)
+        self.assertEqual(counts['changed'], 1)
+        self.assertEqual(ImportedFile.objects.get(name='one.html').md5,
+                         md5_file(os.path.join(build_dir, 'one.html')))
+
+    @override_settings(CDN_IDS={'pip': 'zone'})
+    def test_changed_files_queued_for_purge(self):
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        for name in ['one.html', 'two.html']:
+            with open(os.path.join(test_dir, name), 'w') as f:
+                f.write(name)
+        with mock.patch('readthedocs.projects.tasks.queue_purge') as queue:
+            _manage_imported_files(self.version, test_dir, 'commit01')
+            self.assertEqual(queue.call_args[0][0], 'zone')
+            self.assertEqual(sorted(queue.call_args[0][1]), [
+                '/docs/pip/en/%s/one.html' % self.version.slug,
+                '/docs/pip/en/%s/two.html' % self.version.slug,
+            ])
+
+            with open(os.path.join(test_dir, 'one.html'), 'w') as f:
+                f.write('changed')
+            _manage_imported_files(self.version, test_dir, 'commit02')
+            self.assertEqual(queue.call_args[0][1],
+                             ['/docs/pip/en/%s/one.html' % self.version.slug])
+
+            queue.reset_mock()
+            _manage_imported_files(self.version, test_dir, 'commit03')
+            self.assertFalse(queue.called)
@@ -4,9 +4,12 @@ from django.test import TestCase
 from django.test.client import RequestFactory
 from django.test.utils import override_settings
 
+import mock
 from django_dynamic_fixture import get, new
 
-from readthedocs.core.middleware import SubdomainMiddleware
+from readthedocs.core.middleware import (SubdomainMiddleware, domain_cache,
+                                         domain_hits, get_cached_project,
+                                         project_cache)
 from readthedocs.projects.models import Project, Domain
 
 # Once this util gets merged remove them here
@@ -29,6 +32,13 @@ class MiddlewareTests(TestCase):
         self.url = '/'
         self.owner = create_user(username='owner', password='test')
         self.pip = get(Project, slug='pip', users=[self.owner], privacy_level='public')
+        domain_cache.clear()
+        self.old_cache_get = cache.get
+        project_cache.clear()
+        domain_hits.flush()
+
+    def tearDown(self):
+        cache.get = self.old_cache_get
 
     def test_failey_cname(self):
         request = self.factory.get(self.url, HTTP_HOST='my.host.com')
@@ -105,3 +115,64 @@ class MiddlewareTests(TestCase):
         request = self.factory.get(self.url, HTTP_HOST='doesnt.really.matter')
         ret_val = self.middleware.process_request(request)
         self.assertEqual(ret_val, None)
+
+    def test_domain_object_cached(self):
+        self.domain = get(Domain, domain='docs.foobar.com', project=self.pip)
+        request = self.factory.get(self.url, HTTP_HOST='docs.foobar.com')
+        self.middleware.process_request(request)
+        request = self.factory.get(self.url, HTTP_HOST='docs.foobar.com')
+        with self.assertNumQueries(0):
+            self.middleware.process_request(request)
+        self.assertEqual(request.domain_object, True)
+        self.assertEqual(request.slug, 'pip')
+
+    def test_domain_object_cache_invalidation(self):
+        self.domain = get(Domain, domain='docs.foobar.com', project=self.pip)
+        request = self.factory.get(self.url, HTTP_HOST='docs.foobar.com')
+        self.middleware.process_request(request)
+        self.domain.delete()
+        request = self.factory.get(self.url, HTTP_HOST='docs.foobar.com')
+        with self.assertRaises(Http404):
+            self.middleware.process_request(request)
+
+    def test_domain_object_missing_cache_invalidation(self):
+        request = self.factory.get(self.url, HTTP_HOST='docs.foobar.com')
+        with self.assertRaises(Http404):
+            self.middleware.process_request(request)
+        self.domain = get(Domain, domain='docs.foobar.com', project=self.pip)
+        request = self.factory.get(self.url, HTTP_HOST='docs.foobar.com')
+        self.middleware.process_request(request)
+        self.assertEqual(request.slug, 'pip')
+
+    def test_domain_object_project_invalidation(self):
+        self.domain = get(Domain, domain='docs.foobar.com', project=self.pip)
+        request = self.factory.get(self.url, HTTP_HOST='docs.foobar.com')
+        self.middleware.process_request(request)
+        self.pip.slug = 'pip-renamed'
+        with mock.patch('readthedocs.projects.models.symlink'):
+            with mock.patch('readthedocs.projects.models.update_static_metadata'):
+                self.pip.save()
+        request = self.factory.get(self.url, HTTP_HOST='docs.foobar.com')
+        self.middleware.process_request(request)
+        self.assertEqual(request.slug, 'pip-renamed')
+
+    def test_cached_project_not_shared(self):
+        project = get_cached_project('pip')
+        project.description = 'Changed'
+        with self.assertNumQueries(0):
+            other = get_cached_project('pip')
+        self.assertIsNot(other, project)
+        self.assertEqual(other.pk, self.pip.pk)
+        self.assertEqual(other.description, self.pip.description)
+        self.assertIsNone(get_cached_project('missing'))
+
+    def test_domain_count_buffered(self):
+        self.domain = get(Domain, domain='docs.foobar.com', project=self.pip,
+                          count=0)
+        for __ in range(3):
+            request = self.factory.get(self.url, HTTP_HOST='docs.foobar.com')
+            self.middleware.process_request(request)
+        self.assertEqual(Domain.objects.get(pk=self.domain.pk).count, 0)
+        with self.assertNumQueries(1):
+            domain_hits.flush()
+        self.assertEqual(Domain.objects.get(pk=self.domain.pk).count, 3)
@@ -4,7 +4,8 @@ from django.contrib.admindocs.views import extract_views_from_urlpatterns
 from django.test import TestCase
 from django.core.urlresolvers import reverse
 
-from readthedocs.builds.models import Build, VersionAlias, BuildCommandResult
+from readthedocs.builds.models import (Build, VersionAlias, BuildCommandResult,
+                                      BuildPhase)
 from readthedocs.comments.models import DocumentComment, NodeSnapshot
 from readthedocs.projects.models import Project, Domain
 from readthedocs.rtd_tests.utils import create_user
@@ -260,6 +261,7 @@ class APIMixin(URLAccessMixin):
         super(APIMixin, self).setUp()
         self.build = get(Build, project=self.pip)
         self.build_command_result = get(BuildCommandResult, project=self.pip)
+        self.build_phase = get(BuildPhase, build=self.build)
         self.domain = get(Domain, url='http://docs.foobar.com', project=self.pip)
         self.comment = get(DocumentComment, node__project=self.pip)
         self.snapshot = get(NodeSnapshot, node=self.comment.node)
@@ -273,10 +275,12 @@ class APIMixin(URLAccessMixin):
         self.request_data = {
             'build-detail': {'pk': self.build.pk},
             'buildcommandresult-detail': {'pk': self.build_command_result.pk},
+            'buildphase-detail': {'pk': self.build_phase.pk},
             'version-detail': {'pk': self.pip.versions.all()[0].pk},
             'domain-detail': {'pk': self.domain.pk},
             'comments-detail': {'pk': self.comment.pk},
             'footer_html': {'data': {'project': 'pip', 'version': 'latest', 'page': 'index'}},
+            'version_compare': {'data': {'project': 'pip', 'version': 'latest'}},
         }
         self.response_data = {
             'project-sync-versions': {'status_code': 403},
@@ -302,6 +306,12 @@ class APIUnauthAccessTest(APIMixin, TestCase):
         from readthedocs.restapi.urls import urlpatterns
         self._test_url(urlpatterns)
 
+    def test_private_version_compare(self):
+        resp = self.client.get('/api/v2/version_compare/',
+                               {'project': self.private.slug,
+                                'version': 'latest'})
+        self.assertEqual(resp.status_code, 404)
+
     def login(self):
         pass
 
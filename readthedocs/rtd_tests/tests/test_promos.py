@@ -0,0 +1,59 @@
+import random
+
+from django.test import TestCase
+from django_dynamic_fixture import get
+
+from readthedocs.donate.models import SupporterPromo
+from readthedocs.donate.utils import WeightedChoice, promo_rotation, get_promo
+
+
+class TestWeightedChoice(TestCase):
+
+    def test_weights(self):
+        random.seed(0)
+        chooser = WeightedChoice(['a', 'b', 'c'], [3, 1, 0])
+        picks = [chooser.choice() for __ in range(4000)]
+        self.assertNotIn('c', picks)
+        self.assertAlmostEqual(picks.count('a') / 4000.0, 0.75, delta=0.03)
+
+    def test_empty(self):
+        self.assertIsNone(WeightedChoice([], []).choice())
+        self.assertIsNone(WeightedChoice(['a'], [0]).choice())
+
+
+class TestPromoRotation(TestCase):
+
+    def setUp(self):
+        promo_rotation.invalidate()
+        self.doc = get(SupporterPromo, live=True, display_type='doc', weight=1)
+        self.search = get(SupporterPromo, live=True, display_type='search',
+                          weight=1)
+        get(SupporterPromo, live=False, display_type='site-footer', weight=1)
+
+    def test_promos_by_display_type(self):
+        self.assertEqual(get_promo('doc'), self.doc)
+        self.assertEqual(get_promo('search'), self.search)
+        self.assertIsNone(get_promo('site-footer'))
+
+    def test_promos_kept_in_memory(self):
+        get_promo('doc')
+        with self.assertNumQueries(0):
+            get_promo('doc')
+            get_promo('search')
+
+    def test_save_refreshes_promos(self):
+        self.assertEqual(get_promo('site-footer'), None)
+        footer = get(SupporterPromo, live=True, display_type='site-footer',
+                     weight=1)
+        self.assertEqual(get_promo('site-footer'), footer)
+        footer.live = False
+        footer.save()
+        self.assertIsNone(get_promo('site-footer'))
+
+    def test_ttl(self):
+        get_promo('doc')
+        # Saving through the queryset sends no signal
+        SupporterPromo.objects.filter(pk=self.doc.pk).update(weight=0)
+        self.assertEqual(get_promo('doc'), self.doc)
+        promo_rotation._loaded = 0
+        self.assertIsNone(get_promo('doc'))
@@ -0,0 +1,171 @@
+import os
+import shutil
+import tempfile
+import threading
+
+import mock
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from readthedocs.builds.models import Build
+from readthedocs.privacy.backends.syncers import LocalSyncer
+from readthedocs.projects.checksums import ChecksumCache, tree_digests
+from readthedocs.projects.models import Project
+from readthedocs.projects.tasks import (UpdateDocsTask, finish_build,
+                                        move_files)
+
+
+class TreeDigestTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def write(self, path, content):
+        path = os.path.join(self.root, path)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as fh:
+            fh.write(content)
+
+    def test_digests(self):
+        self.write('a/index.html', 'index')
+        self.write('a/_static/style.css', 'css')
+        self.write('b/index.html', 'index')
+        self.write('b/_static/style.css', 'css')
+        self.write('c/index.html', 'index')
+        self.write('c/style.css', 'css')
+        paths = dict((name, os.path.join(self.root, name))
+                     for name in ['a', 'b', 'c', 'missing'])
+        digests = tree_digests(paths, ChecksumCache())
+        self.assertEqual(sorted(digests), ['a', 'b', 'c'])
+        self.assertEqual(digests['a'], digests['b'])
+        # Moving a file changes the digest
+        self.assertNotEqual(digests['a'], digests['c'])
+
+        self.write('b/_static/style.css', 'changed')
+        os.utime(os.path.join(self.root, 'b/_static/style.css'), (1, 1))
+        self.assertNotEqual(tree_digests(paths, ChecksumCache())['b'],
+                            digests['b'])
+
+
+class PublishTests(TestCase):
+    fixtures = ['eric', 'test_data']
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.settings = override_settings(
+            DOCROOT=os.path.join(self.root, 'docroot'),
+            MEDIA_ROOT=os.path.join(self.root, 'media'))
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+        self.project = Project.objects.get(slug='pip')
+        self.project.documentation_type = 'sphinx'
+        self.project.save()
+        self.version = self.project.versions.get(slug='latest')
+        for type_ in ['sphinx', 'sphinx_pdf']:
+            path = self.project.artifact_path(version='latest', type_=type_)
+            os.makedirs(path)
+            with open(os.path.join(path, 'index'), 'w') as fh:
+                fh.write(type_)
+
+    def test_unchanged_artifacts_skipped(self):
+        manifests = {'html': 'aaa', 'pdf': 'bbb'}
+        result = move_files(self.version.pk, 'builder', html=True, pdf=True,
+                            manifests=manifests)
+        self.assertEqual(sorted(result['copied']), ['html', 'pdf'])
+        self.assertTrue(os.path.exists(os.path.join(
+            self.project.rtd_build_path('latest'), 'index')))
+
+        result = move_files(self.version.pk, 'builder', html=True, pdf=True,
+                            manifests=manifests)
+        self.assertEqual(result, {'copied': [], 'skipped': ['html', 'pdf']})
+
+        result = move_files(self.version.pk, 'builder', html=True, pdf=True,
+                            manifests={'html': 'aaa', 'pdf': 'ccc'})
+        self.assertEqual(result, {'copied': ['pdf'], 'skipped': ['html']})
+
+        # Removed from the web servers, or not built at all, is copied again
+        shutil.rmtree(self.project.rtd_build_path('latest'))
+        result = move_files(self.version.pk, 'builder', html=True,
+                            manifests=manifests)
+        self.assertEqual(result, {'copied': ['html'], 'skipped': []})
+        result = move_files(self.version.pk, 'builder', html=True, pdf=True,
+                            manifests=manifests)
+        self.assertEqual(result, {'copied': ['pdf'], 'skipped': ['html']})
+
+    def test_without_manifests_always_copied(self):
+        move_files(self.version.pk, 'builder', html=True)
+        result = move_files(self.version.pk, 'builder', html=True)
+        self.assertEqual(result, {'copied': ['html'], 'skipped': []})
+
+    def test_without_manifests_keeps_other_digests(self):
+        move_files(self.version.pk, 'builder', html=True, pdf=True,
+                   manifests={'html': 'aaa', 'pdf': 'bbb'})
+        move_files(self.version.pk, 'builder', html=True)
+        result = move_files(self.version.pk, 'builder', html=True, pdf=True,
+                            manifests={'html': 'aaa', 'pdf': 'bbb'})
+        self.assertEqual(result, {'copied': ['html'], 'skipped': ['pdf']})
+
+    def test_build_sequence(self):
+        """Publish twice like a build does, early HTML and then finish_build"""
+        task = UpdateDocsTask(project=self.project, version=self.version)
+        local_copy = LocalSyncer.copy
+        with mock.patch('readthedocs.projects.tasks.Syncer.copy',
+                        side_effect=local_copy) as copy, \
+                mock.patch('readthedocs.projects.tasks.symlink'), \
+                mock.patch('readthedocs.projects.tasks.update_static_metadata'), \
+                mock.patch('readthedocs.projects.tasks.fileify'), \
+                mock.patch('readthedocs.projects.tasks.update_search'):
+            copies = []
+            for __ in range(2):
+                copy.reset_mock()
+                build = Build.objects.create(project=self.project,
+                                             version=self.version)
+                move_files(self.version.pk, 'builder', html=True,
+                           manifests=task.get_artifact_manifests(
+                               {'html': True}))
+                outcomes = {'html': True, 'pdf': True}
+                finish_build(self.version.pk, build.pk, hostname='builder',
+                             manifests=task.get_artifact_manifests(outcomes),
+                             **outcomes)
+                copies.append(copy.call_count)
+        self.assertEqual(copies, [2, 0])
+
+    @override_settings(PUBLISH_WORKERS=2)
+    def test_copied_concurrently(self):
+        local_copy = LocalSyncer.copy
+        threads = set()
+        barrier = threading.Event()
+
+        def copy(path, target, **kwargs):
+            threads.add(threading.current_thread().name)
+            if len(threads) == 2:
+                barrier.set()
+            # Both copies have to be running for either to finish
+            self.assertTrue(barrier.wait(5))
+            local_copy(path, target)
+
+        with mock.patch('readthedocs.projects.tasks.Syncer.copy',
+                        side_effect=copy):
+            result = move_files(self.version.pk, 'builder', html=True,
+                                pdf=True)
+        self.assertEqual(result['copied'], ['html', 'pdf'])
+        self.assertEqual(len(threads), 2)
+
+    def test_phases_recorded(self):
+        build = Build.objects.create(project=self.project,
+                                     version=self.version)
+        with mock.patch('readthedocs.projects.tasks.symlink'), \
+                mock.patch('readthedocs.projects.tasks.update_static_metadata'), \
+                mock.patch('readthedocs.projects.tasks.fileify'), \
+                mock.patch('readthedocs.projects.tasks.update_search'):
+            finish_build(self.version.pk, build.pk, hostname='builder',
+                         html=True)
+        self.assertEqual(
+            [phase.name for phase in build.phases.all()],
+            ['copy', 'symlink', 'metadata'])
+        self.assertTrue(all(phase.elapsed >= 0
+                            for phase in build.phases.all()))
@@ -9,7 +9,8 @@ from mock import patch
 
 from readthedocs.builds.constants import LATEST
 from readthedocs.projects.models import Project
-from readthedocs.redirects.models import Redirect
+from readthedocs.redirects.models import (
+    Redirect, get_redirect_matcher, redirect_matcher_cache)
 
 import logging
 
@@ -347,3 +348,59 @@ class GetFullPathTests(TestCase):
                 }
             )
         )
+
+
+class RedirectMatcherTests(TestCase):
+    fixtures = ["eric", "test_data"]
+
+    def setUp(self):
+        redirect_matcher_cache.clear()
+        self.proj = Project.objects.get(slug="read-the-docs")
+
+    def redirect(self, redirect_type, from_url='', to_url=''):
+        return Redirect.objects.create(
+            project=self.proj, redirect_type=redirect_type,
+            from_url=from_url, to_url=to_url)
+
+    def test_matches_like_trying_each_redirect(self):
+        self.redirect('prefix', '/old/')
+        self.redirect('exact', '/api/$rest', '/reference/')
+        self.redirect('page', '/install.html', '/tutorial/install.html')
+        self.redirect('sphinx_html')
+        paths = ['/old/faq.html', '/api/models.html', '/install.html',
+                 '/faq/', '/faq.html', '/', '']
+        matcher = get_redirect_matcher(self.proj)
+        for path in paths:
+            for version_slug in [None, 'latest', 'missing']:
+                self.assertEqual(
+                    matcher.get_redirect_path(
+                        path, language='en', version_slug=version_slug),
+                    self.proj.redirects.get_redirect_path(
+                        path, language='en', version_slug=version_slug))
+
+    def test_latest_redirect_wins(self):
+        self.redirect('prefix', '/')
+        self.redirect('exact', '/install.html', '/setup.html')
+        self.assertEqual(
+            get_redirect_matcher(self.proj).get_redirect_path('/install.html'),
+            '/setup.html')
+
+    def test_no_queries_once_built(self):
+        for num in range(50):
+            self.redirect('page', '/page%s.html' % num, '/new%s.html' % num)
+            self.redirect('prefix', '/dir%s/' % num)
+        get_redirect_matcher(self.proj)
+        with self.assertNumQueries(0):
+            matcher = get_redirect_matcher(self.proj)
+            self.assertEqual(
+                matcher.get_redirect_path('/dir7/faq.html', version_slug='latest'),
+                '/docs/read-the-docs/en/latest/faq.html')
+            self.assertIsNone(matcher.get_redirect_path('/nothing.html'))
+
+    def test_saving_redirect_invalidates(self):
+        self.assertIsNone(
+            get_redirect_matcher(self.proj).get_redirect_path('/old.html'))
+        self.redirect('exact', '/old.html', '/new.html')
+        self.assertEqual(
+            get_redirect_matcher(self.proj).get_redirect_path('/old.html'),
+            '/new.html')
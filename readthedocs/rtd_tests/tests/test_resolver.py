@@ -5,7 +5,9 @@ from django.test.utils import override_settings
 
 from readthedocs.projects.models import Project, Domain
 from readthedocs.rtd_tests.utils import create_user
-from readthedocs.core.resolver import resolve_path, resolve, resolve_domain
+from readthedocs.core.resolver import (
+    get_resolver_context, resolve_path, resolve, resolve_domain,
+    resolver_context_cache)
 
 from django_dynamic_fixture import get
 
@@ -13,6 +15,7 @@ from django_dynamic_fixture import get
 class ResolverBase(TestCase):
 
     def setUp(self):
+        resolver_context_cache.clear()
         with mock.patch('readthedocs.projects.models.symlink'):
             with mock.patch('readthedocs.projects.models.update_static_metadata'):
                 self.owner = create_user(username='owner', password='test')
@@ -294,3 +297,36 @@ class ResolverTests(ResolverBase):
         with override_settings(USE_SUBDOMAIN=True):
             url = resolve(project=self.subproject)
             self.assertEqual(url, 'http://pip.readthedocs.org/projects/sub_alias/ja/latest/')
+
+
+class ResolverContextTests(ResolverBase):
+
+    @override_settings(USE_SUBDOMAIN=False)
+    def test_paths_resolved_without_queries(self):
+        context = get_resolver_context(self.subproject)
+        with self.assertNumQueries(0):
+            urls = [resolve_path(self.subproject, filename, context=context)
+                    for filename in ['one.html', 'two.html']]
+        self.assertEqual(urls, ['/docs/pip/projects/sub/ja/latest/one.html',
+                                '/docs/pip/projects/sub/ja/latest/two.html'])
+        with self.assertNumQueries(0):
+            resolve_path(self.subproject, 'three.html')
+
+    @override_settings(PRODUCTION_DOMAIN='readthedocs.org')
+    def test_parent_domain_invalidates(self):
+        self.assertEqual(resolve_domain(self.subproject), 'readthedocs.org')
+        domain = get(Domain, domain='docs.foobar.com', project=self.pip,
+                     canonical=True)
+        self.assertEqual(resolve_domain(self.subproject), 'docs.foobar.com')
+        domain.delete()
+        self.assertEqual(resolve_domain(self.subproject), 'readthedocs.org')
+
+    @override_settings(USE_SUBDOMAIN=False)
+    def test_parent_slug_invalidates(self):
+        resolve_path(self.translation, 'index.html')
+        self.pip.slug = 'pip-renamed'
+        with mock.patch('readthedocs.projects.models.symlink'):
+            with mock.patch('readthedocs.projects.models.update_static_metadata'):
+                self.pip.save()
+        self.assertEqual(resolve_path(self.translation, 'index.html'),
+                         '/docs/pip-renamed/ja/latest/')
@@ -0,0 +1,233 @@
+import hashlib
+
+import mock
+from django.test import TestCase
+from django_dynamic_fixture import get
+from elasticsearch import exceptions
+
+from readthedocs.projects.models import Project
+from readthedocs.restapi.utils import _index_hash, index_search_request
+from readthedocs.search.indexes import PageIndex
+
+
+def bulk_response(*statuses):
+    return {'items': [{'index': {'status': status}} for status in statuses]}
+
+
+class TestStreamingBulkIndex(TestCase):
+
+    def setUp(self):
+        self.index = PageIndex()
+        self.index.es = mock.Mock()
+        sleep = mock.patch('readthedocs.search.indexes.time.sleep')
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def actions(self, count, consumed=None):
+        for num in range(count):
+            if consumed is not None:
+                consumed.append(num)
+            yield self.index.get_action({'id': str(num), 'content': 'foo'})
+
+    def test_chunks_are_sent_lazily(self):
+        consumed = []
+        sent = []
+
+        def bulk(body):
+            # Only the current chunk has been read from the generator
+            sent.append(len(consumed))
+            return bulk_response(*[200] * (len(body) / 2))
+
+        self.index.es.bulk.side_effect = bulk
+        stats = self.index.streaming_bulk_index(
+            self.actions(5, consumed), chunk_size=2)
+        self.assertEqual(sent, [2, 4, 5])
+        self.assertEqual(stats, {'indexed': 5, 'failed': 0, 'chunks': 3})
+
+    def test_chunk_retried_on_transport_error(self):
+        self.index.es.bulk.side_effect = [
+            exceptions.ConnectionError('N/A', 'timeout', None),
+            bulk_response(200, 200),
+        ]
+        stats = self.index.streaming_bulk_index(self.actions(2), chunk_size=2)
+        self.assertEqual(self.index.es.bulk.call_count, 2)
+        self.assertEqual(stats['indexed'], 2)
+
+    def test_rejected_documents_retried(self):
+        self.index.es.bulk.side_effect = [
+            bulk_response(200, 429),
+            bulk_response(200),
+        ]
+        stats = self.index.streaming_bulk_index(self.actions(2), chunk_size=2)
+        retried = self.index.es.bulk.call_args_list[1][0][0]
+        self.assertEqual(retried[0]['index']['_id'], '1')
+        self.assertEqual(stats, {'indexed': 2, 'failed': 0, 'chunks': 1})
+
+    def test_failed_after_retries(self):
+        self.index.es.bulk.side_effect = exceptions.ConnectionError(
+            'N/A', 'timeout', None)
+        stats = self.index.streaming_bulk_index(
+            self.actions(3), chunk_size=2, max_retries=2)
+        self.assertEqual(self.index.es.bulk.call_count, 6)
+        self.assertEqual(stats, {'indexed': 0, 'failed': 3, 'chunks': 2})
+
+
+class TestIncrementalIndexing(TestCase):
+
+    def setUp(self):
+        self.project = get(Project, slug='pip', users=[])
+        self.version = self.project.versions.get(slug='latest')
+        es = mock.patch('readthedocs.search.indexes.Elasticsearch')
+        self.es = es.start().return_value
+        self.addCleanup(es.stop)
+        self.es.bulk.side_effect = (
+            lambda body: bulk_response(*[200] * len(body)))
+        scan = mock.patch('readthedocs.search.indexes.scan')
+        self.scan = scan.start()
+        self.addCleanup(scan.stop)
+
+    def page_id(self, path):
+        return hashlib.md5('pip-latest-%s' % path).hexdigest()
+
+    def page(self, path, sha):
+        return {'path': path, 'title': path, 'headers': [], 'content': '',
+                'sections': [], 'sha': sha}
+
+    def stored_sha(self, sha, project_scale=0, page_scale=0, section=True):
+        return _index_hash({'sha': sha}, project_scale, page_scale, section)
+
+    def test_unchanged_pages_skipped(self):
+        self.scan.side_effect = [
+            [{'_id': self.page_id('same'), 'fields': {'sha': [self.stored_sha('1', section=False)], 'path': ['same']}},
+             {'_id': self.page_id('changed'), 'fields': {'sha': [self.stored_sha('1', section=False)], 'path': ['changed']}},
+             {'_id': self.page_id('removed'), 'fields': {'sha': [self.stored_sha('1', section=False)], 'path': ['removed']}}],
+            [{'_id': 'section-id', 'fields': {'path': ['removed']}}],
+        ]
+        index_search_request(
+            version=self.version,
+            page_list=iter([self.page('same', '1'), self.page('changed', '2'),
+                            self.page('new', '1')]),
+            commit='commit02', project_scale=0, page_scale=0,
+            section=False, delete=True, incremental=True)
+
+        actions = [call[0][0] for call in self.es.bulk.call_args_list]
+        self.assertEqual(
+            [line['index']['_id'] for line in actions[0] if 'index' in line],
+            [self.page_id('changed'), self.page_id('new')])
+        self.assertEqual(actions[1], [
+            {'delete': {'_index': 'readthedocs', '_type': 'page',
+                        '_id': self.page_id('removed'), '_routing': 'pip'}}])
+        self.assertEqual(actions[2], [
+            {'delete': {'_index': 'readthedocs', '_type': 'section',
+                        '_id': 'section-id', '_routing': 'pip'}}])
+        self.assertFalse(self.es.delete_by_query.called)
+
+    def section(self, section_id):
+        return {'id': section_id, 'title': section_id, 'content': ''}
+
+    def section_id(self, path, section_id):
+        return hashlib.md5('pip-latest-%s-%s' % (path, section_id)).hexdigest()
+
+    def test_sections_sent_once_with_parent(self):
+        pages = [self.page('one', '1'), self.page('two', '1')]
+        pages[0]['sections'] = [self.section('a'), self.section('b')]
+        pages[1]['sections'] = [self.section('a')]
+        index_search_request(
+            version=self.version, page_list=iter(pages), commit='commit01',
+            project_scale=0, page_scale=0, delete=False)
+
+        self.assertEqual(self.es.bulk.call_count, 1)
+        body = self.es.bulk.call_args[0][0]
+        sections = [(line['index']['_id'], line['index']['_parent'],
+                     line['index']['_routing'])
+                    for line in body
+                    if 'index' in line and line['index']['_type'] == 'section']
+        self.assertEqual(sections, [
+            (self.section_id('one', 'a'), self.page_id('one'), 'pip'),
+            (self.section_id('one', 'b'), self.page_id('one'), 'pip'),
+            (self.section_id('two', 'a'), self.page_id('two'), 'pip'),
+        ])
+        docs = [line for line in body if 'index' not in line]
+        self.assertTrue(all(doc['commit'] == 'commit01' for doc in docs))
+
+    def test_stale_sections_of_changed_pages_deleted(self):
+        page = self.page('changed', '2')
+        page['sections'] = [self.section('kept')]
+        self.scan.side_effect = [
+            [{'_id': self.page_id('changed'),
+              'fields': {'sha': [self.stored_sha('1')], 'path': ['changed']}}],
+            [{'_id': self.section_id('changed', 'kept'),
+              'fields': {'path': ['changed']}},
+             {'_id': self.section_id('changed', 'gone'),
+              'fields': {'path': ['changed']}}],
+        ]
+        index_search_request(
+            version=self.version, page_list=iter([page]), commit='commit02',
+            project_scale=0, page_scale=0, delete=True, incremental=True)
+
+        # Only sections of the changed page are scanned
+        query = self.scan.call_args[1]['query']['query']
+        self.assertIn({'terms': {'path': ['changed']}},
+                      query['bool']['must'])
+        actions = [call[0][0] for call in self.es.bulk.call_args_list]
+        self.assertEqual(len(actions), 2)
+        self.assertEqual(actions[1], [
+            {'delete': {'_index': 'readthedocs', '_type': 'section',
+                        '_id': self.section_id('changed', 'gone'),
+                        '_routing': 'pip'}}])
+
+    def test_scale_change_reindexes(self):
+        self.scan.side_effect = [
+            [{'_id': self.page_id('same'),
+              'fields': {'sha': [self.stored_sha('1')], 'path': ['same']}}],
+        ]
+        index_search_request(
+            version=self.version, page_list=iter([self.page('same', '1')]),
+            commit='commit02', project_scale=0, page_scale=1,
+            section=False, delete=False, incremental=True)
+
+        body = self.es.bulk.call_args[0][0]
+        self.assertEqual(
+            [line['index']['_id'] for line in body if 'index' in line],
+            [self.page_id('same')])
+        doc = body[1]
+        self.assertEqual(doc['sha'],
+                         self.stored_sha('1', page_scale=1, section=False))
+
+    def test_pages_indexed_without_sections_reindexed(self):
+        page = self.page('same', '1')
+        page['sections'] = [self.section('a')]
+        self.scan.side_effect = [
+            [{'_id': self.page_id('same'),
+              'fields': {'sha': [self.stored_sha('1', section=False)],
+                         'path': ['same']}}],
+        ]
+        index_search_request(
+            version=self.version, page_list=iter([page]), commit='commit02',
+            project_scale=0, page_scale=0, delete=False, incremental=True)
+
+        body = self.es.bulk.call_args[0][0]
+        self.assertEqual(
+            [(line['index']['_type'], line['index']['_id'])
+             for line in body if 'index' in line],
+            [('section', self.section_id('same', 'a')),
+             ('page', self.page_id('same'))])
+
+    def test_failed_sections_clear_page_hash(self):
+        pages = [self.page('one', '1'), self.page('two', '1')]
+        pages[0]['sections'] = [self.section('a')]
+        pages[1]['sections'] = [self.section('a')]
+        self.scan.side_effect = [[]]
+        # The first section is rejected, everything else is indexed
+        responses = [bulk_response(400, 200, 200, 200), bulk_response(200)]
+        self.es.bulk.side_effect = lambda body: responses.pop(0)
+        index_search_request(
+            version=self.version, page_list=iter(pages), commit='commit01',
+            project_scale=0, page_scale=0, delete=False, incremental=True)
+
+        self.assertEqual(self.es.bulk.call_count, 2)
+        self.assertEqual(self.es.bulk.call_args[0][0], [
+            {'update': {'_index': 'readthedocs', '_type': 'page',
+                        '_id': self.page_id('one'), '_parent': 'pip'}},
+            {'doc': {'sha': ''}},
+        ])
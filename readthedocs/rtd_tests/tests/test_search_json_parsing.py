@@ -1,11 +1,56 @@
+import codecs
+import json
 import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import mock
 
 from django.test import TestCase
 
-from readthedocs.search.parse_json import process_file
+from readthedocs.search.parse_json import (process_file, process_file_pyquery,
+                                           process_files)
+from readthedocs.search.utils import (
+    parse_content_from_file, parse_headers_from_file, parse_path_from_file,
+    parse_sections_from_file, process_mkdocs_file)
 
 base_dir = os.path.dirname(os.path.dirname(__file__))
 
+
+# Parses the files given as arguments in a daemonic process, like the ones
+# celery runs tasks in, and prints which processes parsed them
+PARSE_IN_DAEMON = """
+import json
+import os
+import sys
+
+import billiard
+
+from readthedocs.search.parse_json import iter_process_files
+
+
+def parse_pid(filename):
+    return {'path': filename, 'pid': os.getpid()}
+
+
+def parse(filenames, queue):
+    queue.put(list(iter_process_files(filenames, workers=2, chunk_size=1,
+                                      processor=parse_pid)))
+
+
+if __name__ == '__main__':
+    queue = billiard.Queue()
+    process = billiard.Process(target=parse, args=(sys.argv[1:], queue))
+    process.daemon = True
+    process.start()
+    pages = queue.get(timeout=30)
+    process.join()
+    print(json.dumps({'pid': process.pid, 'pages': pages}))
+"""
+
+
 class TestHacks(TestCase):
 
     def test_h2_parsing(self):
@@ -19,3 +64,127 @@ class TestHacks(TestCase):
         # Only capture h2's after the first section
         for obj in data['sections'][1:]:
             self.assertEqual(obj['content'][:5], '\n<h2>')
+
+
+class TestLxmlExtractor(TestCase):
+
+    """The lxml extractor must match the PyQuery one exactly"""
+
+    pages = [
+        {'current_page_name': 'sections',
+         'title': '<em>Emphasis</em> title',
+         'toc': '<ul><li><a href="#"><em>One</em></a></li><li><a>Two</a></li></ul>',
+         'body': (u'<div class="section" id="top"><h1>Top<a>\xb6</a></h1>'
+                  u'<p>intro &amp; <!-- comment --> more</p><p>two</p>'
+                  u'<div class="section" id="s1"><h2>S1</h2><p>text</p></div>'
+                  u'<div class="notsection"><h2>Skipped</h2></div></div>')},
+        {'current_page_name': 'html-fallback',
+         'title': 'Plain',
+         'body': (u'<p>broken <br> html &nbsp;'
+                  u'<div class="section" id="a"><h1>A</h1><p></p><span>x</span></div>'
+                  u'<div class="section" id="b"><h1>B</h1><p>y</p></div>')},
+        {'current_page_name': 'no-title',
+         'body': (u'<div class=" foo\tsection " id="q"><h2>Q</h2>text</div>'
+                  u'<h1>loose</h1><p>after</p>')},
+        {'current_page_name': 'nested',
+         'body': (u'<div><div class="section" id="z"><h1>Z</h1>'
+                  u'<div class="subsection"><p>p</p></div></div></div>')},
+    ]
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.test_dir)
+
+    def test_fixture(self):
+        filename = os.path.join(base_dir, 'files/api.fjson')
+        self.assertEqual(process_file(filename), process_file_pyquery(filename))
+
+    def test_pages(self):
+        for page in self.pages:
+            filename = os.path.join(self.test_dir, 'page.fjson')
+            with open(filename, 'w') as f:
+                json.dump(page, f)
+            self.assertEqual(process_file(filename),
+                             process_file_pyquery(filename))
+
+
+class TestProcessFiles(TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.test_dir)
+        self.filenames = []
+        for num in range(4):
+            filename = os.path.join(self.test_dir, '%s.fjson' % num)
+            shutil.copy(os.path.join(base_dir, 'files/api.fjson'), filename)
+            self.filenames.append(filename)
+        broken = os.path.join(self.test_dir, 'broken.fjson')
+        with open(broken, 'w') as f:
+            f.write('{not json')
+        self.filenames.insert(2, broken)
+
+    def test_serial(self):
+        pages, stats = process_files(self.filenames, workers=1)
+        self.assertEqual(len(pages), 4)
+        self.assertEqual(stats['files'], 5)
+        self.assertEqual(stats['errors'], 1)
+        self.assertEqual(set(stats['timings']), set(self.filenames))
+
+    def test_parallel_matches_serial(self):
+        serial, __ = process_files(self.filenames, workers=1)
+        parallel, stats = process_files(self.filenames, workers=2,
+                                        chunk_size=1)
+        self.assertEqual(parallel, serial)
+        self.assertEqual(stats['errors'], 1)
+
+    def test_parallel_in_daemon_process(self):
+        """Celery runs tasks in daemonic processes, which still use a pool"""
+        # A new interpreter, as forking the test runner can inherit its locks
+        script = os.path.join(self.test_dir, 'parse.py')
+        with open(script, 'w') as fh:
+            fh.write(PARSE_IN_DAEMON)
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        output = subprocess.check_output(
+            [sys.executable, script] + self.filenames, env=env)
+        result = json.loads(output.splitlines()[-1])
+        pages = result['pages']
+        self.assertEqual([page['path'] for page in pages], self.filenames)
+        self.assertNotIn(result['pid'], [page['pid'] for page in pages])
+
+
+class TestMkdocsFile(TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.test_dir)
+        self.filename = os.path.join(self.test_dir, 'page.json')
+        with open(self.filename, 'w') as f:
+            json.dump({
+                'url': '/guide/index.html',
+                'content': ('<div><h1 id="guide">Guide</h1><p>Intro</p>'
+                            '<h2 id="install">Install</h2><p>pip</p>'
+                            '<h2 id="usage"><code>Usage</code></h2><p>run</p></div>'),
+            }, f)
+
+    def test_matches_per_field_parsers(self):
+        page = process_mkdocs_file(self.filename)
+        self.assertEqual(page['path'], parse_path_from_file('mkdocs', self.filename))
+        self.assertEqual(page['content'], parse_content_from_file('mkdocs', self.filename))
+        self.assertEqual(page['headers'], parse_headers_from_file('mkdocs', self.filename))
+        self.assertEqual(page['sections'], parse_sections_from_file('mkdocs', self.filename))
+        self.assertEqual(page['path'], 'guide/index')
+        self.assertEqual(page['title'], 'Guide')
+
+    def test_file_read_once(self):
+        with mock.patch('readthedocs.search.utils.codecs.open',
+                        wraps=codecs.open) as open_mock:
+            process_mkdocs_file(self.filename)
+        self.assertEqual(open_mock.call_count, 1)
+
+    def test_parallel(self):
+        pages, stats = process_files([self.filename] * 3, workers=2,
+                                     chunk_size=1,
+                                     processor=process_mkdocs_file)
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(stats['errors'], 0)
+        self.assertEqual(pages[0]['sha'], pages[2]['sha'])
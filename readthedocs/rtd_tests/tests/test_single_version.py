@@ -23,6 +23,12 @@ class RedirectSingleVersionTests(TestCase):
         r = self.client.get('/docs/pip/usage.html')
         self.assertEqual(r.status_code, 200)
 
+    def test_single_version_url_reuses_resolved_project(self):
+        self.client.get('/docs/pip/usage.html')
+        with self.assertNumQueries(1):
+            r = self.client.get('/docs/pip/usage.html')
+        self.assertEqual(r.status_code, 200)
+
     def test_improper_single_version_url_nonexistent_project(self):
         r = self.client.get('/docs/nonexistent/blah.html')
         self.assertEqual(r.status_code, 404)
@@ -1,10 +1,13 @@
 import json
 
+from django.contrib.contenttypes.models import ContentType
 from django.test import TestCase
+from guardian.models import UserObjectPermission
 
 from readthedocs.builds.models import Version
 from readthedocs.builds.constants import STABLE
 from readthedocs.projects.models import Project
+from readthedocs.restapi.utils import delete_versions, sync_versions
 
 
 class TestSyncVersions(TestCase):
@@ -116,6 +119,67 @@ class TestSyncVersions(TestCase):
         self.assertTrue(version_9.active is False)
 
 
+class TestBulkSyncVersions(TestCase):
+    fixtures = ["eric", "test_data"]
+
+    def setUp(self):
+        self.pip = Project.objects.get(slug='pip')
+        self.eric = self.pip.users.get(username='eric')
+
+    def test_many_tags_in_few_queries(self):
+        tags = [{'identifier': 'sha%s' % num, 'verbose_name': '1.%s' % num}
+                for num in range(200)]
+        ContentType.objects.clear_cache()
+        with self.assertNumQueries(14):
+            added = sync_versions(self.pip, tags, type='tag')
+        self.assertEqual(len(added), 200)
+        version = self.pip.versions.get(slug='1.199')
+        self.assertEqual(version.identifier, 'sha199')
+        self.assertEqual(version.type, 'tag')
+        self.assertTrue(UserObjectPermission.objects.filter(
+            user=self.eric, object_pk=str(version.pk),
+            permission__codename='view_version').exists())
+
+    def test_colliding_slugs(self):
+        Version.objects.create(project=self.pip, identifier='feature/x',
+                               verbose_name='feature/x')
+        added = sync_versions(self.pip, [
+            {'identifier': 'a', 'verbose_name': 'feature-x'},
+            {'identifier': 'b', 'verbose_name': 'feature_x'},
+            {'identifier': 'c', 'verbose_name': 'Feature-X'},
+        ], type='branch')
+        self.assertEqual(added, set(['feature_x', 'feature-x_a', 'feature-x_b']))
+
+    def test_changed_identifiers(self):
+        Version.objects.create(project=self.pip, identifier='old1',
+                               verbose_name='one', machine=True)
+        Version.objects.create(project=self.pip, identifier='old2',
+                               verbose_name='two', machine=True)
+        added = sync_versions(self.pip, [
+            {'identifier': 'new1', 'verbose_name': 'one'},
+            {'identifier': 'new2', 'verbose_name': 'two'},
+        ], type='tag')
+        self.assertEqual(added, set())
+        self.assertEqual(
+            dict(self.pip.versions.filter(verbose_name__in=['one', 'two'])
+                 .values_list('verbose_name', 'identifier')),
+            {'one': 'new1', 'two': 'new2'})
+        self.assertFalse(self.pip.versions.filter(
+            verbose_name__in=['one', 'two'], machine=True).exists())
+
+    def test_delete_versions(self):
+        Version.objects.create(project=self.pip, identifier='gone',
+                               verbose_name='gone')
+        Version.objects.create(project=self.pip, identifier='kept',
+                               verbose_name='kept')
+        deleted = delete_versions(self.pip, {
+            'branches': [{'identifier': 'kept', 'verbose_name': 'kept'}]})
+        self.assertIn('gone', deleted)
+        self.assertNotIn('kept', deleted)
+        self.assertTrue(self.pip.versions.filter(slug='kept').exists())
+        self.assertFalse(self.pip.versions.filter(slug='gone').exists())
+
+
 class TestStableVersion(TestCase):
     fixtures = ["eric", "test_data"]
 
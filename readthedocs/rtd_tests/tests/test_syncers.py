@@ -0,0 +1,158 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from distutils.spawn import find_executable
+from unittest import skipUnless
+
+import mock
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from readthedocs.privacy.backends.syncers import RemoteSyncer, SyncResult
+
+
+# Stands in for ssh: runs the remote half of the command locally, in a
+# directory per server
+SSH_WRAPPER = """
+import os
+import sys
+
+args = sys.argv[1:]
+while args[0].startswith('-'):
+    if args.pop(0) in ('-o', '-l', '-p'):
+        args.pop(0)
+server = args.pop(0).split('@')[-1]
+if server == 'down':
+    sys.stderr.write('ssh: connect to host down: Connection refused\\n')
+    sys.exit(255)
+root = os.path.join(%(root)r, server)
+if not os.path.exists(root):
+    os.makedirs(root)
+os.chdir(root)
+os.execvp('sh', ['sh', '-c', ' '.join(args)])
+"""
+
+
+class LocalHostSyncer(RemoteSyncer):
+
+    """Sync to local directories standing in for the app servers
+
+    Only the ssh transport is replaced, the ``rsync`` commands are run as
+    they are built. Targets are relative to the server's directory.
+    """
+
+    ssh_command = None
+
+    @classmethod
+    def get_ssh_command(cls):
+        return cls.ssh_command
+
+
+class TestRemoteSyncer(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.source = os.path.join(self.root, 'build')
+        os.makedirs(self.source)
+        with open(os.path.join(self.source, 'index.html'), 'w') as fh:
+            fh.write('docs')
+        self.hosts = os.path.join(self.root, 'hosts')
+        wrapper = os.path.join(self.root, 'ssh.py')
+        with open(wrapper, 'w') as fh:
+            fh.write(SSH_WRAPPER % {'root': self.hosts})
+        LocalHostSyncer.ssh_command = [sys.executable, wrapper]
+
+    def host_path(self, server, path):
+        return os.path.join(self.hosts, server, path)
+
+    @override_settings(MULTIPLE_APP_SERVERS=['web01', 'web02', 'web03'],
+                       SYNC_WORKERS=3)
+    def test_servers_synced_in_parallel(self):
+        threads = set()
+        started = threading.Event()
+
+        def run_command(server, command):
+            threads.add(threading.current_thread().name)
+            if len(threads) == 3:
+                started.set()
+            # Every server has to be syncing for any to finish
+            self.assertTrue(started.wait(5))
+            return SyncResult(server=server, command=command, returncode=0,
+                              elapsed=0, output='')
+
+        with mock.patch.object(LocalHostSyncer, 'run_command',
+                               side_effect=run_command):
+            results = LocalHostSyncer.copy(self.source, 'srv/docs/pip/latest')
+        self.assertEqual([result.server for result in results],
+                         ['web01', 'web02', 'web03'])
+        self.assertEqual(len(threads), 3)
+        self.assertEqual(results[0].command, LocalHostSyncer.get_command(
+            'web01', self.source, 'srv/docs/pip/latest'))
+
+    @skipUnless(find_executable('rsync'), 'rsync is not installed')
+    @override_settings(MULTIPLE_APP_SERVERS=['web01', 'web02'])
+    def test_directory_synced(self):
+        stale = self.host_path('web01', 'srv/docs/pip/latest/old.html')
+        os.makedirs(os.path.dirname(stale))
+        open(stale, 'w').close()
+
+        results = LocalHostSyncer.copy(self.source, 'srv/docs/pip/latest')
+        self.assertEqual([result.returncode for result in results], [0, 0],
+                         [result.output for result in results])
+        for server in ['web01', 'web02']:
+            # The directory's contents are copied, not the directory itself
+            with open(self.host_path(
+                    server, 'srv/docs/pip/latest/index.html')) as fh:
+                self.assertEqual(fh.read(), 'docs')
+        # Files no longer built are deleted
+        self.assertFalse(os.path.exists(stale))
+
+    @skipUnless(find_executable('rsync'), 'rsync is not installed')
+    @override_settings(MULTIPLE_APP_SERVERS=['web01'])
+    def test_file_synced(self):
+        path = os.path.join(self.source, 'index.html')
+        results = LocalHostSyncer.copy(path, 'srv/media/pdf/pip.pdf',
+                                       file=True)
+        self.assertEqual(results[0].returncode, 0, results[0].output)
+        with open(self.host_path('web01', 'srv/media/pdf/pip.pdf')) as fh:
+            self.assertEqual(fh.read(), 'docs')
+
+    @skipUnless(find_executable('rsync'), 'rsync is not installed')
+    @override_settings(MULTIPLE_APP_SERVERS=['web01', 'down'])
+    def test_failures_reported_per_server(self):
+        results = LocalHostSyncer.copy(self.source, 'srv/docs/pip/latest')
+        self.assertEqual(
+            [(result.server, result.returncode == 0) for result in results],
+            [('web01', True), ('down', False)])
+        self.assertIn('Connection refused', results[1].output)
+
+    @override_settings(SYNC_USER='docs', SYNC_SSH_CONTROL_PATH='/tmp/cm-%h')
+    def test_command(self):
+        command = RemoteSyncer.get_command(
+            'web01', '/build/pdf/pip.pdf', '/srv/media/pdf/pip.pdf', file=True)
+        self.assertEqual(command[0], 'rsync')
+        self.assertIn('ControlMaster=auto', command[2])
+        self.assertIn('ControlPath=/tmp/cm-%h', command[2])
+        self.assertEqual(command[-3:], [
+            'mkdir -p /srv/media/pdf && rsync',
+            '/build/pdf/pip.pdf',
+            'docs@web01:/srv/media/pdf/pip.pdf',
+        ])
+        command = RemoteSyncer.get_command('web01', '/build/html',
+                                           '/srv/docs/pip latest')
+        self.assertEqual(command[-3:], [
+            "mkdir -p '/srv/docs/pip latest' && rsync",
+            '/build/html/',
+            'docs@web01:/srv/docs/pip latest',
+        ])
+
+    def test_sync_server_error(self):
+        with mock.patch('readthedocs.privacy.backends.syncers.subprocess.Popen',
+                        side_effect=OSError('No such file or directory')):
+            result = RemoteSyncer.sync_server('web01', self.source, '/srv')
+        self.assertEqual(result.server, 'web01')
+        self.assertEqual(result.returncode, -1)
+        self.assertIn('No such file', result.output)
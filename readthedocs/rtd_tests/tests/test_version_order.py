@@ -0,0 +1,52 @@
+from django.test import TestCase
+from django_dynamic_fixture import get
+
+from readthedocs.builds.models import Version
+from readthedocs.projects.models import Project
+from readthedocs.projects.templatetags.projects_tags import sort_version_aware
+from readthedocs.projects.version_handling import (
+    get_version_order, order_versions, parse_version_failsafe,
+    version_order_cache)
+
+
+class TestVersionOrder(TestCase):
+
+    def setUp(self):
+        version_order_cache.clear()
+        self.project = get(Project, versions=[])
+        for verbose_name in ['1.0', '2.0', 'nonsense', '1.10', '0.9']:
+            get(Version, project=self.project, verbose_name=verbose_name,
+                slug=verbose_name, active=True)
+
+    def test_parse_memoized(self):
+        self.assertIs(parse_version_failsafe('1.2.3'),
+                      parse_version_failsafe('1.2.3'))
+        self.assertIsNone(parse_version_failsafe('nonsense'))
+
+    def test_matches_sort_version_aware(self):
+        versions = list(self.project.versions.all())
+        self.assertEqual(order_versions(self.project, versions),
+                         sort_version_aware(versions))
+
+    def test_order_cached(self):
+        get_version_order(self.project)
+        versions = list(self.project.versions.all())
+        with self.assertNumQueries(0):
+            order_versions(self.project, versions)
+
+    def test_new_version_reorders(self):
+        get_version_order(self.project)
+        get(Version, project=self.project, verbose_name='3.0', slug='3.0',
+            active=True)
+        ordered = self.project.ordered_active_versions()
+        self.assertEqual(ordered[0].verbose_name, 'latest')
+        self.assertEqual(ordered[2].verbose_name, '3.0')
+
+    def test_added_version_without_signal(self):
+        get_version_order(self.project)
+        Version.objects.bulk_create([
+            Version(project=self.project, verbose_name='5.0', slug='5.0',
+                    identifier='5.0', active=True)])
+        versions = list(self.project.versions.all())
+        self.assertEqual(order_versions(self.project, versions),
+                         sort_version_aware(versions))
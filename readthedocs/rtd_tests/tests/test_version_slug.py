@@ -94,3 +94,29 @@ class VersionSlugFieldTests(TestCase):
         self.assertEqual(field.uniquifying_suffix(25), '_z')
         self.assertEqual(field.uniquifying_suffix(26), '_ba')
         self.assertEqual(field.uniquifying_suffix(52), '_ca')
+
+    def test_collisions_in_one_query(self):
+        for name in ['1!0', '1%0', '1?0', '1-0_a-', '2!0']:
+            Version.objects.create(verbose_name=name, project=self.pip)
+        version = Version(verbose_name='1#0', project=self.pip)
+        field = Version._meta.get_field('slug')
+        with self.assertNumQueries(1):
+            self.assertEqual(field.create_slug(version), '1-0_c')
+
+    def test_truncated_collisions(self):
+        field = VersionSlugField(populate_from='foo', max_length=6)
+        taken = set(['abcdef', 'abcd_a'])
+        self.assertEqual(field.unique_slug('abcdefgh', taken), 'abcd_b')
+        self.assertEqual(field.slug_prefix('abcdefgh'), 'abc')
+
+        taken.update(slug for slug, __ in zip(
+            field.slug_candidates('abcdefgh'), range(677)))
+        self.assertEqual(field.unique_slug('abcdefgh', taken), 'ab_baa')
+
+    def test_create_slugs(self):
+        Version.objects.create(verbose_name='1.0', project=self.pip)
+        field = Version._meta.get_field('slug')
+        with self.assertNumQueries(1):
+            slugs = field.create_slugs(['1.0', '1.0', '2.0', '2/0'],
+                                       project=self.pip)
+        self.assertEqual(slugs, ['1.0_a', '1.0_b', '2.0', '2-0'])
@@ -0,0 +1,158 @@
+import os
+import shutil
+import tempfile
+
+import mock
+from django.test import TestCase
+from django.test.utils import override_settings
+from django_dynamic_fixture import fixture, get
+
+from readthedocs.doc_builder.virtualenv import (clone_virtualenv,
+                                                requirements_digest)
+from readthedocs.projects.models import Project
+from readthedocs.projects.tasks import UpdateDocsTask
+
+
+def create_virtualenv(path):
+    """Lay out the parts of a virtualenv that refer to its own path"""
+    os.makedirs(os.path.join(path, 'bin'))
+    os.makedirs(os.path.join(path, 'local'))
+    with open(os.path.join(path, 'bin', 'python'), 'wb') as fh:
+        fh.write(b'\x7fELF\0' + path.encode('utf-8'))
+    with open(os.path.join(path, 'bin', 'pip'), 'w') as fh:
+        fh.write('#!%s/bin/python\nimport pip\n' % path)
+    os.symlink(os.path.join(path, 'bin'), os.path.join(path, 'local', 'bin'))
+
+
+class FakeBuildEnvironment(object):
+
+    def __init__(self):
+        self.commands = []
+
+    def update_build(self, state=None):
+        pass
+
+    def run(self, *cmd, **kwargs):
+        self.commands.append(cmd)
+        if cmd[1] == '-mvirtualenv':
+            create_virtualenv(cmd[-1])
+
+
+class VirtualenvTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def test_clone_relocates(self):
+        source = os.path.join(self.root, 'template')
+        target = os.path.join(self.root, 'envs', 'latest')
+        create_virtualenv(source)
+        clone_virtualenv(source, target)
+        with open(os.path.join(target, 'bin', 'pip')) as fh:
+            self.assertEqual(fh.readline(), '#!%s/bin/python\n' % target)
+        with open(os.path.join(target, 'bin', 'python'), 'rb') as fh:
+            self.assertEqual(fh.read(), b'\x7fELF\0' + source.encode('utf-8'))
+        self.assertEqual(os.readlink(os.path.join(target, 'local', 'bin')),
+                         os.path.join(target, 'bin'))
+
+    def test_requirements_digest(self):
+        path = os.path.join(self.root, 'requirements.txt')
+        with open(path, 'w') as fh:
+            fh.write('sphinxcontrib-httpdomain==1.4\n')
+        digest = requirements_digest(path)
+        self.assertIsNotNone(digest)
+        with open(path, 'a') as fh:
+            fh.write('# Docs\n'
+                     '--index-url https://pypi.example.com/simple\n'
+                     'requests[security]==2.9.1 ; python_version < "3"\n'
+                     'six==1.10.0 \\\n'
+                     '    --hash=sha256:0ff78c403d9bccf5a425a6d31a12aa6b\n')
+        self.assertIsNotNone(requirements_digest(path))
+        self.assertNotEqual(requirements_digest(path), digest)
+        # Anything that can install something else without the file changing
+        for line in ['-e .', '-r other.txt', './plugin', 'file:///plugin',
+                     'requests', 'requests>=2.0', 'requests==2.*',
+                     'git+https://github.com/rtfd/plugin@master#egg=plugin',
+                     'https://example.com/plugin.tar.gz']:
+            with open(path, 'w') as fh:
+                fh.write('six==1.10.0\n%s\n' % line)
+            self.assertIsNone(requirements_digest(path), line)
+
+
+class SetupEnvironmentTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.settings = override_settings(DOCROOT=self.root)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        self.project = get(Project, slug='venv-project',
+                           documentation_type='sphinx',
+                           requirements_file='requirements.txt',
+                           use_system_packages=False,
+                           versions=[fixture()])
+        self.version = self.project.versions.all()[0]
+        checkout_path = self.project.checkout_path(self.version.slug)
+        os.makedirs(checkout_path)
+        self.requirements_path = os.path.join(checkout_path,
+                                              'requirements.txt')
+        self.write_requirements('sphinxcontrib-httpdomain==1.4\n')
+
+    def write_requirements(self, content):
+        with open(self.requirements_path, 'w') as fh:
+            fh.write(content)
+
+    def setup_environment(self, force=False):
+        build_env = FakeBuildEnvironment()
+        task = UpdateDocsTask(build_env=build_env, project=self.project,
+                              version=self.version, force=force)
+        task.setup_environment()
+        return [cmd[1:3] for cmd in build_env.commands]
+
+    def test_reused(self):
+        venv_path = self.project.venv_path(self.version.slug)
+        self.assertEqual(self.setup_environment(), [
+            ('-mvirtualenv', '--no-site-packages'),
+            (mock.ANY, 'install'),
+            (os.path.join(venv_path, 'bin', 'pip'), 'install'),
+        ])
+        with open(os.path.join(venv_path, 'bin', 'pip')) as fh:
+            self.assertEqual(fh.readline(), '#!%s/bin/python\n' % venv_path)
+
+        # Nothing changed, nothing to install
+        self.assertEqual(self.setup_environment(), [])
+
+        # Changed requirements get a new copy of the template
+        os.mkdir(os.path.join(venv_path, 'stale'))
+        self.write_requirements('sphinxcontrib-httpdomain==1.5\n')
+        self.assertEqual(self.setup_environment(), [
+            (os.path.join(venv_path, 'bin', 'pip'), 'install'),
+        ])
+        self.assertFalse(os.path.exists(os.path.join(venv_path, 'stale')))
+
+        # Requirements that can't be checked are always installed
+        for requirements in ['-e .\n', 'sphinxcontrib-httpdomain>=1.4\n']:
+            self.write_requirements(requirements)
+            self.assertEqual(len(self.setup_environment()), 1)
+            self.assertEqual(len(self.setup_environment()), 1)
+
+    def test_template_shared_by_versions(self):
+        self.setup_environment()
+        self.version = self.project.versions.create(
+            slug='1.0', verbose_name='1.0', identifier='1.0')
+        os.makedirs(self.project.checkout_path('1.0'))
+        self.requirements_path = os.path.join(
+            self.project.checkout_path('1.0'), 'requirements.txt')
+        self.write_requirements('sphinxcontrib-httpdomain==1.4\n')
+        venv_path = self.project.venv_path('1.0')
+        self.assertEqual(self.setup_environment(), [
+            (os.path.join(venv_path, 'bin', 'pip'), 'install'),
+        ])
+
+    def test_force_creates_template(self):
+        self.setup_environment()
+        commands = self.setup_environment(force=True)
+        self.assertEqual(len(commands), 3)
+        self.assertEqual(commands[0][0], '-mvirtualenv')
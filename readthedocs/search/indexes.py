@@ -15,12 +15,17 @@ TODO: Handle page removal case in Page.
 
 """
 import datetime
+import json
+import logging
+import time
 
 from elasticsearch import Elasticsearch, exceptions
-from elasticsearch.helpers import bulk_index
+from elasticsearch.helpers import expand_action, scan
 
 from django.conf import settings
 
+log = logging.getLogger(__name__)
+
 
 class Index(object):
     """
@@ -112,32 +117,128 @@ class Index(object):
     def bulk_index(self, data, index=None, chunk_size=500, parent=None,
                    routing=None):
         """
-        Given a list of documents, uses Elasticsearch bulk indexing.
+        Given an iterable of documents, uses Elasticsearch bulk indexing.
 
-        For each doc this calls `extract_document`, then indexes.
+        For each doc this calls `extract_document`, then indexes. Documents
+        are extracted lazily, see `streaming_bulk_index`.
 
         `chunk_size` defaults to the elasticsearch lib's default. Override per
         your document size as needed.
 
         """
-        index = index or self._index
-        docs = []
-        for d in data:
-            source = self.extract_document(d)
-            doc = {
-                '_index': index,
-                '_type': self._type,
-                '_id': source['id'],
-                '_source': source,
-            }
-            if parent:
-                doc['_parent'] = parent
-            if routing:
-                doc['_routing'] = routing
-            docs.append(doc)
+        actions = (self.get_action(d, index=index, parent=parent,
+                                   routing=routing)
+                   for d in data)
+        return self.streaming_bulk_index(actions, chunk_size=chunk_size)
+
+    def get_action(self, data, index=None, parent=None, routing=None):
+        """
+        Returns the bulk index action for a document.
+        """
+        source = self.extract_document(data)
+        action = {
+            '_index': index or self._index,
+            '_type': self._type,
+            '_id': source['id'],
+            '_source': source,
+        }
+        if parent:
+            action['_parent'] = parent
+        if routing:
+            action['_routing'] = routing
+        return action
+
+    def streaming_bulk_index(self, actions, chunk_size=500,
+                             max_chunk_bytes=None, max_retries=None,
+                             retry_delay=None, on_failure=None):
+        """
+        Sends bulk actions from an iterable, one chunk at a time.
+
+        Only one chunk is held in memory: the next chunk is not read from
+        `actions` until Elasticsearch has accepted the previous one, which
+        throttles whatever is producing the actions. A chunk is closed at
+        `chunk_size` actions or `max_chunk_bytes` of serialized source.
+
+        A chunk that fails to send, or documents rejected because the cluster
+        is overloaded, are retried up to `max_retries` times with exponential
+        backoff starting at `retry_delay` seconds.
+
+        `on_failure` is called with each action that failed for good.
 
-        # TODO: This doesn't work with the new ES setup.
-        bulk_index(self.es, docs, chunk_size=chunk_size)
+        Returns a dict with the number of documents `indexed`, documents that
+        `failed` and `chunks` sent.
+
+        """
+        if max_chunk_bytes is None:
+            max_chunk_bytes = getattr(settings, 'ES_BULK_MAX_CHUNK_BYTES',
+                                      10 * 1024 * 1024)
+        if max_retries is None:
+            max_retries = getattr(settings, 'ES_BULK_MAX_RETRIES', 3)
+        if retry_delay is None:
+            retry_delay = getattr(settings, 'ES_BULK_RETRY_DELAY', 1)
+
+        stats = {'indexed': 0, 'failed': 0, 'chunks': 0}
+        chunk = []
+        chunk_bytes = 0
+        for action in actions:
+            chunk.append(action)
+            chunk_bytes += len(json.dumps(action.get('_source', action)))
+            if len(chunk) >= chunk_size or chunk_bytes >= max_chunk_bytes:
+                self._send_chunk(chunk, stats, max_retries, retry_delay,
+                                 on_failure)
+                chunk = []
+                chunk_bytes = 0
+        if chunk:
+            self._send_chunk(chunk, stats, max_retries, retry_delay,
+                             on_failure)
+        return stats
+
+    def _send_chunk(self, chunk, stats, max_retries, retry_delay,
+                    on_failure=None):
+        stats['chunks'] += 1
+        attempt = 0
+        while chunk:
+            rejected = []
+            try:
+                resp = self.es.bulk(self._bulk_body(chunk))
+            except exceptions.TransportError as e:
+                if attempt >= max_retries:
+                    log.error('Bulk chunk failed after %s retries: %s',
+                              attempt, e)
+                    stats['failed'] += len(chunk)
+                    if on_failure is not None:
+                        for action in chunk:
+                            on_failure(action)
+                    return
+                rejected = chunk
+            else:
+                for action, item in zip(chunk, resp['items']):
+                    __, result = item.popitem()
+                    status = result.get('status', 500)
+                    if 200 <= status < 300:
+                        stats['indexed'] += 1
+                    elif status == 429 and attempt < max_retries:
+                        rejected.append(action)
+                    else:
+                        log.error('Failed to index document %s: %s',
+                                  action['_id'], result.get('error'))
+                        stats['failed'] += 1
+                        if on_failure is not None:
+                            on_failure(action)
+            if rejected:
+                time.sleep(retry_delay * (2 ** attempt))
+                attempt += 1
+            chunk = rejected
+
+    @staticmethod
+    def _bulk_body(chunk):
+        body = []
+        for action in chunk:
+            action, data = expand_action(action)
+            body.append(action)
+            if data is not None:
+                body.append(data)
+        return body
 
     def index_document(self, data, index=None, parent=None, routing=None):
         doc = self.extract_document(data)
@@ -165,6 +266,35 @@ class Index(object):
             kwargs['routing'] = routing
         return self.es.delete_by_query(**kwargs)
 
+    def delete_documents(self, ids, index=None, routing=None):
+        """
+        Deletes documents by id, using bulk requests.
+        """
+        actions = ({'_op_type': 'delete',
+                    '_index': index or self._index,
+                    '_type': self._type,
+                    '_id': doc_id,
+                    '_routing': routing}
+                   for doc_id in ids)
+        return self.streaming_bulk_index(actions)
+
+    def scan_fields(self, query, fields, index=None, routing=None):
+        """
+        Yields the id and requested fields of every document matching
+        `query`, without fetching document sources.
+        """
+        kwargs = {
+            'index': index or self._index,
+            'doc_type': self._type,
+            'fields': ','.join(fields),
+        }
+        if routing:
+            kwargs['routing'] = routing
+        for hit in scan(self.es, query={'query': query}, **kwargs):
+            values = dict((field, value[0] if isinstance(value, list) else value)
+                          for (field, value) in hit.get('fields', {}).items())
+            yield hit['_id'], values
+
     def get_mapping(self):
         """
         Returns the mapping for this _index and _type.
@@ -296,7 +426,7 @@ class PageIndex(Index):
         doc = {}
 
         attrs = ('id', 'project', 'title', 'headers', 'version', 'path',
-                 'content', 'taxonomy', 'commit')
+                 'content', 'taxonomy', 'commit', 'sha')
         for attr in attrs:
             doc[attr] = data.get(attr, '')
 
@@ -2,18 +2,45 @@
 
 import codecs
 import fnmatch
+import functools
 import json
 import os
+import re
+import time
 
+import billiard
+import lxml.html
+from django.conf import settings
+from lxml import etree
 from pyquery import PyQuery
 
+from readthedocs.projects.checksums import md5_file
+
 import logging
 log = logging.getLogger(__name__)
 
+_CLASS_SEPARATOR = re.compile(r'[ \t\n\r]+')
+
 
-def process_all_json_files(version, build_dir=True):
+def process_all_json_files(version, build_dir=True, workers=None,
+                           chunk_size=None):
     """
     Return a list of pages to index
+
+    :param workers: Number of processes used to parse files, defaults to the
+        ``SEARCH_PARSE_WORKERS`` setting. One parses in this process.
+    :param chunk_size: Number of files sent to a worker at a time
+    """
+    return list(iter_all_json_files(version, build_dir=build_dir,
+                                    workers=workers, chunk_size=chunk_size))
+
+
+def iter_all_json_files(version, build_dir=True, workers=None,
+                        chunk_size=None):
+    """
+    Yield pages to index one at a time
+
+    This takes the same arguments as :py:func:`process_all_json_files`.
     """
     if build_dir:
         full_path = version.project.full_json_path(version.slug)
@@ -26,18 +53,251 @@ def process_all_json_files(version, build_dir=True):
             if filename in ['search.fjson', 'genindex.fjson', 'py-modindex.fjson']:
                 continue
             html_files.append(os.path.join(root, filename))
-    page_list = []
-    for filename in html_files:
-        try:
-            result = process_file(filename)
-            if result:
-                page_list.append(result)
-        except:
-            pass
-    return page_list
+    stats = {}
+    for page in iter_process_files(sorted(html_files), workers=workers,
+                                   chunk_size=chunk_size, stats=stats):
+        yield page
+    log.info('(Search Index) Parsed %s files for %s:%s in %.2fs, %s errors',
+             stats['files'], version.project.slug, version.slug,
+             sum(stats['timings'].values()), stats['errors'])
+
+
+def process_files(filenames, workers=None, chunk_size=None, processor=None):
+    """Parse ``filenames``, optionally across a pool of processes
+
+    Pages are returned in the same order as ``filenames`` regardless of how
+    many workers are used.
+
+    :param processor: Module level function parsing a single file, defaults
+        to :py:func:`process_file`
+    :returns: A tuple of the list of parsed pages, and a dictionary of stats
+        with the number of ``files``, parse ``errors`` and the parse time in
+        seconds of each file in ``timings``
+    """
+    stats = {}
+    page_list = list(iter_process_files(filenames, workers=workers,
+                                        chunk_size=chunk_size, stats=stats,
+                                        processor=processor))
+    return page_list, stats
+
+
+def iter_process_files(filenames, workers=None, chunk_size=None, stats=None,
+                       processor=None):
+    """Parse ``filenames`` and yield pages in order
+
+    Files are handed to the pool in windows of a few chunks per worker, so
+    parsed pages don't pile up in memory when the consumer is slower than
+    the parsers.
+
+    :param stats: Optional dictionary, filled in with the stats described in
+        :py:func:`process_files`
+    :param processor: See :py:func:`process_files`
+    """
+    if workers is None:
+        workers = getattr(settings, 'SEARCH_PARSE_WORKERS', 1)
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'SEARCH_PARSE_CHUNK_SIZE', 20)
+    if stats is None:
+        stats = {}
+    stats.update({'files': len(filenames), 'errors': 0, 'timings': {}})
+    timed_processor = functools.partial(_timed_process_file,
+                                        processor=processor or process_file)
+
+    if workers > 1 and len(filenames) > 1:
+        # Celery's pool, unlike multiprocessing's, can be started from the
+        # daemonic processes celery runs tasks in
+        pool = billiard.Pool(min(workers, len(filenames)))
+        window = workers * chunk_size * 2
+
+        def _results():
+            for offset in range(0, len(filenames), window):
+                for result in pool.imap(timed_processor,
+                                        filenames[offset:offset + window],
+                                        chunksize=chunk_size):
+                    yield result
+    else:
+        pool = None
+
+        def _results():
+            for filename in filenames:
+                yield timed_processor(filename)
+
+    try:
+        for filename, result, elapsed, error in _results():
+            stats['timings'][filename] = elapsed
+            if error is not None:
+                stats['errors'] += 1
+                log.error('(Search Index) Unable to parse file %s: %s',
+                          filename, error)
+            elif result:
+                yield result
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+def _timed_process_file(filename, processor):
+    """Process a file, returning the result along with timing and errors
+
+    This is a module level function so it can be sent to a process pool.
+    """
+    start = time.time()
+    result = None
+    error = None
+    try:
+        result = processor(filename)
+        if result:
+            result['sha'] = md5_file(filename)
+    except Exception as e:
+        error = '%s: %s' % (e.__class__.__name__, e)
+    return filename, result, time.time() - start, error
 
 
 def process_file(filename):
+    try:
+        with codecs.open(filename, encoding='utf-8', mode='r') as f:
+            file_contents = f.read()
+    except IOError as e:
+        log.info('Unable to index file: %s, error :%s' % (filename, e))
+        return
+    data = json.loads(file_contents)
+    headers = []
+    sections = []
+    title = ''
+    body_content = ''
+    if 'current_page_name' in data:
+        path = data['current_page_name']
+    else:
+        log.info('Unable to index file due to no name %s' % filename)
+        return None
+    if 'toc' in data:
+        for element in _fromstring(data['toc']).iter('a'):
+            headers.append(recurse_while_none(element))
+        if None in headers:
+            log.info('Unable to index file headers for: %s' % filename)
+    if 'body' in data and len(data['body']):
+        body_content, sections, h2_count = _extract_body(
+            _fromstring(data['body']))
+        if h2_count:
+            # Pages without a title have always been indexed with the title
+            # of their last h2 section
+            title = sections[-1]['title']
+    else:
+        log.info('Unable to index content for: %s' % filename)
+    if 'title' in data:
+        title = data['title']
+        if title.startswith('<'):
+            title = _text([_fromstring(data['title'])])
+    else:
+        log.info('Unable to index title for: %s' % filename)
+
+    return {'headers': headers, 'content': body_content, 'path': path,
+            'title': title, 'sections': sections}
+
+
+def _fromstring(html):
+    """Parse an HTML fragment the way PyQuery does
+
+    Well formed fragments are parsed as XML, anything else with the HTML
+    parser. Both give different trees for some input, so the choice is kept
+    to match :py:func:`process_file_pyquery` exactly.
+    """
+    try:
+        return etree.fromstring(html)
+    except etree.XMLSyntaxError:
+        return lxml.html.fromstring(html)
+
+
+def _extract_body(root):
+    """Extract the text content and sections of a parsed page body
+
+    The body is parsed once and walked with lxml's own iterators, which is
+    much cheaper than building PyQuery selections and walking siblings in
+    Python. Only heading subtrees and section elements are visited again,
+    to get their titles and content.
+
+    :returns: Tuple of the body text, the list of sections and the number
+        of those sections that come from h2 headings
+    """
+    body_content = _text([root]).replace(u'¶', '')
+    h1s = []
+    section_h1s = []
+    section_h2s = []
+    for heading in root.iter('h1', 'h2'):
+        if heading.tag == 'h1':
+            h1s.append(heading)
+            if _is_section(heading.getparent()):
+                section_h1s.append(heading)
+        elif _is_section(heading.getparent()):
+            section_h2s.append(heading)
+
+    sections = []
+    # Capture text inside h1 before the first h2
+    if section_h1s:
+        h1_title = _text(section_h1s).replace(u'¶', '').strip()
+        h1_id = section_h1s[0].getparent().get('id')
+        h1_content = ""
+        siblings = _next_siblings(h1s)
+        while siblings:
+            sibling = siblings[0]
+            if sibling.tag == 'div' and 'class' in sibling.attrib:
+                if 'section' in sibling.attrib['class']:
+                    break
+            h1_content += "\n%s\n" % _inner_html(sibling)
+            siblings = _next_siblings(siblings)
+        if h1_content:
+            sections.append({
+                'id': h1_id,
+                'title': h1_title,
+                'content': h1_content,
+            })
+
+    # Capture text inside h2's
+    for header in section_h2s:
+        div = header.getparent()
+        sections.append({
+            'id': div.get('id'),
+            'title': _text([header]).replace(u'¶', '').strip(),
+            'content': _inner_html(div),
+        })
+    return body_content, sections, len(section_h2s)
+
+
+def _is_section(element):
+    """Match the ``.section`` CSS class selector"""
+    if element is None:
+        return False
+    return 'section' in _CLASS_SEPARATOR.split(element.get('class', ''))
+
+
+def _next_siblings(elements):
+    return [element.getnext() for element in elements
+            if element.getnext() is not None]
+
+
+def _text(elements):
+    """Text content of ``elements``, like ``PyQuery.text()``"""
+    stripped = [text.strip() for element in elements
+                for text in element.itertext()]
+    return ' '.join([text for text in stripped if text])
+
+
+def _inner_html(element):
+    """Serialized children of ``element``, like ``PyQuery.html()``"""
+    if not len(element):
+        return element.text
+    return (element.text or '') + u''.join(
+        [etree.tostring(child, encoding=unicode) for child in element])
+
+
+def process_file_pyquery(filename):
+    """Parse ``filename`` with PyQuery
+
+    This is the previous implementation of :py:func:`process_file`. It is
+    kept as the reference the lxml extractor is checked and benchmarked
+    against.
+    """
     try:
         with codecs.open(filename, encoding='utf-8', mode='r') as f:
             file_contents = f.read()
@@ -9,10 +9,24 @@ import json
 
 from pyquery import PyQuery
 
+from readthedocs.search.parse_json import iter_process_files
+
 log = logging.getLogger(__name__)
 
 
-def process_mkdocs_json(version, build_dir=True):
+def process_mkdocs_json(version, build_dir=True, workers=None,
+                        chunk_size=None):
+    return list(iter_mkdocs_json(version, build_dir=build_dir,
+                                 workers=workers, chunk_size=chunk_size))
+
+
+def iter_mkdocs_json(version, build_dir=True, workers=None, chunk_size=None):
+    """Yield mkdocs pages to index one at a time
+
+    Files are parsed with :py:func:`process_mkdocs_file`, across the same
+    process pool as Sphinx pages, see
+    :py:func:`readthedocs.search.parse_json.iter_process_files`.
+    """
     if build_dir:
         full_path = version.project.full_json_path(version.slug)
     else:
@@ -23,24 +37,61 @@ def process_mkdocs_json(version, build_dir=True):
     for root, dirs, files in os.walk(full_path):
         for filename in fnmatch.filter(files, '*.json'):
             html_files.append(os.path.join(root, filename))
-    page_list = []
-    for filename in html_files:
-        relative_path = parse_path_from_file(documentation_type='mkdocs', file_path=filename)
-        html = parse_content_from_file(documentation_type='mkdocs', file_path=filename)
-        headers = parse_headers_from_file(documentation_type='mkdocs', file_path=filename)
-        sections = parse_sections_from_file(documentation_type='mkdocs', file_path=filename)
-        try:
-            title = sections[0]['title']
-        except IndexError:
-            title = relative_path
-        page_list.append({
-            'content': html,
-            'path': relative_path,
-            'title': title,
-            'headers': headers,
-            'sections': sections,
-        })
-    return page_list
+    stats = {}
+    for page in iter_process_files(sorted(html_files), workers=workers,
+                                   chunk_size=chunk_size, stats=stats,
+                                   processor=process_mkdocs_file):
+        yield page
+    log.info('(Search Index) Parsed %s files for %s:%s in %.2fs, %s errors',
+             stats['files'], version.project.slug, version.slug,
+             sum(stats['timings'].values()), stats['errors'])
+
+
+def process_mkdocs_file(file_path):
+    """Return the page to index for a mkdocs JSON file
+
+    The file is read and decoded once, and its HTML content parsed once, for
+    the path, content, headers and sections of the page.
+    """
+    try:
+        with codecs.open(file_path, encoding='utf-8', mode='r') as f:
+            content = f.read()
+    except IOError as e:
+        log.info('(Search Index) Unable to index file: %s, error :%s' % (file_path, e))
+        return None
+
+    page_json = json.loads(content)
+    relative_path = parse_path(page_json['url'])
+    try:
+        body = PyQuery(page_json['content'])
+    except ValueError:
+        body = None
+
+    if body is None:
+        html = ''
+        headers = []
+        sections = ''
+    else:
+        html = body.text()
+        headers = [recurse_while_none(element) for element in body('h2')]
+        sections = parse_mkdocs_sections(body)
+    if not html:
+        log.info('(Search Index) Unable to index file: %s, empty file' % (file_path))
+    if not headers:
+        log.error('Unable to index file headers for: %s' % file_path)
+    if not sections:
+        log.error('Unable to index file sections for: %s' % file_path)
+    try:
+        title = sections[0]['title']
+    except IndexError:
+        title = relative_path
+    return {
+        'content': html,
+        'path': relative_path,
+        'title': title,
+        'headers': headers,
+        'sections': sections,
+    }
 
 
 def recurse_while_none(element):
@@ -59,8 +110,10 @@ def parse_path_from_file(documentation_type, file_path):
         return ''
 
     page_json = json.loads(content)
-    path = page_json['url']
+    return parse_path(page_json['url'])
 
+
+def parse_path(path):
     # The URLs here should be of the form "path/index". So we need to
     # convert:
     #   "path/" => "path/index"
@@ -191,51 +244,59 @@ def parse_sections(documentation_type, content):
             body = PyQuery(content)
         except ValueError:
             return ''
+        sections = parse_mkdocs_sections(body)
+    return sections
 
-        try:
-            # H1 content
-            h1 = body('h1')
-            h1_id = h1.attr('id')
-            h1_title = h1.text().strip()
-            h1_content = ""
-            next_p = body('h1').next()
+
+def parse_mkdocs_sections(body):
+    """Sections of a mkdocs page from its parsed content
+
+    :param body: :py:class:`PyQuery` instance of the page content
+    """
+    sections = []
+    try:
+        # H1 content
+        h1 = body('h1')
+        h1_id = h1.attr('id')
+        h1_title = h1.text().strip()
+        h1_content = ""
+        next_p = body('h1').next()
+        while next_p:
+            if next_p[0].tag == 'h2':
+                break
+            h1_html = next_p.html()
+            if h1_html:
+                h1_content += "\n%s\n" % h1_html
+            next_p = next_p.next()
+        if h1_content:
+            sections.append({
+                'id': h1_id,
+                'title': h1_title,
+                'content': h1_content,
+            })
+
+        # H2 content
+        section_list = body('h2')
+        for num in range(len(section_list)):
+            h2 = section_list.eq(num)
+            h2_title = h2.text().strip()
+            section_id = h2.attr('id')
+            h2_content = ""
+            next_p = body('h2').next()
             while next_p:
                 if next_p[0].tag == 'h2':
                     break
-                h1_html = next_p.html()
-                if h1_html:
-                    h1_content += "\n%s\n" % h1_html
+                h2_html = next_p.html()
+                if h2_html:
+                    h2_content += "\n%s\n" % h2_html
                 next_p = next_p.next()
-            if h1_content:
+            if h2_content:
                 sections.append({
-                    'id': h1_id,
-                    'title': h1_title,
-                    'content': h1_content,
+                    'id': section_id,
+                    'title': h2_title,
+                    'content': h2_content,
                 })
-
-            # H2 content
-            section_list = body('h2')
-            for num in range(len(section_list)):
-                h2 = section_list.eq(num)
-                h2_title = h2.text().strip()
-                section_id = h2.attr('id')
-                h2_content = ""
-                next_p = body('h2').next()
-                while next_p:
-                    if next_p[0].tag == 'h2':
-                        break
-                    h2_html = next_p.html()
-                    if h2_html:
-                        h2_content += "\n%s\n" % h2_html
-                    next_p = next_p.next()
-                if h2_content:
-                    sections.append({
-                        'id': section_id,
-                        'title': h2_title,
-                        'content': h2_content,
-                    })
-                log.debug("(Search Index) Section [%s:%s]: %s" % (section_id, h2_title, h2_content))
-        except:
-            log.error('Failed indexing', exc_info=True)
-
+            log.debug("(Search Index) Section [%s:%s]: %s" % (section_id, h2_title, h2_content))
+    except:
+        log.error('Failed indexing', exc_info=True)
     return sections
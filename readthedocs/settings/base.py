@@ -199,6 +199,7 @@ INSTALLED_APPS = [
     'readthedocs.bookmarks',
     'readthedocs.projects',
     'readthedocs.builds',
+    'readthedocs.cdn',
     'readthedocs.comments',
     'readthedocs.core',
     'readthedocs.doc_builder',